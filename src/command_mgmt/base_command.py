@@ -12,6 +12,12 @@ class BaseCommand(ABC):
     Название команды, по которому она будет вызываться. Без пробелов и спец символов, желательно в нижнем регистре.
     """
 
+    SUPPORTS_ARCHIVES: bool = False
+    """
+    Команда понимает пути внутри архивов (см. 'ArchiveFileSystemService'). Остальные команды нельзя запускать,
+    пока текущая директория находится внутри архива: их относительные пути указывали бы не туда.
+    """
+
     _logger: logging.Logger
 
     def __init__(self, logger: logging.Logger):
@@ -6,6 +6,7 @@ import logging
 from src.command_mgmt.command_factory import CommandFactory
 from src.command_mgmt.base_command import BaseCommand
 from src.command_mgmt.exceptions import CommandExecutionError
+from src.services.archive_fs_service import ArchiveFileSystemService
 
 
 class CommandExecutor:
@@ -27,6 +28,10 @@ class CommandExecutor:
         :raises SystemExit: При возникновении ошибки вызывает SystemExit с нужным exit code.
         """
         try:
+            cwd = ArchiveFileSystemService.get_cwd()
+            if cwd is not None and not command.SUPPORTS_ARCHIVES:
+                raise CommandExecutionError(f"'{command.NAME}' can't be used inside archive '{cwd.archive}'. "
+                                            f"Use 'cd' to leave it.")
             command(*args, **kwargs)
             self.__logger.info("OK")
         except CommandExecutionError as e:
@@ -1,16 +1,28 @@
 from pathlib import Path
+from rich import print
+from typing import Annotated
+import shutil
+import typer
 
 from src.command_mgmt.base_command import BaseCommand
 from src.command_mgmt.exceptions import CommandExecutionError
-from src.services.archive_service import ArchiveService
+from src.services.archive_service import ArchiveService, TarCompression, ZipMethod, TAR_TYPES
 
 
 class CommandZip(BaseCommand):
     NAME = 'zip'
 
-    def __call__(self, source: Path, destination: Path):
+    def __call__(self, source: Path, destination: Path,
+                 method: Annotated[ZipMethod, typer.Option("--compression",
+                                                           help="Compression method.")] = ZipMethod.DEFLATE,
+                 level: Annotated[int | None, typer.Option("-l", "--level", min=0, max=9, show_default=False,
+                                                           help="Compression level.")] = None,
+                 auto_store: Annotated[bool, typer.Option("--auto-store",
+                                                          help="Store already compressed files "
+                                                               "without compression.")] = False):
         try:
-            ArchiveService().create_archive(source, destination, "zip")
+            ArchiveService().create_archive(source, destination, "zip", method=method, level=level,
+                                            auto_store=auto_store)
         except Exception as e:
             raise CommandExecutionError(e)
 
@@ -18,9 +30,22 @@ class CommandZip(BaseCommand):
 class CommandTar(BaseCommand):
     NAME = 'tar'
 
-    def __call__(self, source: Path, destination: Path):
+    def __call__(self, source: Path, destination: Path,
+                 jobs: Annotated[int | None, typer.Option("-j", min=1, show_default=False,
+                                                          help="Number of compression threads.")] = None,
+                 manifest: Annotated[Path | None, typer.Option("--incremental", show_default=False,
+                                                               help="Manifest file. Archive only changes "
+                                                                    "since the previous run.")] = None,
+                 compression: Annotated[TarCompression, typer.Option("--compression", help="Compression algorithm.")]
+                 = TarCompression.GZIP,
+                 level: Annotated[int | None, typer.Option("-l", "--level", min=0, max=9, show_default=False,
+                                                           help="Compression level.")] = None,
+                 auto_store: Annotated[bool, typer.Option("--auto-store",
+                                                          help="Store incompressible gzip blocks "
+                                                               "without compression.")] = False):
         try:
-            ArchiveService().create_archive(source, destination, "gztar")
+            ArchiveService().create_archive(source, destination, TAR_TYPES[compression], jobs=jobs,
+                                            manifest=manifest, level=level, auto_store=auto_store)
         except Exception as e:
             raise CommandExecutionError(e)
 
@@ -28,9 +53,18 @@ class CommandTar(BaseCommand):
 class CommandUnzip(BaseCommand):
     NAME = 'unzip'
 
-    def __call__(self, path: Path):
+    def __call__(self, path: Path,
+                 patterns: Annotated[list[str] | None, typer.Argument(show_default=False,
+                                                                      help="Extract only members matching "
+                                                                           "the globs.")] = None,
+                 destination: Annotated[Path | None, typer.Option("-d", show_default=False,
+                                                                  help="Directory to extract to.")] = None,
+                 jobs: Annotated[int | None, typer.Option("-j", min=1, show_default=False,
+                                                          help="Number of threads writing files.")] = None):
         try:
-            ArchiveService().unarchive(path, "zip")
+            ArchiveService().unarchive(path, "zip", destination=destination, jobs=jobs, patterns=patterns)
+        except shutil.Error as e:
+            _print_errors(e)
         except Exception as e:
             raise CommandExecutionError(e)
 
@@ -38,8 +72,42 @@ class CommandUnzip(BaseCommand):
 class CommandUntar(BaseCommand):
     NAME = 'untar'
 
-    def __call__(self, path: Path):
+    def __call__(self, path: Path,
+                 patterns: Annotated[list[str] | None, typer.Argument(show_default=False,
+                                                                      help="Extract only members matching "
+                                                                           "the globs.")] = None,
+                 destination: Annotated[Path | None, typer.Option("-d", show_default=False,
+                                                                  help="Directory to extract to.")] = None,
+                 jobs: Annotated[int | None, typer.Option("-j", min=1, show_default=False,
+                                                          help="Number of threads writing files.")] = None):
         try:
-            ArchiveService().unarchive(path, "gztar")
+            ArchiveService().unarchive(path, "gztar", destination=destination, jobs=jobs, patterns=patterns)
+        except shutil.Error as e:
+            _print_errors(e)
         except Exception as e:
             raise CommandExecutionError(e)
+
+
+class CommandRestore(BaseCommand):
+    """
+    Восстанавливает директорию из цепочки инкрементальных архивов 'tar --incremental'.
+    """
+    NAME = 'restore'
+
+    def __call__(self, snapshots: list[Path],
+                 destination: Annotated[Path | None, typer.Option("-d", show_default=False,
+                                                                  help="Directory to restore to.")] = None,
+                 jobs: Annotated[int | None, typer.Option("-j", min=1, show_default=False,
+                                                          help="Number of threads writing files.")] = None):
+        try:
+            ArchiveService().restore_snapshots(snapshots, destination=destination, jobs=jobs)
+        except shutil.Error as e:
+            _print_errors(e)
+        except Exception as e:
+            raise CommandExecutionError(e)
+
+
+def _print_errors(error: shutil.Error):
+    for member, message in error.args[0]:
+        print(f"[red]ERROR[/red] >>> Failed to extract '{member}': {message}")
+    raise CommandExecutionError("One or more error occurred during command execution.")
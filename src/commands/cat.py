@@ -1,17 +1,37 @@
 from pathlib import Path
 from rich import print
+import sys
 
 from src.command_mgmt.base_command import BaseCommand
 from src.command_mgmt.exceptions import CommandExecutionError
+from src.services.archive_fs_service import ArchiveFileSystemService
+from src.services.stream_service import StreamService
 
 
 class CommandCat(BaseCommand):
+    """
+    Выводит файлы один за другим как есть: без декодирования и разметки, блоками, поэтому размер файла не ограничен.
+    """
 
     NAME = 'cat'
+    SUPPORTS_ARCHIVES = True
 
-    def __call__(self, path: Path):
-        try:
-            with open(path, "r", encoding="utf-8") as f:
-                print(f.read())
-        except Exception as e:
-            raise CommandExecutionError(str(e))
+    def __call__(self, paths: list[Path]):
+        errors = []
+        # текст, выведенный раньше через print, должен оказаться перед содержимым файлов
+        sys.stdout.flush()
+        for path in paths:
+            try:
+                with ArchiveFileSystemService.open(ArchiveFileSystemService.absolute(path)) as f:
+                    StreamService.copy(f, sys.stdout.buffer)
+            except BrokenPipeError:
+                # читатель вывода закрылся, как 'cat file | head'
+                return
+            except OSError as e:
+                errors.append((path, e))
+
+        for path, exception in errors:
+            print(f"[red]ERROR[/red] >>> Failed to read '{path}': {str(exception)}")
+
+        if errors:
+            raise CommandExecutionError("One or more error occurred during command execution.")
@@ -1,19 +1,20 @@
-import os
 from pathlib import Path
 
 from src.command_mgmt.base_command import BaseCommand
 from src.command_mgmt.exceptions import CommandExecutionError
+from src.services.archive_fs_service import ArchiveFileSystemService
 
 
 class CommandCd(BaseCommand):
     """
-    Переходит в указанную директорию.
+    Переходит в указанную директорию, в том числе внутри архива.
     """
 
     NAME = 'cd'
+    SUPPORTS_ARCHIVES = True
 
     def __call__(self, path: Path):
         try:
-            os.chdir(path)
+            ArchiveFileSystemService.chdir(path)
         except Exception as e:
             raise CommandExecutionError(str(e))
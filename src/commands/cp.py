@@ -6,7 +6,7 @@ import typer
 from src.command_mgmt.base_command import BaseCommand
 from src.command_mgmt.exceptions import CommandExecutionError
 from src.services.fs_service import FileSystemService, ConfirmationRequiredError, FlagRequiredError
-from src.utils.console import ask_confirmation
+from src.utils.console import ask_confirmation, format_size
 
 
 class CommandCp(BaseCommand):
@@ -16,10 +16,29 @@ class CommandCp(BaseCommand):
 
     NAME = 'cp'
 
-    def __call__(self, sources: list[Path], destination: Path, recursive: Annotated[bool, typer.Option("-r")] = False):
+    def __call__(self, sources: list[Path], destination: Path, recursive: Annotated[bool, typer.Option("-r")] = False,
+                 jobs: Annotated[int | None, typer.Option("-j", min=1, show_default=False,
+                                                          help="Number of threads copying files.")] = None,
+                 sync: Annotated[bool, typer.Option("--sync", "--update",
+                                                    help="Copy only new files and files with a different size "
+                                                         "or modification time. Overwrites without confirmation.")] = False,
+                 checksum: Annotated[bool, typer.Option("--checksum",
+                                                        help="With --sync compare files of the same size "
+                                                             "by content instead of modification time.")] = False,
+                 delete: Annotated[bool, typer.Option("--delete",
+                                                      help="With --sync remove destination objects "
+                                                           "missing in the source.")] = False,
+                 show_stats: Annotated[bool, typer.Option("--stats",
+                                                          help="Print a summary and how the kernel copied files: "
+                                                               "reflink, copy_file_range, sendfile or userspace.")] = False):
+        if (checksum or delete) and not sync:
+            raise CommandExecutionError("--checksum and --delete require --sync")
+
         errors = []
+        stats = None
         try:
-            gen = FileSystemService.copy_many(sources, destination, recursive=recursive)
+            gen = FileSystemService.copy_many(sources, destination, recursive=recursive, jobs=jobs,
+                                              sync=sync, checksum=checksum, delete=delete)
 
             source, exception = next(gen)
             while True:
@@ -34,11 +53,19 @@ class CommandCp(BaseCommand):
                 source, exception = gen.send(to_send)
                 continue
 
-        except StopIteration:
-            pass
+        except StopIteration as e:
+            stats = e.value
         except OSError as e:
             raise CommandExecutionError(str(e))
 
+        if (sync or show_stats) and stats is not None:
+            print(f"Copied {stats.copied} files ({format_size(stats.copied_bytes)}), "
+                  f"skipped {stats.skipped} unchanged files ({format_size(stats.skipped_bytes)}), "
+                  f"deleted {stats.deleted} objects")
+        if show_stats and stats is not None:
+            methods = ", ".join(f"{method}: {count}" for method, count in stats.methods.most_common())
+            print(f"Copy methods >>> {methods or 'none'}; sparse files: {stats.sparse}")
+
         for source, exception in errors:
             print(f"[red]ERROR[/red] >>> Failed to copy '{source}': {str(exception)}")
 
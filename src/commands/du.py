@@ -0,0 +1,57 @@
+from pathlib import Path
+from typing import Annotated
+from rich import print
+import typer
+
+from src.command_mgmt.base_command import BaseCommand
+from src.command_mgmt.exceptions import CommandExecutionError
+from src.services.fs_service import FileSystemService
+from src.utils.console import format_size
+
+
+class CommandDu(BaseCommand):
+    """
+    Выводит место, занимаемое файлами и директориями.
+    """
+
+    NAME = "du"
+
+    def __call__(self,
+                 paths: Annotated[list[Path] | None, typer.Argument(show_default=False)] = None,
+                 summarize: Annotated[bool, typer.Option("-s", help="Print only a total for each path.")] = False,
+                 max_depth: Annotated[int | None, typer.Option("--max-depth", min=0, show_default=False,
+                                                               help="Print totals only for directories "
+                                                                    "N or fewer levels below the paths.")] = None,
+                 human_readable: Annotated[bool, typer.Option("-h", help="Print sizes like 1.5 MB.")] = False,
+                 apparent_size: Annotated[bool, typer.Option("--apparent-size",
+                                                             help="Print file sizes instead of disk usage.")] = False,
+                 jobs: Annotated[int | None, typer.Option("-j", min=1, show_default=False,
+                                                          help="Number of threads.")] = None,
+                 ):
+        if summarize:
+            max_depth = 0
+
+        error_occured = False
+        try:
+            for path, size in FileSystemService.disk_usage(paths or [Path(".")], max_depth=max_depth, jobs=jobs,
+                                                           apparent_size=apparent_size):
+                if isinstance(size, OSError):
+                    print(f"[red]ERROR[/red] >>> Failed to read '{path}': {str(size)}")
+                    error_occured = True
+                    continue
+
+                print(f"{self.__format_size(size, human_readable)}\t[green]{path}[/green]")
+        except (OSError, ValueError) as e:
+            raise CommandExecutionError(str(e))
+
+        if error_occured:
+            raise CommandExecutionError("One or more errors occured during command execution.")
+
+    @staticmethod
+    def __format_size(size_bytes: float, human_readable: bool) -> str:
+        """
+        :return: Размер в КБ, как в du, или с подходящей единицей измерения при 'human_readable'.
+        """
+        if not human_readable:
+            return str(-(-int(size_bytes) // 1024))
+        return format_size(size_bytes)
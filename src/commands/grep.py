@@ -1,34 +1,126 @@
 from pathlib import Path
-from typer import Option
-from typing import Annotated
+import itertools
+from typer import Option, Argument
+from typing import Annotated, Iterator
 from rich import print
 
 from src.command_mgmt.base_command import BaseCommand
 from src.command_mgmt.exceptions import CommandExecutionError
-from src.services.search_service import SearchService, FileSearchResult
+from src.services.search_service import SearchService, FileSearchResult, BinaryFiles
+from src.services.walk_service import WalkService
+from src.services.archive_fs_service import ArchiveFileSystemService
 
 
 class CommandGrep(BaseCommand):
     NAME = "grep"
+    SUPPORTS_ARCHIVES = True
 
-    def __call__(self, pattern: str, path: Path,
+    def __call__(self, pattern: str,
+                 paths: Annotated[list[Path] | None, Argument(show_default=False)] = None,
                  recursive: Annotated[bool, Option("-r")] = False,
-                 case_insensitive: Annotated[bool, Option("-i")] = False):
+                 case_insensitive: Annotated[bool, Option("-i")] = False,
+                 jobs: Annotated[int | None, Option("-j", min=1, show_default=False,
+                                                    help="Number of processes. Defaults to the number of CPU cores.")] = None,
+                 files_with_matches: Annotated[bool, Option("-l", help="Print only names of files with matches.")] = False,
+                 count: Annotated[bool, Option("-c", help="Print only a count of matching lines per file.")] = False,
+                 max_count: Annotated[int | None, Option("-m", min=1, show_default=False,
+                                                         help="Stop reading a file after N matching lines.")] = None,
+                 binary_files: Annotated[BinaryFiles, Option("--binary-files",
+                                                             help="How to handle binary files.")] = BinaryFiles.WITHOUT_MATCH,
+                 encoding: Annotated[str, Option("--encoding", help="Encoding of files without BOM.")] = "utf-8",
+                 use_index: Annotated[bool, Option("--index/--no-index",
+                                                   help="Use the index built by 'index' to skip files.")] = True,
+                 fixed_strings: Annotated[bool, Option("-F", help="Treat patterns as plain strings.")] = False,
+                 regexps: Annotated[list[str] | None, Option("-e", show_default=False,
+                                                             help="Pattern to search. Can be repeated. "
+                                                                  "With -e or -f all positional arguments are paths.")] = None,
+                 pattern_file: Annotated[Path | None, Option("-f", show_default=False,
+                                                            help="File with one pattern per line.")] = None,
+                 exclude: Annotated[list[str] | None, Option("--exclude", show_default=False,
+                                                             help="Skip files and directories matching the glob. "
+                                                                  "Can be repeated.")] = None,
+                 include: Annotated[list[str] | None, Option("--include", show_default=False,
+                                                             help="Search only files matching the glob. "
+                                                                  "Can be repeated.")] = None,
+                 no_ignore: Annotated[bool, Option("--no-ignore",
+                                                   help="Don't respect .gitignore and .ignore files "
+                                                        "and don't skip .git, node_modules, venv.")] = False):
 
+        # для вывода имени файла достаточно первого совпадения
+        if files_with_matches:
+            max_count = 1
+
+        service = SearchService()
         try:
+            patterns: str | list[str] = pattern
+            paths = paths or []
+            if regexps or pattern_file:
+                # как в GNU grep, при -e и -f шаблон не передается позиционно
+                paths.insert(0, Path(pattern))
+                patterns = self.__collect_patterns(regexps or [], pattern_file)
+            if not paths:
+                raise ValueError("At least one path is required")
+            paths = [ArchiveFileSystemService.absolute(path) for path in paths]
+
+            result: Iterator[FileSearchResult]
             if recursive:
-                result = SearchService().find_in_files_recursively(path, pattern, case_insensitive=case_insensitive)
+                # архивы обходятся после директорий
+                locations = [ArchiveFileSystemService.locate(path, archive_as_dir=True) for path in paths]
+                directories = [path for path, location in zip(paths, locations) if location is None]
+                result = iter(())
+                if directories:
+                    result = service.find_in_files_recursively(directories, patterns,
+                                                               case_insensitive=case_insensitive,
+                                                               jobs=jobs, max_count=max_count,
+                                                               fixed_strings=fixed_strings,
+                                                               encoding=encoding, binary_files=binary_files,
+                                                               use_index=use_index,
+                                                               walker=WalkService(exclude or [], include or [],
+                                                                                  use_ignore_files=not no_ignore))
+                archived = itertools.chain.from_iterable(ArchiveFileSystemService.iter_files(location)
+                                                         for location in locations if location is not None)
+                # в архивах поиск идет в этом процессе: индекс архива построен здесь,
+                # а каждый процесс пула строил бы его заново, распаковывая сжатый tar целиком
+                result = itertools.chain(result, service.find_in_files(archived, patterns,
+                                                                       case_insensitive=case_insensitive,
+                                                                       jobs=1, max_count=max_count,
+                                                                       fixed_strings=fixed_strings,
+                                                                       encoding=encoding, binary_files=binary_files))
             else:
-                result = [SearchService().find_in_file(path, pattern, case_insensitive=case_insensitive)]
+                for path in paths:
+                    if not ArchiveFileSystemService.is_file(path):
+                        raise IsADirectoryError(f"File {path} is not a file")
+                if not all(path.is_file() for path in paths):
+                    # есть файлы внутри архивов, см. выше
+                    jobs = 1
+                result = service.find_in_files(paths, patterns, case_insensitive=case_insensitive,
+                                               jobs=jobs, max_count=max_count, fixed_strings=fixed_strings,
+                                               encoding=encoding, binary_files=binary_files)
+
+            found = False
+            for file in result:
+                found = True
+                if files_with_matches:
+                    print(f"[green]{file.file_path.absolute()}[/green]")
+                elif count:
+                    print(f"[green]{file.file_path.absolute()}[/green] >>> {len(file.fragments)}")
+                elif file.binary:
+                    print(f"Binary file [green]{file.file_path.absolute()}[/green] matches")
+                else:
+                    self.__print_file_result(file)
         except Exception as e:
             raise CommandExecutionError(e)
 
-        if not any(result):
+        if not found:
             print("No matches found")
-            return
 
-        for file in result:
-            self.__print_file_result(file)
+    @staticmethod
+    def __collect_patterns(regexps: list[str], pattern_file: Path | None) -> list[str]:
+        patterns = list(regexps)
+        if pattern_file:
+            with open(pattern_file, "r", encoding="utf-8") as f:
+                patterns.extend(line.rstrip("\r\n") for line in f)
+        return patterns
 
     @staticmethod
     def __print_file_result(file_result: FileSearchResult):
@@ -0,0 +1,44 @@
+from pathlib import Path
+from rich import print
+from typing import Annotated
+import sys
+import typer
+
+from src.command_mgmt.base_command import BaseCommand
+from src.command_mgmt.exceptions import CommandExecutionError
+from src.services.archive_fs_service import ArchiveFileSystemService
+from src.services.tail_service import TailService
+from src.utils.console import write_file_header
+
+
+class CommandHead(BaseCommand):
+    """
+    Выводит начало файлов.
+    """
+
+    NAME = 'head'
+    SUPPORTS_ARCHIVES = True
+
+    def __call__(self, paths: list[Path],
+                 lines: Annotated[int, typer.Option("-n", min=0, help="Number of lines.")] = 10,
+                 count: Annotated[int | None, typer.Option("-c", min=0, show_default=False,
+                                                           help="Number of bytes. Overrides '-n'.")] = None):
+        errors = []
+        sys.stdout.flush()
+        for i, path in enumerate(paths):
+            try:
+                with ArchiveFileSystemService.open(ArchiveFileSystemService.absolute(path)) as f:
+                    if len(paths) > 1:
+                        write_file_header(path, i == 0)
+                    TailService.head(f, sys.stdout.buffer, lines, count)
+            except BrokenPipeError:
+                return
+            except OSError as e:
+                errors.append((path, e))
+
+        for path, exception in errors:
+            print(f"[red]ERROR[/red] >>> Failed to read '{path}': {str(exception)}")
+
+        if errors:
+            raise CommandExecutionError("One or more error occurred during command execution.")
+
@@ -0,0 +1,28 @@
+from pathlib import Path
+from typing import Annotated
+from rich import print
+import typer
+
+from src.command_mgmt.base_command import BaseCommand
+from src.command_mgmt.exceptions import CommandExecutionError
+from src.services.index_service import IndexService
+
+
+class CommandIndex(BaseCommand):
+    """
+    Создает или обновляет триграммный индекс директории для ускорения 'grep -r'.
+    """
+
+    NAME = "index"
+
+    def __call__(self, path: Annotated[Path | None, typer.Argument(show_default=False)] = None):
+        if not path:
+            path = Path.cwd()
+
+        try:
+            stats = IndexService().update(path)
+        except Exception as e:
+            raise CommandExecutionError(str(e))
+
+        print(f"Indexed [green]{path.absolute()}[/green] >>> "
+              f"added: {stats.added}, updated: {stats.updated}, removed: {stats.removed}, unchanged: {stats.unchanged}")
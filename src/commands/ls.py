@@ -1,3 +1,8 @@
+import collections
+import heapq
+import itertools
+import os
+import sys
 import typer
 from pathlib import Path
 import datetime
@@ -5,11 +10,40 @@ import stat
 from rich import print
 from rich.text import Text
 from rich.table import Table
-from typing import Annotated, Iterable, Generator
+from typing import Annotated, Callable, Iterable, Iterator, Generator
 
 from src.command_mgmt.base_command import BaseCommand
 from src.command_mgmt.exceptions import CommandExecutionError
 from src.services.fs_service import FileSystemService
+from src.services.cache_service import DirEntryLike, scandir
+from src.services.archive_fs_service import ArchiveFileSystemService
+from src.utils.console import format_size
+
+
+TABLE_MAX_ROWS = 1000
+"""
+Максимальное количество объектов для вывода таблицей. Таблица строится целиком в памяти,
+поэтому директории крупнее выводятся построчно по мере чтения.
+"""
+
+_Item = tuple[DirEntryLike, os.stat_result | None]
+
+
+def _get_stat(item: _Item) -> os.stat_result:
+    """
+    stat объекта. Для сортировки и подробного вывода он запрашивается при фильтрации всегда.
+    """
+    st = item[1]
+    assert st is not None
+    return st
+
+
+def _size_key(item: _Item) -> int:
+    return _get_stat(item).st_size
+
+
+def _time_key(item: _Item) -> int:
+    return _get_stat(item).st_mtime_ns
 
 
 class CommandLs(BaseCommand):
@@ -18,56 +52,124 @@ class CommandLs(BaseCommand):
     """
 
     NAME = "ls"
+    SUPPORTS_ARCHIVES = True
 
     def __call__(self,
                  path: Annotated[Path | None, typer.Argument(show_default=False)] = None,
                  verbose: Annotated[bool, typer.Option("-l", is_flag=True)] = False,
+                 by_size: Annotated[bool, typer.Option("-S", help="Sort by size, largest first.")] = False,
+                 by_time: Annotated[bool, typer.Option("-t", help="Sort by modification time, newest first.")] = False,
+                 reverse: Annotated[bool, typer.Option("-r", help="Reverse the order.")] = False,
+                 top: Annotated[int | None, typer.Option("-n", min=1, show_default=False,
+                                                         help="Print only the first N objects.")] = None,
                  ) -> None:
-        if not path:
-            path = Path.cwd()
+        path = ArchiveFileSystemService.absolute(path or Path("."))
 
-        source = self.__filter_objects(path.iterdir())
+        if by_size and by_time:
+            raise CommandExecutionError("Options -S and -t are mutually exclusive")
 
+        # в файл или другую программу таблица и цвета не выводятся
+        is_tty = sys.stdout.isatty()
         try:
+            # архив выводится как директория с его содержимым
+            location = ArchiveFileSystemService.locate(path, archive_as_dir=True)
+            entries = scandir(path) if location is None else ArchiveFileSystemService.scandir(location)
+            source = self.__sort(self.__filter_objects(entries, verbose or by_size or by_time),
+                                 by_size, by_time, reverse, top)
             if verbose:
-                self.__list_verbose(str(path.absolute()), source)
+                self.__list_verbose(str(path.absolute()), source, is_tty)
             else:
-                self.__list_short(source)
+                self.__list_short(source, is_tty)
         except OSError as e:
             raise CommandExecutionError(str(e))
 
     @staticmethod
-    def __filter_objects(source: Iterable[Path]) -> Generator[Path, None, None]:
+    def __sort(source: Iterator[_Item], by_size: bool, by_time: bool,
+               reverse: bool, top: int | None) -> Iterator[_Item]:
+        """
+        Сортирует объекты. Для первых N используется куча размера N, а не сортировка всего списка.
+        Без ключа сортировки сохраняется порядок чтения директории.
+        """
+        key: Callable[[_Item], int] | None = None
+        if by_size:
+            key = _size_key
+        elif by_time:
+            key = _time_key
+
+        if key is None:
+            if reverse:
+                # последние N в обратном порядке, в памяти хранятся только они
+                return reversed(collections.deque(source, maxlen=top))
+            return itertools.islice(source, top)
+
+        # по умолчанию сначала самые большие и новые, как в ls
+        if top is None:
+            return iter(sorted(source, key=key, reverse=not reverse))
+        select = heapq.nsmallest if reverse else heapq.nlargest
+        return iter(select(top, source, key=key))
+
+    @classmethod
+    def __filter_objects(cls, source: Iterable[DirEntryLike],
+                         need_stat: bool) -> Generator[_Item, None, None]:
         """
         Отфильтровывает скрытые объекты.
+        :param need_stat: Получить stat каждого объекта. Иначе stat не запрашивается, если без него можно обойтись.
+        :return: Объекты и их stat. Скрытость проверяется до stat: у объектов с точкой в начале имени
+            stat не запрашивается, а на Windows DirEntry кеширует stat, полученный при проверке атрибутов.
         """
-        for obj in source:
-            if FileSystemService.is_hidden(obj):
+        for entry in source:
+            if FileSystemService.is_hidden(entry):
                 continue
 
-            yield obj
+            yield entry, cls.__stat(entry) if need_stat else None
+
+    @staticmethod
+    def __stat(entry: DirEntryLike) -> os.stat_result:
+        """
+        stat объекта с переходом по символической ссылке. Для битой ссылки возвращает stat самой ссылки.
+        """
+        try:
+            return entry.stat()
+        except OSError:
+            return entry.stat(follow_symlinks=False)
 
     @staticmethod
-    def __select_style_for_obj(path: Path) -> str:
+    def __select_style_for_obj(entry: DirEntryLike, st: os.stat_result | None) -> str:
         """
         Определяет rich стиль для вывода объекта
         """
-        if path.is_dir():
+        is_dir = stat.S_ISDIR(st.st_mode) if st is not None else entry.is_dir()
+        if is_dir:
             return "green"
         return ""
 
-    def __list_short(self, source: Iterable[Path]) -> None:
+    def __list_short(self, source: Iterable[_Item], is_tty: bool) -> None:
         """
         Краткий вывод списка объектов
         """
-        for obj in source:
-            print(Text(obj.name, self.__select_style_for_obj(obj)))
+        for entry, st in source:
+            self.__print_line(entry.name, self.__select_style_for_obj(entry, st), is_tty)
 
-    def __list_verbose(self, title: str, source: Iterable[Path]) -> None:
+    def __list_verbose(self, title: str, source: Iterator[_Item], is_tty: bool) -> None:
         """
-        Подробный вывод объектов в таблице
+        Подробный вывод объектов. В терминале небольшие директории выводятся таблицей, остальные - построчно.
         :param title: Заголовок таблицы. Например, путь до выводимой директории
         """
+        head = list(itertools.islice(source, TABLE_MAX_ROWS + 1)) if is_tty else []
+        if is_tty and len(head) <= TABLE_MAX_ROWS:
+            self.__print_table(title, head)
+            return
+
+        for item in itertools.chain(head, source):
+            entry, st = item[0], _get_stat(item)
+            line = (f"{self.__format_permissions(st.st_mode)} {format_size(st.st_size):>10} "
+                    f"{self.__format_modified_time(st.st_mtime)} {entry.name}")
+            self.__print_line(line, self.__select_style_for_obj(entry, st), is_tty)
+
+    def __print_table(self, title: str, source: Iterable[_Item]) -> None:
+        """
+        Вывод объектов в таблице
+        """
         table = Table(title=title)
 
         table.add_column("Perms", width=9)
@@ -75,29 +177,26 @@ class CommandLs(BaseCommand):
         table.add_column("Modified", justify="right")
         table.add_column("Name", justify="left")
 
-        for obj in source:
-            table.add_row(self.__format_permissions(obj.stat().st_mode),
-                          self.__format_size(obj.stat().st_size),
-                          self.__format_modified_time(obj.stat().st_mtime),
-                          obj.name,
-                          style=self.__select_style_for_obj(obj)
+        for item in source:
+            entry, st = item[0], _get_stat(item)
+            table.add_row(self.__format_permissions(st.st_mode),
+                          format_size(st.st_size),
+                          self.__format_modified_time(st.st_mtime),
+                          entry.name,
+                          style=self.__select_style_for_obj(entry, st)
                           )
 
         print(table)
 
     @staticmethod
-    def __format_size(size_bytes: float) -> str:
+    def __print_line(line: str, style: str, is_tty: bool) -> None:
         """
-        Форматирует размер объекта. Поддерживает от байтов до террабайт.
-        :param size_bytes: Размер объекта в байтах
-        :return: Строка формата "<число> <единица измерения>"
+        Выводит строку списка. Вне терминала пишет напрямую в stdout: rich на миллионах строк слишком медленный.
         """
-        for lit in ("B", "KB", "MB", "GB", "TB"):
-            if size_bytes < 1024:
-                break
-            size_bytes /= 1024
-
-        return f"{size_bytes:.2f} {lit: >2}"
+        if is_tty:
+            print(Text(line, style))
+        else:
+            sys.stdout.write(line + "\n")
 
     @staticmethod
     def __format_permissions(st_mode: int) -> str:
@@ -1,24 +1,45 @@
 from pathlib import Path
+from rich import print
+from typing import Annotated
+import typer
 
 from src.command_mgmt.base_command import BaseCommand
 from src.command_mgmt.exceptions import CommandExecutionError
-from src.services.fs_service import FileSystemService, FlagRequiredError
+from src.services.fs_service import FileSystemService, ConfirmationRequiredError
 from src.utils.console import ask_confirmation
 
 
 class CommandMv(BaseCommand):
     """
-    Перемещает/переименовывает объект.
+    Перемещает/переименовывает объекты.
     """
     NAME = "mv"
 
-    def __call__(self, source: Path, destination: Path):
+    def __call__(self, sources: list[Path], destination: Path,
+                 jobs: Annotated[int | None, typer.Option("-j", min=1, show_default=False,
+                                                          help="Number of threads copying files "
+                                                               "to another filesystem.")] = None):
+        errors = []
         try:
-            try:
-                FileSystemService.move(source, destination)
-            except FlagRequiredError:
-                confirmation = ask_confirmation(f"Do you want to override existing file or directory with '{source}'?")
-                if confirmation:
-                    FileSystemService.move(source, destination, override=True)
+            gen = FileSystemService.move_many(sources, destination, jobs=jobs)
+
+            source, exception = next(gen)
+            while True:
+                to_send = None
+                if isinstance(exception, ConfirmationRequiredError):
+                    to_send = ask_confirmation(f"Do you want to override existing file or directory with '{source}'?")
+                elif isinstance(exception, OSError):
+                    errors.append((source, exception))
+
+                source, exception = gen.send(to_send)
+
+        except StopIteration:
+            pass
         except OSError as e:
             raise CommandExecutionError(str(e))
+
+        for source, exception in errors:
+            print(f"[red]ERROR[/red] >>> Failed to move '{source}': {str(exception)}")
+
+        if errors:
+            raise CommandExecutionError("One or more error occurred during command execution.")
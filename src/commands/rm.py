@@ -1,4 +1,5 @@
 from pathlib import Path
+import shutil
 import typer
 from typing import Annotated
 from rich import print
@@ -6,6 +7,7 @@ from rich import print
 from src.command_mgmt.base_command import BaseCommand
 from src.command_mgmt.exceptions import CommandExecutionError
 from src.services.fs_service import FileSystemService, FlagRequiredError, ConfirmationRequiredError
+from src.services.path_guard_service import PathGuardService
 from src.utils.console import ask_confirmation
 
 
@@ -15,21 +17,45 @@ class CommandRm(BaseCommand):
     """
     NAME = "rm"
 
-    def __call__(self, items: list[Path], recursive: Annotated[bool, typer.Option("-r")] = False):
+    def __call__(self, items: list[Path], recursive: Annotated[bool, typer.Option("-r")] = False,
+                 jobs: Annotated[int | None, typer.Option("-j", min=1, show_default=False,
+                                                          help="Number of threads removing directory contents.")] = None,
+                 trash: Annotated[bool, typer.Option("--trash",
+                                                     help="Instantly move to trash and purge it in background.")] = False):
         error_occured = False
+        # все объекты проверяются сразу относительно текущей директории, и их stat не запрашивается повторно
+        checked = PathGuardService().check_many(items)
+        # все корзины очищаются одним фоновым процессом после перемещения всех объектов
+        trashes: set[Path] = set()
 
-        for item in items:
-            try:
-                FileSystemService.remove(item, recursive=recursive)
-            except FlagRequiredError:
-                print(f"[yellow]WARNING[/yellow] >>> Omitting '{item}' because '-r' is not specified.")
-                error_occured = True
-            except ConfirmationRequiredError:
-                if ask_confirmation(f"Do you want to remove directory '{item}'?"):
-                    FileSystemService.remove(item, recursive=recursive, confirmed=True)
-            except OSError as e:
-                print(f"[red]ERROR[/red] >>> Failed to remove '{item}': {str(e)}")
-                error_occured = True
+        try:
+            for item in items:
+                try:
+                    st = checked[item]
+                    if isinstance(st, OSError):
+                        raise st
+                    try:
+                        trash_dir = FileSystemService.remove(item, recursive=recursive, jobs=jobs, trash=trash,
+                                                             st=st, purge=False)
+                    except ConfirmationRequiredError:
+                        if not ask_confirmation(f"Do you want to remove directory '{item}'?"):
+                            continue
+                        trash_dir = FileSystemService.remove(item, recursive=recursive, confirmed=True, jobs=jobs,
+                                                             trash=trash, st=st, purge=False)
+                    if trash_dir is not None:
+                        trashes.add(trash_dir)
+                except FlagRequiredError:
+                    print(f"[yellow]WARNING[/yellow] >>> Omitting '{item}' because '-r' is not specified.")
+                    error_occured = True
+                except shutil.Error as e:
+                    for path, message in e.args[0]:
+                        print(f"[red]ERROR[/red] >>> Failed to remove '{path}': {message}")
+                    error_occured = True
+                except OSError as e:
+                    print(f"[red]ERROR[/red] >>> Failed to remove '{item}': {str(e)}")
+                    error_occured = True
+        finally:
+            FileSystemService.purge_trash(trashes)
 
         if error_occured:
             raise CommandExecutionError("One or more errors occured during command execution.")
@@ -0,0 +1,68 @@
+from pathlib import Path
+from rich import print
+from typing import Annotated
+import sys
+import typer
+
+from src.command_mgmt.base_command import BaseCommand
+from src.command_mgmt.exceptions import CommandExecutionError
+from src.services.archive_fs_service import ArchiveFileSystemService
+from src.services.tail_service import TailService, FollowEvent
+from src.utils.console import write_file_header
+
+
+class CommandTail(BaseCommand):
+    """
+    Выводит конец файлов.
+    """
+
+    NAME = 'tail'
+    SUPPORTS_ARCHIVES = True
+
+    def __call__(self, paths: list[Path],
+                 lines: Annotated[int, typer.Option("-n", min=0, help="Number of lines.")] = 10,
+                 count: Annotated[int | None, typer.Option("-c", min=0, show_default=False,
+                                                           help="Number of bytes. Overrides '-n'.")] = None,
+                 follow: Annotated[bool, typer.Option("-f", help="Output appended data as the file grows. "
+                                                                 "Stop with Ctrl+C.")] = False):
+        sys.stdout.flush()
+        if follow:
+            self.__follow(paths, lines, count)
+            return
+
+        errors = []
+        for i, path in enumerate(paths):
+            try:
+                with ArchiveFileSystemService.open(ArchiveFileSystemService.absolute(path)) as f:
+                    if len(paths) > 1:
+                        write_file_header(path, i == 0)
+                    TailService.tail(f, sys.stdout.buffer, lines, count)
+            except BrokenPipeError:
+                return
+            except OSError as e:
+                errors.append((path, e))
+
+        for path, exception in errors:
+            print(f"[red]ERROR[/red] >>> Failed to read '{path}': {str(exception)}")
+
+        if errors:
+            raise CommandExecutionError("One or more error occurred during command execution.")
+
+    @staticmethod
+    def __follow(paths: list[Path], lines: int, count: int | None):
+        if len(paths) != 1:
+            raise CommandExecutionError("'-f' supports only one file.")
+        if ArchiveFileSystemService.get_cwd() is not None:
+            raise CommandExecutionError("'-f' can't be used inside an archive.")
+
+        path = paths[0]
+        try:
+            for event in TailService.follow(path, sys.stdout.buffer, lines, count):
+                if event == FollowEvent.REPLACED:
+                    print(f"[yellow]WARNING[/yellow] >>> '{path}' has been replaced; following new file.")
+                else:
+                    print(f"[yellow]WARNING[/yellow] >>> '{path}' has been truncated.")
+        except (KeyboardInterrupt, BrokenPipeError):
+            pass
+        except OSError as e:
+            raise CommandExecutionError(str(e))
@@ -1,3 +1,4 @@
+import os
 import sys
 import logging
 
@@ -38,19 +39,26 @@ def main():
     # на случай вызовов getLogger в глобальном скоупе
     from src.repl_argv import REPLArgvRunner
     from src.cli import CLI
+    from src.services.cache_service import MetadataCacheService
+    from src.services.glob_service import GlobService
 
     cli = CLI()
 
     # если переданы аргументы, то пытаемся их интерпретировать как команду
     # >1, т. к. sys.argv[0] - путь до файла
     if len(sys.argv) > 1:
+        # на Unix шаблоны уже раскрыла вызывающая оболочка, а cmd и PowerShell их не раскрывают
+        if os.name == "nt":
+            sys.argv[1:] = GlobService.expand_args(sys.argv[1:])
         cli.run()
         return
 
     # если аргументов нет, то запускаем интерактивную оболочку
     logger.debug("No argv found. Running REPL...")
     repl = REPLArgvRunner(cli.run)
-    repl.run()
+    # в REPL одни и те же директории читаются много раз, поэтому листинги кешируются на всю сессию
+    with MetadataCacheService().activate():
+        repl.run()
 
 
 if __name__ == '__main__':
@@ -1,4 +1,3 @@
-import shlex
 import contextlib
 import sys
 import os
@@ -8,6 +7,9 @@ import logging
 
 from rich import print, get_console
 
+from src.services.glob_service import GlobService
+from src.services.archive_fs_service import ArchiveFileSystemService
+
 
 class REPLArgvRunner:
 
@@ -26,7 +28,8 @@ class REPLArgvRunner:
         """
         Возвращает строку, которая будет слева от ввода пользователя. Вроде аргумента input()
         """
-        return f"[blue]{os.getcwd()} [/blue]>>> "
+        cwd = ArchiveFileSystemService.get_cwd()
+        return f"[blue]{cwd or os.getcwd()} [/blue]>>> "
 
     def run(self):
         """
@@ -41,7 +44,8 @@ class REPLArgvRunner:
                 if not line.strip():
                     continue
 
-                parsed_args = shlex.split(line)
+                # шаблоны путей раскрываются здесь, как это сделала бы оболочка
+                parsed_args = GlobService.split(line)
 
                 # запускаем функцию с подмененными sys.argv
                 with self.__with_argv(parsed_args):
@@ -0,0 +1,402 @@
+import collections
+import datetime
+import os
+import stat
+import tarfile
+import threading
+import zipfile
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import IO, Generator
+
+
+ARCHIVE_SUFFIXES = (".zip", ".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tbz2", ".tar.xz", ".txz")
+"""
+Расширения файлов, внутрь которых можно заходить как в директории.
+"""
+
+MAX_OPEN_ARCHIVES = 8
+"""
+Количество архивов, индексы которых держатся в памяти. Дольше всех не использованные закрываются.
+"""
+
+
+@dataclass
+class _Member:
+    name: str
+    mode: int
+    size: int
+    mtime: float
+    handle: zipfile.ZipInfo | tarfile.TarInfo | None
+    """
+    Запись архива. None для директорий, которых нет в архиве явно, но есть в путях файлов.
+    """
+
+    children: list[str] = field(default_factory=list)
+
+
+@dataclass
+class ArchiveLocation:
+    archive: Path
+    inner: str
+    """
+    Путь внутри архива через '/'. Пустой для корня архива.
+    """
+
+    def __str__(self) -> str:
+        return str(self.archive / self.inner) if self.inner else str(self.archive)
+
+
+class ArchiveDirEntry:
+    """
+    Объект внутри архива. Повторяет интерфейс os.DirEntry.
+    """
+
+    __slots__ = ("name", "path", "__member")
+
+    name: str
+    path: str
+    __member: _Member
+
+    def __init__(self, path: str, member: _Member):
+        self.name = member.name
+        self.path = path
+        self.__member = member
+
+    def __fspath__(self) -> str:
+        return self.path
+
+    def __repr__(self) -> str:
+        return f"<{self.__class__.__name__} {self.name!r}>"
+
+    def inode(self) -> int:
+        return 0
+
+    def is_symlink(self) -> bool:
+        return stat.S_ISLNK(self.__member.mode)
+
+    def is_dir(self, *, follow_symlinks: bool = True) -> bool:
+        return stat.S_ISDIR(self.__member.mode)
+
+    def is_file(self, *, follow_symlinks: bool = True) -> bool:
+        return stat.S_ISREG(self.__member.mode) or (follow_symlinks and self.is_symlink())
+
+    def stat(self, *, follow_symlinks: bool = True) -> os.stat_result:
+        member = self.__member
+        return os.stat_result((member.mode, 0, 0, 1, 0, 0, member.size, member.mtime, member.mtime, member.mtime))
+
+
+class _Archive(ABC):
+    """
+    Индекс архива: все записи по путям. Строится один раз при открытии, после чего записи читаются по требованию.
+    """
+
+    key: tuple[int, int, int, int]
+    """
+    (st_dev, st_ino, st_size, st_mtime_ns) файла архива. Если он изменился, индекс строится заново.
+    """
+
+    members: dict[str, _Member]
+
+    def __init__(self, key: tuple[int, int, int, int]):
+        self.key = key
+        self.members = {"": _Member("", stat.S_IFDIR | 0o755, 0, 0, None)}
+
+    @abstractmethod
+    def open_member(self, member: _Member) -> IO[bytes]:
+        """
+        Открывает файл внутри архива на чтение.
+        """
+        pass
+
+    @abstractmethod
+    def close(self):
+        pass
+
+    def _add(self, name: str, mode: int, size: int, mtime: float, handle):
+        name = name.replace("\\", "/").strip("/")
+        while name.startswith("./"):
+            name = name[2:]
+        if not name or name == "." or ".." in name.split("/"):
+            return
+
+        parent, _, base = name.rpartition("/")
+        self.__add_directory(parent)
+        existing = self.members.get(name)
+        if existing is None:
+            self.members[parent].children.append(name)
+            self.members[name] = _Member(base, mode, size, mtime, handle)
+        else:
+            # директория, созданная неявно из путей файлов, получает свои настоящие атрибуты
+            existing.mode, existing.size, existing.mtime, existing.handle = mode, size, mtime, handle
+
+    def __add_directory(self, name: str):
+        if name in self.members:
+            return
+        parent, _, base = name.rpartition("/")
+        self.__add_directory(parent)
+        self.members[parent].children.append(name)
+        self.members[name] = _Member(base, stat.S_IFDIR | 0o755, 0, 0, None)
+
+
+class _ZipArchive(_Archive):
+    """
+    Индекс zip строится по центральному каталогу в конце файла, данные файлов при этом не читаются.
+    """
+
+    __file: zipfile.ZipFile
+
+    def __init__(self, path: Path, key: tuple[int, int, int, int]):
+        super().__init__(key)
+        self.__file = zipfile.ZipFile(path)
+        for info in self.__file.infolist():
+            mode = info.external_attr >> 16
+            if not stat.S_IFMT(mode):
+                mode |= stat.S_IFDIR | 0o755 if info.is_dir() else stat.S_IFREG | 0o644
+            mtime = _zip_mtime(info)
+            self._add(info.filename, mode, info.file_size, mtime, info)
+
+    def open_member(self, member: _Member) -> IO[bytes]:
+        assert isinstance(member.handle, zipfile.ZipInfo)
+        return self.__file.open(member.handle)
+
+    def close(self):
+        self.__file.close()
+
+
+class _TarArchive(_Archive):
+    """
+    У tar нет каталога, поэтому индекс строится одним проходом по архиву, а для сжатого - его распаковкой.
+    Запись читается переходом к её смещению, которое сохранено в индексе.
+    """
+
+    __file: tarfile.TarFile
+
+    def __init__(self, path: Path, key: tuple[int, int, int, int]):
+        super().__init__(key)
+        self.__file = tarfile.open(path)
+        for info in self.__file:
+            if info.isdir():
+                kind = stat.S_IFDIR
+            elif info.issym() or info.islnk():
+                kind = stat.S_IFLNK
+            else:
+                kind = stat.S_IFREG
+            self._add(info.name, kind | stat.S_IMODE(info.mode), info.size, info.mtime, info)
+
+    def open_member(self, member: _Member) -> IO[bytes]:
+        assert isinstance(member.handle, tarfile.TarInfo)
+        stream = self.__file.extractfile(member.handle)
+        if stream is None:
+            raise OSError(f"'{member.name}' is not a regular file")
+        return stream
+
+    def close(self):
+        self.__file.close()
+
+
+class ArchiveFileSystemService:
+    """
+    Виртуальная ФС поверх архивов: пути вида 'data.zip/dir/file.txt' читаются без распаковки архива.
+    Индекс архива строится один раз и держится в памяти на время сессии, а данные читаются только у нужных записей.
+    Внутрь архива можно перейти через 'cd': тогда относительные пути команд, поддерживающих архивы, отсчитываются от него.
+    """
+
+    _cwd: ArchiveLocation | None = None
+    _archives: collections.OrderedDict[Path, _Archive] = collections.OrderedDict()
+    _lock = threading.Lock()
+
+    @classmethod
+    def get_cwd(cls) -> ArchiveLocation | None:
+        """
+        :return: Текущая директория внутри архива или None, если текущая директория - обычная.
+        """
+        return cls._cwd
+
+    @classmethod
+    def chdir(cls, path: Path):
+        """
+        Переходит в директорию, в том числе внутри архива. Сам файл архива считается его корнем.
+        :raises OSError: Директории нет или это файл.
+        """
+        path = Path(os.path.abspath(cls.absolute(path)))
+        location = cls.locate(path, archive_as_dir=True)
+        if location is None:
+            os.chdir(path)
+            cls._cwd = None
+            return
+
+        if not stat.S_ISDIR(cls.__get_member(location).mode):
+            raise NotADirectoryError(f"Not a directory: '{path}'")
+        # реальная текущая директория остается прежней, поэтому при выходе из архива в неё можно вернуться
+        cls._cwd = location
+
+    @classmethod
+    def absolute(cls, path: Path) -> Path:
+        """
+        Для относительного пути внутри архива возвращает полный путь от текущей директории в архиве. Иначе 'path' без изменений.
+        '..' внутри архива убираются сразу, потому что в архиве нет настоящих директорий.
+        """
+        if cls._cwd is None or path.is_absolute():
+            return path
+        return Path(os.path.normpath(os.path.join(str(cls._cwd), path)))
+
+    @classmethod
+    def locate(cls, path: Path, archive_as_dir: bool = False) -> ArchiveLocation | None:
+        """
+        Находит архив в пути. Для существующих путей это один stat.
+        :param archive_as_dir: Считать сам файл архива его корнем. Нужно командам, работающим с директориями.
+        :return: Архив и путь внутри него или None, если путь не ведет внутрь архива.
+        """
+        if os.path.lexists(path):
+            if archive_as_dir and _is_archive(path) and os.path.isfile(path):
+                return ArchiveLocation(path, "")
+            return None
+
+        # ближайший существующий родитель должен быть файлом архива
+        for parent in path.parents:
+            if os.path.lexists(parent):
+                if _is_archive(parent) and os.path.isfile(parent):
+                    return ArchiveLocation(parent, path.relative_to(parent).as_posix())
+                return None
+        return None
+
+    @classmethod
+    def is_file(cls, path: Path) -> bool:
+        # обычные файлы проверяются одним stat, архив ищется, только если файла нет
+        if path.is_file():
+            return True
+        location = cls.locate(path)
+        if location is None:
+            return False
+        try:
+            return not stat.S_ISDIR(cls.__get_member(location).mode)
+        except OSError:
+            return False
+
+    @classmethod
+    def lexists(cls, path: Path) -> bool:
+        """
+        Как os.path.lexists, но и для путей внутри архивов.
+        """
+        if os.path.lexists(path):
+            return True
+        location = cls.locate(path)
+        if location is None:
+            return False
+        try:
+            cls.__get_member(location)
+        except OSError:
+            return False
+        return True
+
+    @classmethod
+    def scandir(cls, location: ArchiveLocation) -> list[ArchiveDirEntry]:
+        """
+        Содержимое директории внутри архива. Как и os.scandir, без '.' и '..'.
+        :raises OSError: Директории нет, это файл или архив не удалось прочитать.
+        """
+        with cls._lock:
+            archive = cls.__open_archive(location.archive)
+            member = cls.__find(archive, location)
+            if not stat.S_ISDIR(member.mode):
+                raise NotADirectoryError(f"Not a directory: '{location}'")
+            return [ArchiveDirEntry(str(location.archive / name), archive.members[name]) for name in member.children]
+
+    @classmethod
+    def iter_files(cls, location: ArchiveLocation) -> Generator[Path, None, None]:
+        """
+        Все файлы внутри директории архива на любой глубине. Порядок - как в архиве, чтобы сжатый tar читался без перемоток назад.
+        """
+        with cls._lock:
+            archive = cls.__open_archive(location.archive)
+            member = cls.__find(archive, location)
+            if not stat.S_ISDIR(member.mode):
+                names = [location.inner]
+            else:
+                prefix = location.inner + "/" if location.inner else ""
+                names = [name for name, child in archive.members.items()
+                         if name.startswith(prefix) and not stat.S_ISDIR(child.mode)]
+
+        for name in names:
+            yield location.archive / name
+
+    @classmethod
+    def open(cls, path: Path) -> IO[bytes]:
+        """
+        Открывает файл на чтение в бинарном режиме, в том числе файл внутри архива.
+        :raises OSError: Файла нет или это директория.
+        """
+        try:
+            return open(path, "rb")
+        except (FileNotFoundError, NotADirectoryError):
+            # путь внутри архива не открывается, потому что один из его родителей - файл
+            location = cls.locate(path)
+            if location is None:
+                raise
+
+        with cls._lock:
+            archive = cls.__open_archive(location.archive)
+            member = cls.__find(archive, location)
+            if stat.S_ISDIR(member.mode):
+                raise IsADirectoryError(f"Is a directory: '{path}'")
+            return archive.open_member(member)
+
+    @classmethod
+    def close(cls):
+        """
+        Закрывает все открытые архивы.
+        """
+        with cls._lock:
+            while cls._archives:
+                _, archive = cls._archives.popitem()
+                archive.close()
+
+    @classmethod
+    def __get_member(cls, location: ArchiveLocation) -> _Member:
+        with cls._lock:
+            return cls.__find(cls.__open_archive(location.archive), location)
+
+    @staticmethod
+    def __find(archive: _Archive, location: ArchiveLocation) -> _Member:
+        member = archive.members.get(location.inner)
+        if member is None:
+            raise FileNotFoundError(f"No such file or directory: '{location}'")
+        return member
+
+    @classmethod
+    def __open_archive(cls, path: Path) -> _Archive:
+        path = Path(os.path.abspath(path))
+        st = os.stat(path)
+        key = (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+
+        archive = cls._archives.get(path)
+        if archive is not None:
+            if archive.key == key:
+                cls._archives.move_to_end(path)
+                return archive
+            del cls._archives[path]
+            archive.close()
+
+        try:
+            archive = _ZipArchive(path, key) if path.name.lower().endswith(".zip") else _TarArchive(path, key)
+        except (zipfile.BadZipFile, tarfile.TarError) as e:
+            raise OSError(f"Failed to read archive '{path}': {e}")
+
+        cls._archives[path] = archive
+        while len(cls._archives) > MAX_OPEN_ARCHIVES:
+            _, oldest = cls._archives.popitem(last=False)
+            oldest.close()
+        return archive
+
+
+def _is_archive(path: Path) -> bool:
+    return path.name.lower().endswith(ARCHIVE_SUFFIXES)
+
+
+def _zip_mtime(info: zipfile.ZipInfo) -> float:
+    try:
+        return datetime.datetime(*info.date_time).timestamp()
+    except (ValueError, OverflowError):
+        return 0
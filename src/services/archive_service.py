@@ -1,7 +1,400 @@
+from concurrent.futures import ThreadPoolExecutor, Future, as_completed
+from enum import StrEnum
 from pathlib import Path
+from typing import IO, BinaryIO
+import bz2
+import collections
+import contextlib
+import errno
+import fnmatch
+import gzip
+import io
+import json
+import lzma
+import os
+import posixpath
+import re
 import shutil
+import sys
+import tarfile
+import threading
+import uuid
+import zipfile
+import zlib
 import logging
 
+from src.services.walk_service import WalkService
+
+
+GZIP_BLOCK_SIZE = 1024 * 1024
+"""
+Размер блока, который сжимается одним потоком в отдельный член gzip. Члены записываются подряд,
+а gzip и tar читают такой файл как один поток. Чем больше блок, тем меньше потери степени сжатия на границах.
+"""
+
+GZIP_LEVEL = 9
+"""
+Степень сжатия gzip по умолчанию. Как у tarfile и shutil.make_archive.
+"""
+
+COMPRESSED_EXTENSIONS = frozenset((
+    ".jpg", ".jpeg", ".png", ".gif", ".webp", ".heic", ".avif",
+    ".mp3", ".ogg", ".opus", ".flac", ".aac", ".m4a", ".mp4", ".mkv", ".webm", ".avi", ".mov",
+    ".zip", ".gz", ".tgz", ".bz2", ".tbz2", ".xz", ".txz", ".lzma", ".zst", ".lz4", ".7z", ".rar",
+    ".jar", ".whl", ".apk", ".docx", ".xlsx", ".pptx", ".odt", ".ods", ".epub", ".woff", ".woff2",
+))
+"""
+Расширения уже сжатых форматов. Такие файлы в режиме 'auto_store' не сжимаются без проверки содержимого.
+"""
+
+INCOMPRESSIBLE_SAMPLE_SIZE = 64 * 1024
+"""
+Сколько байт сжимается быстрым уровнем zlib, чтобы оценить, сожмутся ли данные.
+"""
+
+INCOMPRESSIBLE_RATIO = 0.95
+"""
+Данные, которые на пробе сжимаются хуже этой доли, хранятся без сжатия.
+"""
+
+
+class ZipMethod(StrEnum):
+    """
+    Метод сжатия записей zip.
+    """
+
+    DEFLATE = "deflate"
+    BZIP2 = "bzip2"
+    LZMA = "lzma"
+    STORED = "stored"
+
+
+class TarCompression(StrEnum):
+    """
+    Сжатие потока tar.
+    """
+
+    GZIP = "gzip"
+    BZIP2 = "bzip2"
+    XZ = "xz"
+    NONE = "none"
+
+
+ZIP_METHODS = {ZipMethod.DEFLATE: zipfile.ZIP_DEFLATED, ZipMethod.BZIP2: zipfile.ZIP_BZIP2,
+               ZipMethod.LZMA: zipfile.ZIP_LZMA, ZipMethod.STORED: zipfile.ZIP_STORED}
+
+TAR_TYPES = {TarCompression.GZIP: "gztar", TarCompression.BZIP2: "bztar",
+             TarCompression.XZ: "xztar", TarCompression.NONE: "tar"}
+"""
+Формат архива, как в shutil.make_archive, для каждого сжатия tar.
+"""
+
+STDOUT_PATH = Path("-")
+"""
+Путь назначения, означающий запись архива в stdout.
+"""
+
+EXTRACT_BLOCK_SIZE = 1024 * 1024
+"""
+Размер блока при копировании распакованных данных в файл.
+"""
+
+EXTRACT_POOL_MAX_SIZE = 4 * 1024 * 1024
+"""
+Файлы tar не больше этого размера читаются целиком и записываются в пуле. Большие файлы пишутся сразу при чтении:
+их запись всё равно упирается в распаковку, а целиком в памяти они бы не поместились.
+"""
+
+SNAPSHOT_MEMBER = ".pybash-snapshot.json"
+"""
+Первая запись инкрементального архива: удаленные и переименованные с прошлого снимка объекты и связь с ним.
+"""
+
+MANIFEST_VERSION = 1
+
+_EXTENSIONS = {"gztar": (".tar.gz", ".tgz"), "bztar": (".tar.bz2", ".tbz2"), "xztar": (".tar.xz", ".txz"),
+               "tar": (".tar",), "zip": (".zip",)}
+
+_TAR_TYPES = ("tar", "gztar", "bztar", "xztar")
+
+_Entry = list[str | int]
+"""
+Состояние объекта в манифесте: [тип ('f', 'd' или 'l'), размер, st_mtime_ns, st_ino].
+"""
+
+
+class ParallelGzipWriter(io.RawIOBase):
+    """
+    Сжимает поток в gzip на нескольких ядрах, как pigz: данные делятся на независимые блоки,
+    каждый блок сжимается в пуле потоков (zlib отпускает GIL) в отдельный член gzip, и члены записываются по порядку.
+    Памяти используется не больше чем на 2 * 'jobs' блоков, поэтому размер потока не ограничен.
+    В режиме 'auto_store' блоки, которые не сжимаются на пробе, записываются без сжатия.
+    """
+
+    __fileobj: BinaryIO
+    __level: int
+    __auto_store: bool
+    __block_size: int
+    __buffer: bytearray
+    __executor: ThreadPoolExecutor
+    __pending: collections.deque[Future]
+    __max_pending: int
+
+    def __init__(self, fileobj: BinaryIO, jobs: int | None = None, level: int = GZIP_LEVEL,
+                 block_size: int = GZIP_BLOCK_SIZE, auto_store: bool = False):
+        """
+        :param fileobj: Куда писать сжатые данные. Не закрывается вместе с объектом.
+        :param jobs: Количество потоков сжатия. По умолчанию по числу ядер.
+        """
+        super().__init__()
+        jobs = jobs or os.cpu_count() or 1
+        self.__fileobj = fileobj
+        self.__level = level
+        self.__auto_store = auto_store
+        self.__block_size = block_size
+        self.__buffer = bytearray()
+        self.__executor = ThreadPoolExecutor(jobs)
+        self.__pending = collections.deque()
+        self.__max_pending = 2 * jobs
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self.__buffer += data
+        while len(self.__buffer) >= self.__block_size:
+            block = bytes(self.__buffer[:self.__block_size])
+            del self.__buffer[:self.__block_size]
+            self.__submit(block)
+        return len(data)
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            if self.__buffer or not self.__pending:
+                # у пустого потока тоже должен быть хотя бы один член gzip
+                self.__submit(bytes(self.__buffer))
+                self.__buffer.clear()
+            while self.__pending:
+                self.__fileobj.write(self.__pending.popleft().result())
+            self.__fileobj.flush()
+        finally:
+            self.__executor.shutdown(cancel_futures=True)
+            super().close()
+
+    def __submit(self, block: bytes):
+        # mtime=0: сжатие не зависит от времени, а gzip.compress сразу вызывает zlib без лишнего копирования
+        self.__pending.append(self.__executor.submit(self.__compress, block))
+        # уже сжатые блоки из начала очереди пишутся сразу, а при переполнении очереди запись ждет первый
+        while self.__pending and (self.__pending[0].done() or len(self.__pending) > self.__max_pending):
+            self.__fileobj.write(self.__pending.popleft().result())
+
+    def __compress(self, block: bytes) -> bytes:
+        level = 0 if self.__auto_store and _is_incompressible(block) else self.__level
+        return gzip.compress(block, level, mtime=0)
+
+
+def _is_incompressible(sample: bytes) -> bool:
+    """
+    Проверяет, стоит ли сжимать данные, по сжатию их начала самым быстрым уровнем zlib.
+    """
+    sample = sample[:INCOMPRESSIBLE_SAMPLE_SIZE]
+    return bool(sample) and len(zlib.compress(sample, 1)) > INCOMPRESSIBLE_RATIO * len(sample)
+
+
+def _is_incompressible_file(path: str) -> bool:
+    if os.path.splitext(path)[1].lower() in COMPRESSED_EXTENSIONS:
+        return True
+    with open(path, "rb") as f:
+        return _is_incompressible(f.read(INCOMPRESSIBLE_SAMPLE_SIZE))
+
+
+def _scan(source: Path) -> dict[str, _Entry]:
+    """
+    Состояние всех объектов директории по относительным путям через '/'. Символические ссылки не раскрываются.
+    :raises OSError: Директорию не удалось прочитать. Неполное состояние отметило бы её содержимое удаленным.
+    """
+    def on_error(path: str, e: OSError):
+        raise e
+
+    entries: dict[str, _Entry] = {}
+    for name, entry in WalkService().iter_relative(source, on_error):
+        st = entry.stat(follow_symlinks=False)
+        if entry.is_dir(follow_symlinks=False):
+            kind = "d"
+        elif entry.is_symlink():
+            kind = "l"
+        else:
+            kind = "f"
+        entries[name] = [kind, st.st_size, st.st_mtime_ns, st.st_ino]
+    return entries
+
+
+def _get_parent(name: str) -> str:
+    return name.rpartition("/")[0]
+
+
+def _diff(old: dict[str, _Entry], new: dict[str, _Entry]) -> tuple[list[str], list[tuple[str, str]], list[str]]:
+    """
+    Сравнивает два состояния директории.
+    :return: Измененные и новые объекты; переименования (старый путь, новый путь);
+        удаленные объекты без вложенных в удаленные директории. Объект, сменивший тип, считается удаленным и новым.
+    """
+    changed = [name for name, entry in new.items() if old.get(name) != entry]
+    deleted = {name for name, entry in old.items() if name not in new or new[name][0] != entry[0]}
+
+    # файл с тем же inode, размером и временем изменения - тот же файл под другим именем, его данные не нужны.
+    # Цель должна лежать в директории, которая есть в обоих снимках, иначе при восстановлении ей негде появиться
+    by_inode = {old[name][3]: name for name in deleted if old[name][0] == "f"}
+    renamed = []
+    for name in changed:
+        source = by_inode.get(new[name][3])
+        if (source is not None and name not in old and old[source] == new[name]
+                and _is_common_dir(_get_parent(name), old, new)):
+            renamed.append((source, name))
+            del by_inode[new[name][3]]
+    if renamed:
+        moved = {name for _, name in renamed}
+        changed = [name for name in changed if name not in moved]
+        deleted.difference_update(source for source, _ in renamed)
+
+    # директория удаляется целиком, поэтому вложенные в неё объекты перечислять не нужно
+    top = [name for name in deleted if not any(parent in deleted for parent in _iter_parents(name))]
+    return sorted(changed), renamed, sorted(top)
+
+
+def _is_common_dir(name: str, old: dict[str, _Entry], new: dict[str, _Entry]) -> bool:
+    if not name:
+        return True
+    return old.get(name, ("",))[0] == "d" and new.get(name, ("",))[0] == "d"
+
+
+def _iter_parents(name: str):
+    while "/" in name:
+        name = _get_parent(name)
+        yield name
+
+
+def _compile_patterns(patterns: list[str] | None):
+    if not patterns:
+        return None
+    return re.compile("|".join(fnmatch.translate(pattern) for pattern in patterns)).match
+
+
+def _get_target(destination: Path, name: str) -> str | None:
+    """
+    Путь записи в 'destination' или None, если запись вышла бы за пределы 'destination'.
+    """
+    parts = [part for part in name.replace("\\", "/").split("/") if part not in ("", ".")]
+    if not parts or ".." in parts or name.startswith("/") or os.path.splitdrive(parts[0])[0]:
+        return None
+    return os.path.join(destination, *parts)
+
+
+def _get_tar_target(destination: Path, member: tarfile.TarInfo, links: set[str]) -> str | None:
+    """
+    Быстрая проверка по строкам, без обращений к ФС: пути не выходят за пределы 'destination'
+    и не проходят через ссылки из этого же архива. Устройства и каналы не распаковываются.
+    Цепочку ссылок вроде 'l1 -> .', 'up -> l1/..' по строкам не распознать, поэтому цель каждой ссылки
+    перед созданием дополнительно проверяется через realpath в _DirectoryGuard.check.
+    :param links: Символические ссылки, уже созданные из архива. Пополняется.
+    :return: Путь записи в 'destination' или None, если запись небезопасна.
+    """
+    if not (member.isreg() or member.isdir() or member.issym() or member.islnk()):
+        return None
+    target = _get_target(destination, member.name)
+    if target is None:
+        return None
+
+    name = os.path.relpath(target, destination).replace(os.sep, "/")
+    if links:
+        parts = name.split("/")
+        if any("/".join(parts[:i]) in links for i in range(1, len(parts))):
+            return None
+
+    if member.issym() or member.islnk():
+        base = posixpath.dirname(name) if member.issym() else ""
+        resolved = posixpath.normpath(posixpath.join(base, member.linkname))
+        if member.linkname.startswith("/") or resolved == ".." or resolved.startswith("../"):
+            return None
+        if member.issym():
+            links.add(name)
+    return target
+
+
+def _file_mode(mode: int) -> int:
+    """
+    Права файла как у фильтра 'data': без setuid, setgid и записи для группы и остальных, но с чтением и записью для владельца.
+    """
+    return (mode & 0o755) | 0o600
+
+
+def _write_file(target: str, source: bytes | IO[bytes], mode: int | None, mtime: float | None):
+    """
+    Записывает файл. Символическая ссылка на месте файла заменяется, а не перезаписывается её цель.
+    """
+    flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_NOFOLLOW", 0) | getattr(os, "O_BINARY", 0)
+    try:
+        fd = os.open(target, flags, 0o600 if mode is not None else 0o666)
+    except OSError as e:
+        if e.errno != errno.ELOOP:
+            raise
+        os.unlink(target)
+        fd = os.open(target, flags, 0o600 if mode is not None else 0o666)
+
+    with open(fd, "wb") as f:
+        if isinstance(source, bytes):
+            f.write(source)
+        else:
+            shutil.copyfileobj(source, f, EXTRACT_BLOCK_SIZE)
+    if mode is not None:
+        os.chmod(target, mode)
+    if mtime is not None:
+        os.utime(target, (mtime, mtime))
+
+
+def _make_link(target: str, link_target: str, symbolic: bool):
+    if os.path.lexists(target):
+        os.unlink(target)
+    if symbolic:
+        os.symlink(link_target, target)
+    else:
+        os.link(link_target, target)
+
+
+class _DirectoryGuard:
+    """
+    Создает директории распаковки и проверяет, что они не выводят за пределы назначения через уже существующие
+    символические ссылки. realpath вызывается один раз на директорию, а не на каждый файл.
+    """
+
+    __root: str
+    __checked: set[str]
+
+    def __init__(self, destination: Path):
+        os.makedirs(destination, exist_ok=True)
+        self.__root = os.path.realpath(destination)
+        self.__checked = set()
+
+    def check(self, path: str):
+        """
+        :raises OSError: Путь с раскрытыми ссылками находится за пределами назначения.
+        """
+        real = os.path.realpath(path)
+        if os.path.commonpath([self.__root, real]) != self.__root:
+            raise OSError(f"'{path}' is outside of the destination directory")
+
+    def makedirs(self, path: str):
+        """
+        :raises OSError: Директория находится за пределами назначения.
+        """
+        if path in self.__checked:
+            return
+        os.makedirs(path, exist_ok=True)
+        self.check(path)
+        self.__checked.add(path)
+
 
 class ArchiveService:
 
@@ -10,13 +403,399 @@ class ArchiveService:
     def __init__(self, logger: logging.Logger | None = None):
         self._logger = logger or logging.getLogger(self.__class__.__name__)
 
-    def create_archive(self, source: Path, destination: Path, arc_type: str):
+    def create_archive(self, source: Path, destination: Path, arc_type: str, jobs: int | None = None,
+                       manifest: Path | None = None, level: int | None = None, method: ZipMethod = ZipMethod.DEFLATE,
+                       auto_store: bool = False):
+        """
+        Архивирует содержимое директории. Архив пишется сразу в назначение, без временных файлов.
+        :param destination: Путь архива. Если у него нет расширения формата, то оно добавляется. '-' - запись в stdout.
+        :param arc_type: Формат, как в shutil.make_archive: 'zip', 'tar', 'gztar', 'bztar' или 'xztar'.
+        :param jobs: Количество потоков сжатия gzip. По умолчанию по числу ядер.
+        :param manifest: Файл состояния директории для инкрементального tar.
+            Если его нет, то архивируется вся директория. Иначе только объекты, изменившиеся с прошлого запуска.
+            После записи архива манифест обновляется.
+        :param level: Степень сжатия от 0 до 9 (для bzip2 от 1). По умолчанию максимальная, для xz и lzma - 6.
+        :param method: Метод сжатия записей zip.
+        :param auto_store: Не сжимать уже сжатые данные: в zip - файлы с расширениями из COMPRESSED_EXTENSIONS
+            и файлы, начало которых не сжимается; в gztar - такие же блоки потока. bzip2 и xz так не умеют.
+        """
         if not source.is_dir():
             raise Exception("Source is not an existing directory")
+        if arc_type not in _EXTENSIONS:
+            raise Exception(f"Unknown archive format '{arc_type}'")
+        if level is not None and not (1 if arc_type == "bztar" or method == ZipMethod.BZIP2 else 0) <= level <= 9:
+            raise Exception(f"Invalid compression level {level}")
+
+        if manifest is not None:
+            if arc_type not in _TAR_TYPES:
+                raise Exception("Incremental archives are supported only for tar")
+            self.__create_snapshot(source, destination, arc_type, manifest, jobs, level, auto_store)
+            return
+
+        # архив может писаться внутрь самой директории, и тогда он не должен попасть сам в себя
+        skipped = self.__get_own_name(source, destination, arc_type)
+        with self.__open_destination(destination, arc_type) as stream:
+            if arc_type == "zip":
+                self.__write_zip(source, stream, method, level, auto_store, skipped)
+            else:
+                own_member = f"{os.curdir}/{skipped}"
+
+                def skip_own(info: tarfile.TarInfo) -> tarfile.TarInfo | None:
+                    return None if info.name == own_member else info
+
+                with self.__open_tar(stream, arc_type, jobs, level, auto_store) as tar:
+                    # имена как у shutil.make_archive: './файл'
+                    tar.add(source, arcname=os.curdir, filter=skip_own if skipped is not None else None)
+
+    def unarchive(self, path: Path, fmt: str, destination: Path | None = None, jobs: int | None = None,
+                  patterns: list[str] | None = None):
+        """
+        Распаковывает архив. Директории создаются заранее, а файлы пишутся в пуле потоков:
+        члены zip сжаты независимо, поэтому и распаковываются параллельно, а tar распаковывается одним потоком
+        подряд, и в пуле только записываются файлы. Записи с абсолютными путями и '..' пропускаются.
+        :param destination: Куда распаковывать. По умолчанию в текущую директорию.
+        :param jobs: Количество потоков. По умолчанию как в ThreadPoolExecutor.
+        :param patterns: Распаковать только записи, пути которых совпадают с одним из glob шаблонов. '*' совпадает и с '/'.
+        :raises shutil.Error: Часть записей не удалось распаковать. Содержит список (запись, ошибка).
+        """
+        destination = destination or Path(os.curdir)
+        match = _compile_patterns(patterns)
+
+        if fmt == "zip":
+            errors = self.__extract_zip(path, destination, jobs, match)
+        elif fmt in ("tar", "gztar", "bztar", "xztar"):
+            errors = self.__extract_tar(path, destination, jobs, match)
+        else:
+            shutil.unpack_archive(str(path), str(destination), format=fmt)
+            return
+
+        if errors:
+            raise shutil.Error(errors)
+
+    def restore_snapshots(self, snapshots: list[Path], destination: Path | None = None, jobs: int | None = None):
+        """
+        Восстанавливает директорию из цепочки инкрементальных архивов: первый - полный, остальные - по порядку создания.
+        Перед распаковкой каждого архива переименовываются и удаляются объекты, которые он отмечает.
+        :raises Exception: Архив не инкрементальный или нарушен порядок цепочки.
+        :raises shutil.Error: Часть записей не удалось восстановить. Содержит список (запись, ошибка).
+        """
+        destination = destination or Path(os.curdir)
+        errors = []
+        previous = None
+        for path in snapshots:
+            header = self.__read_snapshot_header(path)
+            if previous is not None and header["base"] != previous:
+                raise Exception(f"'{path}' does not follow the previous snapshot in the chain")
+            previous = header["id"]
+
+            self._logger.info("Restoring snapshot '%s'", path)
+            os.makedirs(destination, exist_ok=True)
+            errors.extend(self.__apply_snapshot_header(header, destination))
+            errors.extend(self.__extract_tar(path, destination, jobs, None))
+
+        if errors:
+            raise shutil.Error(errors)
+
+    def __create_snapshot(self, source: Path, destination: Path, arc_type: str, manifest: Path, jobs: int | None,
+                          level: int | None, auto_store: bool):
+        base = None
+        old: dict[str, _Entry] = {}
+        if manifest.exists():
+            with open(manifest, encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") != MANIFEST_VERSION:
+                raise Exception(f"Unsupported manifest version in '{manifest}'")
+            if data["source"] != os.path.realpath(source):
+                raise Exception(f"Manifest '{manifest}' was created for '{data['source']}'")
+            base, old = data["id"], data["entries"]
+
+        # состояние снимается до чтения файлов: если файл изменится во время записи, следующий запуск заберет его снова
+        new = _scan(source)
+        skipped = self.__get_own_name(source, destination, arc_type)
+        if skipped is not None:
+            new.pop(skipped, None)
+        changed, renamed, deleted = _diff(old, new)
+        header = {"id": uuid.uuid4().hex, "base": base, "deleted": deleted, "renamed": renamed}
+        self._logger.info("Snapshot of '%s': %s changed, %s renamed, %s deleted",
+                          source, len(changed), len(renamed), len(deleted))
+
+        with self.__open_destination(destination, arc_type) as stream:
+            with self.__open_tar(stream, arc_type, jobs, level, auto_store) as tar:
+                data = json.dumps(header).encode()
+                info = tarfile.TarInfo(SNAPSHOT_MEMBER)
+                info.size = len(data)
+                tar.addfile(info, io.BytesIO(data))
+
+                for name in changed:
+                    try:
+                        tar.add(source / name, arcname=f"{os.curdir}/{name}", recursive=False)
+                    except FileNotFoundError:
+                        # удаленный после сканирования объект остается в манифесте в прошлом состоянии,
+                        # чтобы следующий снимок отметил его удаление
+                        self._logger.warning("'%s' disappeared while archiving", name)
+                        if name in old:
+                            new[name] = old[name]
+                        else:
+                            del new[name]
+
+        # манифест обновляется, только когда архив записан полностью
+        temp = manifest.with_name(manifest.name + ".tmp")
+        with open(temp, "w", encoding="utf-8") as f:
+            json.dump({"version": MANIFEST_VERSION, "source": os.path.realpath(source),
+                       "id": header["id"], "entries": new}, f)
+        os.replace(temp, manifest)
+
+    @staticmethod
+    def __read_snapshot_header(path: Path) -> dict:
+        # 'r:*', как и при распаковке: в потоковом режиме многочленный gzip не читается.
+        # Описание снимка - первая запись, поэтому читается только начало архива
+        with tarfile.open(path, "r:*") as archive:
+            member = archive.next()
+            data = archive.extractfile(member) if member is not None and member.name == SNAPSHOT_MEMBER else None
+            if data is None:
+                raise Exception(f"'{path}' is not an incremental archive")
+            return json.load(data)
+
+    def __apply_snapshot_header(self, header: dict, destination: Path) -> list[tuple[str, str]]:
+        errors = []
+        # переименования идут до удалений: источник может лежать в удаленной директории
+        for source, name in header["renamed"]:
+            source_path, target = _get_target(destination, source), _get_target(destination, name)
+            if source_path is None or target is None:
+                self._logger.warning("Skipping unsafe rename '%s' -> '%s'", source, name)
+                continue
+            try:
+                os.rename(source_path, target)
+            except OSError as e:
+                errors.append((name, str(e)))
+
+        for name in header["deleted"]:
+            target = _get_target(destination, name)
+            if target is None:
+                self._logger.warning("Skipping unsafe deletion '%s'", name)
+                continue
+            try:
+                if os.path.isdir(target) and not os.path.islink(target):
+                    shutil.rmtree(target)
+                else:
+                    os.unlink(target)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                errors.append((name, str(e)))
+        return errors
+
+    def __extract_zip(self, path: Path, destination: Path, jobs: int | None, match) -> list[tuple[str, str]]:
+        errors = []
+        files = []
+        directories = set()
+        with zipfile.ZipFile(path) as archive:
+            for info in archive.infolist():
+                if match is not None and not match(info.filename):
+                    continue
+                target = _get_target(destination, info.filename)
+                if target is None:
+                    self._logger.warning("Skipping unsafe member '%s'", info.filename)
+                    continue
+                if info.is_dir():
+                    directories.add(target)
+                else:
+                    directories.add(os.path.dirname(target))
+                    files.append((info, target))
+
+        # все директории создаются до записи файлов, чтобы потоки не создавали одни и те же директории наперегонки
+        guard = _DirectoryGuard(destination)
+        for directory in sorted(directories):
+            guard.makedirs(directory)
+
+        local = threading.local()
+        opened: list[zipfile.ZipFile] = []
+
+        def extract(info: zipfile.ZipInfo, target: str):
+            # у каждого потока свой ZipFile: один общий файл заставил бы потоки читать по очереди
+            if not hasattr(local, "archive"):
+                local.archive = zipfile.ZipFile(path)
+                opened.append(local.archive)
+            with local.archive.open(info) as src:
+                _write_file(target, src, None, None)
+
+        # сначала самые большие файлы, чтобы в конце потоки не ждали один долгий файл
+        files.sort(key=lambda item: item[0].file_size, reverse=True)
+        try:
+            with ThreadPoolExecutor(jobs) as executor:
+                futures = {executor.submit(extract, info, target): info.filename for info, target in files}
+                for future in as_completed(futures):
+                    try:
+                        future.result()
+                    except (OSError, zipfile.BadZipFile) as e:
+                        errors.append((futures[future], str(e)))
+        finally:
+            for archive in opened:
+                archive.close()
+        return errors
+
+    def __extract_tar(self, path: Path, destination: Path, jobs: int | None, match) -> list[tuple[str, str]]:
+        errors = []
+        guard = _DirectoryGuard(destination)
+        directories: list[tuple[tarfile.TarInfo, str]] = []
+        links: set[str] = set()
+        workers = jobs or min(32, (os.cpu_count() or 1) + 4)
+        pending: collections.deque[tuple[Future, str, str]] = collections.deque()
+        writing: dict[str, Future] = {}
+        """
+        Файлы, которые сейчас пишутся в пуле. Перед повторной записью того же файла или жесткой ссылкой на него запись дожидается.
+        """
+
+        def wait(future: Future, name: str, target: str):
+            try:
+                future.result()
+            except OSError as e:
+                errors.append((name, str(e)))
+            if writing.get(target) is future:
+                del writing[target]
+
+        # архив все равно читается один раз подряд. Потоковый режим 'r|*' не подходит: он читает только первый член gzip,
+        # а ParallelGzipWriter пишет по члену на блок
+        with tarfile.open(path, "r:*") as archive, ThreadPoolExecutor(workers) as executor:
+            for member in archive:
+                name = member.name.removeprefix("./")
+                if member.isdir() and name in ("", ".") or name == SNAPSHOT_MEMBER:
+                    # корень архива, созданного из директории, - это само назначение, а описание снимка - не файл
+                    continue
+                if match is not None and not match(name):
+                    continue
+                target = _get_tar_target(destination, member, links)
+                if target is None:
+                    self._logger.warning("Skipping unsafe or special member '%s'", member.name)
+                    continue
+
+                try:
+                    guard.makedirs(os.path.dirname(target))
+                    if target in writing:
+                        wait(writing[target], name, target)
+
+                    if member.isdir():
+                        guard.makedirs(target)
+                        directories.append((member, target))
+                    elif member.isreg():
+                        src = archive.extractfile(member)
+                        # None бывает только у записей, которые не являются обычными файлами
+                        assert src is not None
+                        if member.size <= EXTRACT_POOL_MAX_SIZE:
+                            # данные читаются здесь по порядку, а открытие, запись и закрытие файла уходят в пул
+                            future = executor.submit(_write_file, target, src.read(), _file_mode(member.mode),
+                                                     member.mtime)
+                            writing[target] = future
+                            pending.append((future, name, target))
+                            # в памяти не больше нескольких файлов на поток
+                            while len(pending) > 4 * workers:
+                                wait(*pending.popleft())
+                        else:
+                            with src:
+                                _write_file(target, src, _file_mode(member.mode), member.mtime)
+                    elif member.issym():
+                        # цель проверяется с раскрытыми ссылками: уже созданные ссылки архива могут вести наружу
+                        guard.check(os.path.join(os.path.dirname(target), member.linkname))
+                        _make_link(target, member.linkname, True)
+                    else:
+                        # имя цели нормализуется как имена записей, иначе './file' не найдется среди пишущихся 'file'
+                        link_target = _get_target(destination, member.linkname)
+                        if link_target is None:
+                            raise OSError(f"Unsafe link target '{member.linkname}'")
+                        guard.check(link_target)
+                        if link_target in writing:
+                            wait(writing[link_target], name, link_target)
+                        _make_link(target, link_target, False)
+                except OSError as e:
+                    errors.append((name, str(e)))
+
+            while pending:
+                wait(*pending.popleft())
+
+        # время изменения директорий выставляется в конце: запись файлов его меняет
+        for member, target in reversed(directories):
+            try:
+                os.utime(target, (member.mtime, member.mtime))
+            except OSError as e:
+                errors.append((member.name, str(e)))
+        return errors
+
+    @staticmethod
+    def __get_destination_path(destination: Path, arc_type: str) -> Path:
+        if not destination.name.endswith(_EXTENSIONS[arc_type]):
+            return destination.with_name(destination.name + _EXTENSIONS[arc_type][0])
+        return destination
+
+    @classmethod
+    def __get_own_name(cls, source: Path, destination: Path, arc_type: str) -> str | None:
+        """
+        :return: Путь архива относительно 'source' через '/', если архив пишется внутрь 'source', иначе None.
+        """
+        if destination == STDOUT_PATH:
+            return None
+        # пути без ссылок: обход идет по настоящим путям внутри 'source', даже если путь архива проходит через ссылку
+        path = os.path.realpath(cls.__get_destination_path(destination, arc_type))
+        root = os.path.realpath(source)
+        if os.path.commonpath([root, path]) != root:
+            return None
+        return Path(os.path.relpath(path, root)).as_posix()
+
+    @contextlib.contextmanager
+    def __open_destination(self, destination: Path, arc_type: str):
+        if destination == STDOUT_PATH:
+            yield sys.stdout.buffer
+            sys.stdout.buffer.flush()
+            return
+
+        destination = self.__get_destination_path(destination, arc_type)
+        self._logger.info("Creating %s archive '%s'", arc_type, destination)
+
+        try:
+            with open(destination, "wb") as stream:
+                yield stream
+        except BaseException:
+            # недописанный архив бесполезен
+            destination.unlink(missing_ok=True)
+            raise
+
+    @staticmethod
+    @contextlib.contextmanager
+    def __open_tar(stream: BinaryIO, arc_type: str, jobs: int | None, level: int | None, auto_store: bool):
+        with contextlib.ExitStack() as stack:
+            # без сжатия tar пишется прямо в поток, который закрывает вызывающий код
+            fileobj: IO[bytes] | ParallelGzipWriter = stream
+            if arc_type == "gztar":
+                fileobj = stack.enter_context(
+                    ParallelGzipWriter(stream, jobs, GZIP_LEVEL if level is None else level, auto_store=auto_store))
+            elif arc_type == "bztar":
+                fileobj = stack.enter_context(bz2.BZ2File(stream, "wb", compresslevel=9 if level is None else level))
+            elif arc_type == "xztar":
+                fileobj = stack.enter_context(lzma.LZMAFile(stream, "wb", preset=level))
 
-        path = str(destination.parent / destination.stem)
-        shutil.make_archive(path, arc_type, source, logger=self._logger)
+            # 'w|' - потоковая запись tar без перемотки назад, в том числе в stdout
+            with tarfile.open(fileobj=fileobj, mode="w|") as tar:
+                yield tar
 
     @staticmethod
-    def unarchive(path: Path, fmt: str):
-        shutil.unpack_archive(str(path), format=fmt)
+    def __write_zip(source: Path, stream: BinaryIO, method: ZipMethod, level: int | None, auto_store: bool,
+                    skipped: str | None):
+        """
+        :param skipped: Путь относительно 'source', который не архивируется, - сам создаваемый архив.
+        """
+        compression = ZIP_METHODS[method]
+        # в поток без перемотки zipfile пишет размеры после данных каждого файла
+        with zipfile.ZipFile(stream, "w", compression, compresslevel=level) as archive:
+            for root, dirs, files in os.walk(source):
+                dirs.sort()
+                for name in dirs:
+                    path = os.path.join(root, name)
+                    archive.write(path, os.path.relpath(path, source))
+                for name in sorted(files):
+                    path = os.path.join(root, name)
+                    arcname = os.path.relpath(path, source)
+                    if arcname.replace(os.sep, "/") == skipped:
+                        continue
+                    compress_type = compression
+                    if auto_store and compression != zipfile.ZIP_STORED and _is_incompressible_file(path):
+                        compress_type = zipfile.ZIP_STORED
+                    archive.write(path, arcname, compress_type)
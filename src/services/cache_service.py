@@ -0,0 +1,413 @@
+import collections
+import contextlib
+import ctypes
+import logging
+import os
+import stat
+import struct
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from typing import Generator, Iterator, Protocol
+
+
+MAX_CACHED_ENTRIES = 1_000_000
+"""
+Максимальное суммарное количество объектов в закешированных листингах. Дольше всех не использованные листинги вытесняются.
+"""
+
+RACY_MTIME_NS = 2 * 10 ** 9
+"""
+Без inotify не кешируются листинги директорий, измененных менее чем за это время до чтения:
+на ФС с грубыми метками времени следующее изменение может не поменять mtime.
+"""
+
+# константы из <sys/inotify.h>
+_IN_MODIFY = 0x2
+_IN_ATTRIB = 0x4
+_IN_CLOSE_WRITE = 0x8
+_IN_MOVED_FROM = 0x40
+_IN_MOVED_TO = 0x80
+_IN_CREATE = 0x100
+_IN_DELETE = 0x200
+_IN_DELETE_SELF = 0x400
+_IN_MOVE_SELF = 0x800
+_IN_Q_OVERFLOW = 0x4000
+_IN_IGNORED = 0x8000
+_IN_ONLYDIR = 0x01000000
+_IN_ISDIR = 0x40000000
+
+_WATCH_MASK = (_IN_MODIFY | _IN_ATTRIB | _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE
+               | _IN_DELETE | _IN_DELETE_SELF | _IN_MOVE_SELF | _IN_ONLYDIR)
+
+_EVENT = struct.Struct("iIII")
+
+
+class DirEntryLike(Protocol):
+    """
+    Общий интерфейс os.DirEntry, CachedDirEntry и объектов внутри архивов.
+    """
+
+    @property
+    def name(self) -> str: ...
+
+    @property
+    def path(self) -> str: ...
+
+    def __fspath__(self) -> str: ...
+
+    def inode(self) -> int: ...
+
+    def is_symlink(self) -> bool: ...
+
+    def is_dir(self, *, follow_symlinks: bool = True) -> bool: ...
+
+    def is_file(self, *, follow_symlinks: bool = True) -> bool: ...
+
+    def stat(self, *, follow_symlinks: bool = True) -> os.stat_result: ...
+
+
+class CachedDirEntry:
+    """
+    Объект из закешированного листинга. Повторяет интерфейс os.DirEntry.
+    """
+
+    __slots__ = ("name", "path", "__entry", "__cache_stat")
+
+    name: str
+    path: str
+    __entry: os.DirEntry
+    __cache_stat: bool
+
+    def __init__(self, entry: os.DirEntry, cache_stat: bool):
+        """
+        :param cache_stat: Кешировать stat. Без inotify изменение файла не меняет mtime директории, поэтому stat читается каждый раз.
+            stat поддиректорий не кешируется никогда: изменения внутри них не порождают событий у родителя.
+        """
+        self.name = entry.name
+        self.path = entry.path
+        self.__entry = entry
+        self.__cache_stat = cache_stat and not entry.is_dir(follow_symlinks=False)
+
+    def __fspath__(self) -> str:
+        return self.path
+
+    def __repr__(self) -> str:
+        return f"<{self.__class__.__name__} {self.name!r}>"
+
+    def inode(self) -> int:
+        return self.__entry.inode()
+
+    def is_symlink(self) -> bool:
+        return self.__entry.is_symlink()
+
+    def is_dir(self, *, follow_symlinks: bool = True) -> bool:
+        if follow_symlinks and self.__entry.is_symlink():
+            return self.__is_target(stat.S_ISDIR)
+        return self.__entry.is_dir(follow_symlinks=False)
+
+    def is_file(self, *, follow_symlinks: bool = True) -> bool:
+        if follow_symlinks and self.__entry.is_symlink():
+            return self.__is_target(stat.S_ISREG)
+        return self.__entry.is_file(follow_symlinks=False)
+
+    def stat(self, *, follow_symlinks: bool = True) -> os.stat_result:
+        # изменения цели ссылки не попадают в события её директории, поэтому цель не кешируется
+        if not self.__cache_stat or (follow_symlinks and self.__entry.is_symlink()):
+            return os.stat(self.path, follow_symlinks=follow_symlinks)
+        return self.__entry.stat(follow_symlinks=follow_symlinks)
+
+    def __is_target(self, check) -> bool:
+        try:
+            return check(self.stat().st_mode)
+        except OSError:
+            return False
+
+
+@dataclass
+class _Listing:
+    entries: list[CachedDirEntry]
+    dev: int
+    ino: int
+    mtime_ns: int
+    wd: int | None
+
+
+class Inotify:
+    """
+    Минимальная обертка над inotify через ctypes. Дескриптор неблокирующий, события вычитываются по запросу.
+    Наблюдать можно только за директориями: события о файлах приходят от их родителя с именем файла.
+    """
+
+    __libc: ctypes.CDLL
+    __fd: int
+
+    def __init__(self):
+        """
+        :raises OSError: inotify недоступен.
+        """
+        if not sys.platform.startswith("linux"):
+            raise OSError("inotify is available only on Linux")
+
+        self.__libc = ctypes.CDLL(None, use_errno=True)
+        self.__fd = self.__libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.__fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+
+    def add_watch(self, path: str) -> int:
+        """
+        :return: Дескриптор наблюдения. Для одной и той же директории, в том числе по разным путям, он одинаковый.
+        :raises OSError: Например, исчерпан лимит наблюдений (ENOSPC).
+        """
+        wd = self.__libc.inotify_add_watch(self.__fd, os.fsencode(path), _WATCH_MASK)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno), path)
+        return wd
+
+    def remove_watch(self, wd: int):
+        self.__libc.inotify_rm_watch(self.__fd, wd)
+
+    def read_events(self) -> Generator[tuple[int, int, str], None, None]:
+        """
+        Вычитывает все накопившиеся события, не блокируясь.
+        :return: Кортежи (wd, mask, name). name пустой для событий самой директории.
+        """
+        while True:
+            try:
+                data = os.read(self.__fd, 64 * 1024)
+            except BlockingIOError:
+                return
+
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = _EVENT.unpack_from(data, offset)
+                offset += _EVENT.size
+                name = data[offset:offset + length].rstrip(b"\0")
+                offset += length
+                yield wd, mask, os.fsdecode(name)
+
+    def fileno(self) -> int:
+        """
+        Дескриптор для select: становится читаемым, когда приходят события.
+        """
+        return self.__fd
+
+    def close(self):
+        os.close(self.__fd)
+
+
+class MetadataCacheService:
+    """
+    Кеш листингов директорий и stat объектов на время сессии REPL.
+    На Linux листинги инвалидируются событиями inotify, и stat объектов, кроме директорий, тоже кешируется.
+    Иначе листинг перечитывается при изменении mtime директории, а stat запрашивается каждый раз.
+    В обоих режимах при обращении проверяется, что путь всё ещё указывает на ту же директорию: это один stat вместо листинга.
+    """
+
+    _current: "MetadataCacheService | None" = None
+    _logger: logging.Logger
+
+    __lock: threading.Lock
+    __max_entries: int
+    __listings: collections.OrderedDict[str, _Listing]
+    __size: int
+    __inotify: Inotify | None
+    __watches: dict[int, set[str]]
+    __pending: dict[str, bool]
+    """
+    Директории, которые сейчас читаются. True, если за время чтения пришло событие и листинг нельзя сохранять.
+    """
+
+    def __init__(self, max_entries: int | None = None, use_inotify: bool = True):
+        """
+        :param max_entries: Максимальное суммарное количество объектов в кеше. По умолчанию MAX_CACHED_ENTRIES.
+        :param use_inotify: Использовать inotify, если он доступен.
+        """
+        self._logger = logging.getLogger(self.__class__.__name__)
+        self.__lock = threading.Lock()
+        self.__max_entries = max_entries or MAX_CACHED_ENTRIES
+        self.__listings = collections.OrderedDict()
+        self.__size = 0
+        self.__watches = {}
+        self.__pending = {}
+
+        self.__inotify = None
+        if use_inotify:
+            try:
+                self.__inotify = Inotify()
+            except (OSError, AttributeError) as e:
+                self._logger.debug("inotify is not available, falling back to mtime checks: %s", e)
+
+    @classmethod
+    def get_active(cls) -> "MetadataCacheService | None":
+        """
+        :return: Кеш текущей сессии или None, если кеширование не включено.
+        """
+        return cls._current
+
+    @contextlib.contextmanager
+    def activate(self):
+        """
+        Включает кеш для всех сервисов на время контекста. При выходе кеш закрывается.
+        """
+        previous = MetadataCacheService._current
+        MetadataCacheService._current = self
+        try:
+            yield self
+        finally:
+            MetadataCacheService._current = previous
+            self.close()
+
+    def scandir(self, path: str | os.PathLike[str]) -> list[CachedDirEntry]:
+        """
+        Содержимое директории из кеша или с диска.
+        :raises OSError: Директорию не удалось прочитать.
+        """
+        path = os.path.abspath(path)
+        st = os.stat(path)
+
+        with self.__lock:
+            self.__read_events()
+            listing = self.__listings.get(path)
+            if listing is not None:
+                if self.__is_valid(listing, st):
+                    self.__listings.move_to_end(path)
+                    return listing.entries
+                self.__drop(path)
+
+            # наблюдение ставится до чтения, чтобы изменения во время чтения не потерялись
+            wd = self.__watch(path)
+            self.__pending[path] = False
+
+        try:
+            with os.scandir(path) as it:
+                entries = [CachedDirEntry(entry, wd is not None) for entry in it]
+        except OSError:
+            with self.__lock:
+                self.__pending.pop(path, None)
+                self.__unwatch(wd, path)
+            raise
+
+        with self.__lock:
+            self.__read_events()
+            changed = self.__pending.pop(path, True)
+            racy = wd is None and time.time_ns() - st.st_mtime_ns < RACY_MTIME_NS
+            if changed or racy or len(entries) > self.__max_entries:
+                self.__unwatch(wd, path)
+            else:
+                self.__store(path, _Listing(entries, st.st_dev, st.st_ino, st.st_mtime_ns, wd))
+
+        return entries
+
+    def invalidate(self, path: str | os.PathLike | None = None):
+        """
+        Сбрасывает листинг директории или весь кеш, если 'path' не указан.
+        """
+        with self.__lock:
+            if path is None:
+                for cached in list(self.__listings):
+                    self.__drop(cached)
+            else:
+                self.__drop(os.path.abspath(path))
+
+    def close(self):
+        """
+        Очищает кеш и освобождает дескриптор inotify.
+        """
+        self.invalidate()
+        if self.__inotify is not None:
+            self.__inotify.close()
+            self.__inotify = None
+
+    @staticmethod
+    def __is_valid(listing: _Listing, st: os.stat_result) -> bool:
+        return (listing.dev, listing.ino, listing.mtime_ns) == (st.st_dev, st.st_ino, st.st_mtime_ns)
+
+    def __store(self, path: str, listing: _Listing):
+        self.__listings[path] = listing
+        self.__size += len(listing.entries)
+        while self.__size > self.__max_entries:
+            oldest = next(iter(self.__listings))
+            self.__drop(oldest)
+
+    def __drop(self, path: str):
+        listing = self.__listings.pop(path, None)
+        if listing is None:
+            return
+        self.__size -= len(listing.entries)
+        self.__unwatch(listing.wd, path)
+
+    def __watch(self, path: str) -> int | None:
+        if self.__inotify is None:
+            return None
+        try:
+            wd = self.__inotify.add_watch(path)
+        except OSError as e:
+            self._logger.debug("Failed to watch %s, falling back to mtime checks: %s", path, e)
+            return None
+        self.__watches.setdefault(wd, set()).add(path)
+        return wd
+
+    def __unwatch(self, wd: int | None, path: str):
+        if wd is None or self.__inotify is None:
+            return
+        paths = self.__watches.get(wd)
+        if paths is None:
+            return
+        paths.discard(path)
+        # одна директория может быть закеширована по нескольким путям с общим наблюдением
+        if not paths:
+            del self.__watches[wd]
+            self.__inotify.remove_watch(wd)
+
+    def __read_events(self):
+        if self.__inotify is None:
+            return
+
+        for wd, mask, name in self.__inotify.read_events():
+            if mask & _IN_Q_OVERFLOW:
+                # события потеряны, поэтому доверять нельзя ничему
+                self._logger.debug("inotify queue overflowed, dropping the whole cache")
+                for path in list(self.__listings):
+                    self.__drop(path)
+                for path in self.__pending:
+                    self.__pending[path] = True
+                continue
+
+            paths = self.__watches.get(wd, set())
+            if mask & _IN_IGNORED:
+                self.__watches.pop(wd, None)
+
+            for path in list(paths):
+                self.__invalidate_path(path)
+                # переименованная или удаленная поддиректория уносит с собой все закешированные пути внутри
+                if name and mask & _IN_ISDIR and mask & (_IN_MOVED_FROM | _IN_DELETE):
+                    self.__invalidate_subtree(os.path.join(path, name))
+
+    def __invalidate_path(self, path: str):
+        if path in self.__pending:
+            self.__pending[path] = True
+        self.__drop(path)
+
+    def __invalidate_subtree(self, root: str):
+        prefix = root + os.sep
+        for path in [path for path in self.__listings if path == root or path.startswith(prefix)]:
+            self.__drop(path)
+        for path in self.__pending:
+            if path == root or path.startswith(prefix):
+                self.__pending[path] = True
+
+
+def scandir(path: str | os.PathLike[str]) -> Iterator[DirEntryLike]:
+    """
+    То же, что os.scandir, но через кеш сессии, если он включен.
+    """
+    cache = MetadataCacheService.get_active()
+    if cache is None:
+        with os.scandir(path) as it:
+            yield from it
+    else:
+        yield from cache.scandir(path)
@@ -0,0 +1,240 @@
+import errno
+import os
+import shutil
+import stat
+import sys
+from dataclasses import dataclass
+from enum import StrEnum
+
+
+KERNEL_COPY = sys.platform.startswith("linux")
+"""
+Копировать средствами ядра Linux. Иначе файлы копируются через shutil.copyfile,
+который на других ОС сам использует системные вызовы вроде fcopyfile, если они есть.
+"""
+
+FICLONE = 0x40049409
+"""
+ioctl для создания reflink копии файла в Linux: _IOW(0x94, 9, int).
+"""
+
+USERSPACE_BLOCK_SIZE = 1024 * 1024
+"""
+Размер блока при копировании через буфер Python, когда ядро не умеет копировать само.
+"""
+
+SENDFILE_MAX_CHUNK = 1024 * 1024 * 1024
+"""
+Максимальный размер одного вызова sendfile. Ядро всё равно не передает больше ~2 ГБ за вызов.
+"""
+
+_UNSUPPORTED = frozenset({errno.EXDEV, errno.EINVAL, errno.ENOSYS, errno.EOPNOTSUPP, errno.ENOTTY,
+                          errno.EBADF, errno.EPERM})
+"""
+Ошибки, означающие, что способ копирования не поддерживается для этих файлов, и нужно попробовать следующий.
+"""
+
+
+class CopyMethod(StrEnum):
+    """
+    Способ копирования содержимого файла, от самого быстрого к самому медленному.
+    """
+
+    REFLINK = "reflink"
+    """
+    Файл делит блоки с источником (copy-on-write), данные не копируются вовсе.
+    """
+
+    COPY_FILE_RANGE = "copy_file_range"
+    """
+    Копирование внутри ядра. Некоторые ФС (NFS 4.2, XFS, Btrfs) делают его на стороне сервера или через reflink.
+    """
+
+    SENDFILE = "sendfile"
+    """
+    Копирование внутри ядра через page cache.
+    """
+
+    USERSPACE = "userspace"
+    """
+    Чтение и запись через буфер Python или копирование средствами shutil на других ОС.
+    """
+
+
+@dataclass
+class FileCopyResult:
+    method: CopyMethod
+    """
+    Самый медленный из способов, которыми копировались части файла.
+    """
+
+    sparse: bool
+    """
+    Файл содержит пустые области, которые скопированы без записи нулей.
+    """
+
+    size: int
+
+
+class FileCopyService:
+    """
+    Копирование файлов без прохода данных через Python, где это возможно.
+    На Linux по порядку пробуются FICLONE, os.copy_file_range и os.sendfile, а при их неподдержке - буфер Python.
+    В разреженных файлах копируются только области с данными (SEEK_DATA/SEEK_HOLE), поэтому копия тоже остается разреженной.
+    """
+
+    @classmethod
+    def copy_file(cls, source: str | os.PathLike, destination: str | os.PathLike,
+                  metadata: bool = True) -> FileCopyResult:
+        """
+        Копирует содержимое файла и права доступа. Как shutil.copy2 при 'metadata' = True, иначе как shutil.copy.
+        'destination' - путь файла, а не директории.
+        :param metadata: Копировать также время изменения и прочие метаданные.
+        :return: Каким способом скопирован файл.
+        :raises shutil.SameFileError: 'source' и 'destination' - один и тот же файл.
+        """
+        if os.path.exists(destination) and os.path.samefile(source, destination):
+            raise shutil.SameFileError(f"{source!r} and {destination!r} are the same file")
+
+        result = cls.__copy_content(source, destination)
+
+        if metadata:
+            shutil.copystat(source, destination)
+        else:
+            shutil.copymode(source, destination)
+        return result
+
+    @classmethod
+    def __copy_content(cls, source: str | os.PathLike, destination: str | os.PathLike) -> FileCopyResult:
+        if not KERNEL_COPY:
+            shutil.copyfile(source, destination)
+            return FileCopyResult(CopyMethod.USERSPACE, False, os.path.getsize(destination))
+
+        with open(source, "rb") as fsrc:
+            st = os.fstat(fsrc.fileno())
+            if not stat.S_ISREG(st.st_mode):
+                # каналы и устройства читаются как поток
+                shutil.copyfile(source, destination)
+                return FileCopyResult(CopyMethod.USERSPACE, False, os.path.getsize(destination))
+
+            with open(destination, "wb") as fdst:
+                src_fd, dst_fd = fsrc.fileno(), fdst.fileno()
+                sparse = st.st_blocks * 512 < st.st_size
+
+                if cls.__reflink(src_fd, dst_fd):
+                    return FileCopyResult(CopyMethod.REFLINK, sparse, st.st_size)
+
+                method = CopyMethod.COPY_FILE_RANGE
+                size = st.st_size
+                for offset, length in cls.__data_segments(src_fd, st.st_size, sparse):
+                    method, copied = cls.__copy_range(src_fd, dst_fd, offset, length, method)
+                    if copied < length:
+                        # файл укоротился во время копирования
+                        size = offset + copied
+                        break
+                else:
+                    # st_size файлов procfs и sysfs не совпадает с содержимым, а файл мог дописываться
+                    # во время копирования, поэтому после него данные дочитываются до конца файла
+                    while copied := cls.__copy_block(src_fd, dst_fd, size):
+                        method = CopyMethod.USERSPACE
+                        size += copied
+
+                # пустая область в конце файла не копируется, поэтому размер выставляется явно
+                os.ftruncate(dst_fd, size)
+                return FileCopyResult(method, sparse, size)
+
+    @staticmethod
+    def __reflink(src_fd: int, dst_fd: int) -> bool:
+        # fcntl есть только на Unix, а сюда доходит только Linux
+        import fcntl
+
+        try:
+            fcntl.ioctl(dst_fd, FICLONE, src_fd)
+        except OSError as e:
+            if e.errno not in _UNSUPPORTED:
+                raise
+            return False
+        return True
+
+    @staticmethod
+    def __data_segments(fd: int, size: int, sparse: bool):
+        """
+        Области файла с данными: (смещение, длина). Для неразреженного файла - весь файл одной областью.
+        """
+        if not sparse or not hasattr(os, "SEEK_DATA"):
+            if size:
+                yield 0, size
+            return
+
+        offset = 0
+        while offset < size:
+            try:
+                data = os.lseek(fd, offset, os.SEEK_DATA)
+            except OSError as e:
+                if e.errno == errno.ENXIO:
+                    # дальше до конца файла только пустая область
+                    return
+                if e.errno not in _UNSUPPORTED:
+                    raise
+                yield offset, size - offset
+                return
+
+            hole = min(os.lseek(fd, data, os.SEEK_HOLE), size)
+            if hole > data:
+                yield data, hole - data
+            offset = hole
+
+    @classmethod
+    def __copy_range(cls, src_fd: int, dst_fd: int, offset: int, length: int,
+                     method: CopyMethod) -> tuple[CopyMethod, int]:
+        """
+        Копирует область файла, переходя к следующему способу, если текущий не поддерживается.
+        :return: Способ, которым закончено копирование, и сколько байт скопировано. С этого способа начинается
+            копирование следующей области. Меньше 'length' байт копируется, только если файл закончился раньше.
+        """
+        start = offset
+        end = offset + length
+        while offset < end:
+            if method == CopyMethod.COPY_FILE_RANGE:
+                try:
+                    copied = os.copy_file_range(src_fd, dst_fd, end - offset, offset, offset)
+                except OSError as e:
+                    if e.errno not in _UNSUPPORTED:
+                        raise
+                    method = CopyMethod.SENDFILE
+                    continue
+            elif method == CopyMethod.SENDFILE:
+                try:
+                    os.lseek(dst_fd, offset, os.SEEK_SET)
+                    copied = os.sendfile(dst_fd, src_fd, offset, min(end - offset, SENDFILE_MAX_CHUNK))
+                except OSError as e:
+                    if e.errno not in _UNSUPPORTED:
+                        raise
+                    method = CopyMethod.USERSPACE
+                    continue
+            else:
+                copied = cls.__copy_block(src_fd, dst_fd, offset, min(end - offset, USERSPACE_BLOCK_SIZE))
+
+            if not copied:
+                if method == CopyMethod.USERSPACE:
+                    break
+                # ядро не копирует файлы procfs и sysfs и возвращает 0, поэтому конец файла проверяется чтением
+                method = CopyMethod.USERSPACE
+                continue
+            offset += copied
+        return method, offset - start
+
+    @staticmethod
+    def __copy_block(src_fd: int, dst_fd: int, offset: int, size: int = USERSPACE_BLOCK_SIZE) -> int:
+        """
+        Копирует блок через буфер Python.
+        :return: Сколько байт скопировано. 0 - конец файла.
+        """
+        data = os.pread(src_fd, size, offset)
+        view = memoryview(data)
+        position = offset
+        while view:
+            written = os.pwrite(dst_fd, view, position)
+            view = view[written:]
+            position += written
+        return len(data)
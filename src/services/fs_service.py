@@ -1,8 +1,54 @@
 from pathlib import Path
+import collections
+from concurrent.futures import ThreadPoolExecutor, Future, wait, as_completed, FIRST_COMPLETED
+from dataclasses import dataclass, field
+import errno
+import hashlib
+import json
 import shutil
 import stat
 import os
-from typing import Generator, Any
+import subprocess
+import sys
+import threading
+import uuid
+from typing import Generator, Any, Iterable, TextIO
+
+from src.services.cache_service import DirEntryLike, scandir
+from src.services.path_guard_service import PathGuardService
+from src.services.walk_service import WalkService
+from src.services.copy_service import FileCopyService, FileCopyResult, CopyMethod
+
+
+TRASH_DIR_NAME = ".pybash-trash"
+"""
+Имя директории корзины для 'rm --trash'. Создается в корне ФС удаляемого объекта или рядом с ним.
+"""
+
+REMOVE_MAX_OPEN_DIRS = 128
+"""
+Сколько директорий одновременно держит открытыми удаление дерева. Директория открыта, пока удаляется её содержимое,
+поэтому поддиректории удаляются в глубину, и число дескрипторов не растет с шириной дерева.
+"""
+
+_PURGE_SCRIPT = """
+import os, shutil, sys
+for trash in sys.argv[1:]:
+    for entry in os.scandir(trash):
+        if entry.is_dir(follow_symlinks=False):
+            shutil.rmtree(entry.path, ignore_errors=True)
+        else:
+            try:
+                os.unlink(entry.path)
+            except OSError:
+                pass
+"""
+"""
+Очистка корзин в отдельном процессе. Удаляет и то, что осталось от прерванных очисток.
+"""
+
+_DIR_FD_SUPPORTED = (os.open in os.supports_dir_fd and os.unlink in os.supports_dir_fd
+                     and os.rmdir in os.supports_dir_fd and os.scandir in os.supports_fd)
 
 
 class ConfirmationRequiredError(Exception):
@@ -20,145 +66,957 @@ class FlagRequiredError(Exception):
     pass
 
 
+@dataclass
+class _UsageNode:
+    """
+    Директория, размер которой еще считается.
+    """
+
+    path: str
+    parent: "_UsageNode | None"
+    depth: int
+    size: int
+    pending: int = 0
+    """
+    Количество поддиректорий, размер которых еще не посчитан.
+    """
+
+
+@dataclass
+class _RemoveNode:
+    """
+    Директория, содержимое которой еще удаляется.
+    """
+
+    path: str
+    parent: "_RemoveNode | None"
+    pending: int = 0
+    fd: int | None = None
+    """
+    Дескриптор директории. Открыт, пока удаляется её содержимое: поддиректории открываются и удаляются относительно него.
+    """
+
+
+@dataclass
+class CopyStats:
+    """
+    Итоги копирования.
+    """
+
+    copied: int = 0
+    copied_bytes: int = 0
+    skipped: int = 0
+    """
+    Файлы, пропущенные в режиме синхронизации, потому что они не изменились.
+    """
+
+    skipped_bytes: int = 0
+    deleted: int = 0
+    """
+    Объекты, удаленные из назначения в режиме синхронизации, потому что их нет в источнике.
+    """
+
+    methods: collections.Counter[CopyMethod] = field(default_factory=collections.Counter)
+    """
+    Количество файлов, скопированных каждым способом.
+    """
+
+    sparse: int = 0
+    """
+    Разреженные файлы, у которых скопированы только области с данными.
+    """
+
+
+@dataclass
+class _CopyPlan:
+    """
+    Объекты, которые нужно скопировать для одного источника.
+    """
+
+    source: Path
+    dirs: list[tuple[str, str]]
+    """
+    Пары (источник, назначение). Родительские директории идут раньше дочерних.
+    """
+
+    files: list[tuple[str, str, int, bool]]
+    """
+    Источник, назначение, размер (-1, если не известен) и признак того, что перед копированием нужно сравнить содержимое.
+    """
+
+    metadata: bool
+    """
+    Копировать метаданные файлов, как shutil.copy2. Иначе только права доступа, как shutil.copy.
+    """
+
+    extras: list[str] = field(default_factory=list)
+    """
+    Объекты назначения, которых нет в источнике. Удаляются после копирования.
+    """
+
+    stats: CopyStats = field(default_factory=CopyStats)
+    errors: list[tuple[str, str, str]] = field(default_factory=list)
+    """
+    Ошибки в формате shutil.Error: (источник, назначение, описание).
+    """
+
+
 class FileSystemService:
     """
     Сервис операций с файловой системой.
     """
 
     @staticmethod
-    def is_hidden(path: Path) -> bool:
+    def is_hidden(path: Path | DirEntryLike) -> bool:
         """
         Проверяет, является ли объект скрытым.
+        Атрибуты читаются только на Windows. Для DirEntry используется его закешированный stat.
         """
         if path.name.startswith("."):
             return True
 
-        # для Windows
-        if hasattr(path.stat(), "st_file_attributes") and path.stat().st_file_attributes & stat.FILE_ATTRIBUTE_HIDDEN:
-            return True
+        # атрибут 'скрытый' есть только на Windows, на остальных ОС лишний stat не нужен
+        if os.name != "nt":
+            return False
 
-        return False
+        return bool(getattr(path.stat(), "st_file_attributes", 0) & stat.FILE_ATTRIBUTE_HIDDEN)
 
-    @staticmethod
-    def copy(source: Path, destination: Path,
-             recursive: bool = False, override: bool = False):
+    @classmethod
+    def copy(cls, source: Path, destination: Path,
+             recursive: bool = False, override: bool = False, jobs: int | None = None,
+             sync: bool = False, checksum: bool = False, delete: bool = False) -> CopyStats:
         """
         Копирует объект.
         Перезапись только с 'override' = True. Копирование директорий только с 'recursive' = True.
         Если целевой объект - существующая директория, то копирует объект внутрь с тем же именем.
+        Файлы директорий копируются параллельно, см. 'copy_many'.
         :param recursive: Разрешает копирование директорий со всем содержимым.
         :param override: Разрешает перезапись объектов.
+        :param jobs: Количество потоков для копирования файлов. По умолчанию как в ThreadPoolExecutor.
+        :param sync: Режим синхронизации: копируются только новые файлы и файлы с другими размером или временем изменения.
+            Перезапись разрешена без 'override'.
+        :param checksum: В режиме синхронизации сравнивать файлы одного размера по содержимому, а не по времени изменения.
+        :param delete: В режиме синхронизации удалять из назначения объекты, которых нет в источнике.
         :raises ConfirmationRequiredError: Попытка перезаписать существующий объект без 'override' = True.
         :raises FlagRequiredError: Попытка рекурсивно скопировать директорию без 'recursive' = True.
+        :raises shutil.Error: Не удалось скопировать часть объектов. Содержит список (источник, назначение, ошибка).
         """
+        cls.__check_copy(source, destination, recursive, override or sync, PathGuardService(destination))
 
-        overriding = destination.is_file() or (destination.is_dir() and (destination / source.name).exists())
-        if overriding and not override:
-            raise ConfirmationRequiredError("Destination file already exists, 'override' must be True")
-
-        if source.is_dir() and not recursive:
-            raise FlagRequiredError(f"'{source.name}' is a directory, 'recursive' must be True")
-
-        if source.is_dir():
-            if destination.is_dir():
-                shutil.copytree(source, destination / source.name, dirs_exist_ok=True)
-            else:
-                shutil.copytree(source, destination, dirs_exist_ok=True)
-        else:
-            shutil.copy(source, destination)
+        plan = cls.__plan_copy(source, destination, sync, checksum, delete)
+        cls.__run_copy([plan], jobs)
+        if plan.errors:
+            raise shutil.Error(plan.errors)
+        return plan.stats
 
     @classmethod
-    def copy_many(cls, sources: list[Path], destination: Path, recursive: bool = False) \
-            -> Generator[tuple[Path, Exception], Any, None]:
+    def copy_many(cls, sources: list[Path], destination: Path, recursive: bool = False, jobs: int | None = None,
+                  sync: bool = False, checksum: bool = False, delete: bool = False) \
+            -> Generator[tuple[Path, Exception], Any, CopyStats]:
         """
-        Поочередно копирует все объекты 'sources' в 'destination'. При возникновении предвиденного исключения переходит к следующему элементу.
+        Копирует все объекты 'sources' в 'destination'. При возникновении предвиденного исключения переходит к следующему элементу.
+        Сначала для всех объектов запрашиваются подтверждения, потом обходятся деревья директорий и создаются директории,
+        а затем файлы всех объектов копируются в пуле потоков, чтобы задержки на каждом файле накладывались друг на друга.
+        Параметры синхронизации описаны в 'copy'.
         :param recursive: Разрешает копирование директорий со всем содержимым.
+        :param jobs: Количество потоков для копирования файлов. По умолчанию как в ThreadPoolExecutor.
         :return:
             Кортеж (path, exception) для каждого объекта, при копировании которого возникло предвиденное исключение.
             ConfirmationRequiredError - запрос подтверждения на перезапись объекта. Ожидает bool в качестве ответа. Если bool(value) == True, то повторяет операцию с подтверждением на перезапись.
             FlagRequiredError - копирование объекта пропущено из-за отсутствия флага на рекурсивное копирование. Не ожидает ответа.
-            OSError - любое исключение ОС, возникшее при копировании объекта.
+            OSError - любое исключение ОС, возникшее при копировании объекта. Возвращаются после копирования всех объектов.
+            По завершении генератор возвращает (в StopIteration.value) итоги копирования всех объектов.
         """
         if not destination.is_dir() and len(sources) != 1:
             raise OSError("Can't copy many object to one file")
 
+        guard = PathGuardService(destination)
+        approved = []
         for source in sources:
             try:
-                cls.copy(source, destination, recursive=recursive)
+                cls.__check_copy(source, destination, recursive, sync, guard)
+                approved.append(source)
             except ConfirmationRequiredError as e:
                 confirmed = yield source, e
                 if confirmed:
-                    cls.copy(source, destination, recursive=recursive, override=True)
+                    approved.append(source)
             except FlagRequiredError as e:
                 yield source, e
             except OSError as e:
                 yield source, e
 
+        plans = [cls.__plan_copy(source, destination, sync, checksum, delete) for source in approved]
+        cls.__run_copy(plans, jobs)
+
+        stats = CopyStats()
+        for plan in plans:
+            for name, value in vars(plan.stats).items():
+                setattr(stats, name, getattr(stats, name) + value)
+            if plan.errors:
+                yield plan.source, shutil.Error(plan.errors)
+        return stats
+
     @staticmethod
-    def move(source: Path, destination: Path, override: bool = False):
+    def __check_copy(source: Path, destination: Path, recursive: bool, override: bool, guard: PathGuardService):
+        """
+        Проверяет, можно ли копировать объект без подтверждения и флагов.
+        :param guard: Проверка относительно 'destination'.
+        :raises ConfirmationRequiredError: Попытка перезаписать существующий объект без 'override' = True.
+        :raises FlagRequiredError: Попытка рекурсивно скопировать директорию без 'recursive' = True.
+        :raises OSError: Директорию копируют саму в себя.
+        """
+        guard.check(source, follow_symlinks=True)
+        overriding = destination.is_file() or (destination.is_dir() and (destination / source.name).exists())
+        if overriding and not override:
+            raise ConfirmationRequiredError("Destination file already exists, 'override' must be True")
+
+        if source.is_dir() and not recursive:
+            raise FlagRequiredError(f"'{source.name}' is a directory, 'recursive' must be True")
+
+    @classmethod
+    def __plan_copy(cls, source: Path, destination: Path, sync: bool, checksum: bool, delete: bool) -> _CopyPlan:
+        """
+        Обходит дерево источника и составляет списки директорий и файлов для копирования.
+        Как и в shutil.copytree, символические ссылки раскрываются. Директория, уже встреченная при обходе, пропускается,
+        чтобы ссылка на родителя не зациклила копирование.
+        В режиме синхронизации содержимое каждой директории назначения читается одним scandir,
+        а неизмененные файлы сразу учитываются как пропущенные.
+        """
+        if not source.is_dir():
+            target = destination / source.name if destination.is_dir() else destination
+            # одиночный файл копируется без метаданных, как shutil.copy, но для синхронизации нужно время изменения
+            plan = _CopyPlan(source, [], [], metadata=sync)
+            if not sync:
+                plan.files.append((str(source), str(target), -1, False))
+                return plan
+
+            try:
+                existing = os.stat(target)
+            except FileNotFoundError:
+                existing = None
+            cls.__plan_file(plan, str(source), str(target), source.stat(), existing, checksum)
+            return plan
+
+        target = destination / source.name if destination.is_dir() else destination
+        plan = _CopyPlan(source, [(str(source), str(target))], [], metadata=True)
+        st = source.stat()
+        visited = {(st.st_dev, st.st_ino)}
+        stack = [(str(source), str(target))]
+        while stack:
+            src, dst = stack.pop()
+            try:
+                entries = list(scandir(src))
+                listing = cls.__list_destination(dst) if sync else {}
+            except OSError as e:
+                plan.errors.append((src, dst, str(e)))
+                continue
+
+            for entry in entries:
+                entry_dst = os.path.join(dst, entry.name)
+                existing_entry = listing.pop(entry.name, None)
+                try:
+                    if not entry.is_dir():
+                        if sync:
+                            existing_st = existing_entry.stat() if existing_entry is not None else None
+                            cls.__plan_file(plan, entry.path, entry_dst, entry.stat(), existing_st, checksum)
+                        else:
+                            plan.files.append((entry.path, entry_dst, -1, False))
+                        continue
+
+                    st = entry.stat()
+                except OSError as e:
+                    plan.errors.append((entry.path, entry_dst, str(e)))
+                    continue
+
+                if (st.st_dev, st.st_ino) in visited:
+                    plan.errors.append((entry.path, entry_dst, "Directory was already copied, symbolic link loop?"))
+                    continue
+                visited.add((st.st_dev, st.st_ino))
+
+                plan.dirs.append((entry.path, entry_dst))
+                stack.append((entry.path, entry_dst))
+
+            if delete:
+                plan.extras.extend(entry.path for entry in listing.values())
+        return plan
+
+    @staticmethod
+    def __list_destination(path: str) -> dict[str, DirEntryLike]:
+        """
+        Содержимое директории назначения по именам. Пусто, если директории еще нет.
+        """
+        try:
+            return {entry.name: entry for entry in scandir(path)}
+        except FileNotFoundError:
+            return {}
+
+    @staticmethod
+    def __plan_file(plan: _CopyPlan, src: str, dst: str, st: os.stat_result, existing: os.stat_result | None,
+                    checksum: bool):
+        """
+        Добавляет файл в план синхронизации, если он изменился.
+        """
+        if existing is not None and existing.st_size == st.st_size:
+            if checksum:
+                # содержимое сравнивается в пуле потоков перед копированием
+                plan.files.append((src, dst, st.st_size, True))
+                return
+            # как в rsync, время сравнивается с точностью до секунды: не все ФС хранят наносекунды
+            if int(existing.st_mtime) == int(st.st_mtime):
+                plan.stats.skipped += 1
+                plan.stats.skipped_bytes += st.st_size
+                return
+
+        plan.files.append((src, dst, st.st_size, False))
+
+    @classmethod
+    def __run_copy(cls, plans: list[_CopyPlan], jobs: int | None):
+        """
+        Выполняет копирование: создает директории, копирует файлы в пуле потоков, переносит метаданные директорий
+        и удаляет лишние объекты назначения. Ошибки записываются в 'errors' планов.
+        """
+        for plan in plans:
+            for src, dst in plan.dirs:
+                try:
+                    os.makedirs(dst, exist_ok=True)
+                except OSError as e:
+                    plan.errors.append((src, dst, str(e)))
+
+        with ThreadPoolExecutor(jobs) as executor:
+            futures = {executor.submit(cls.__copy_file, src, dst, plan.metadata, compare): (plan, src, dst, size)
+                       for plan in plans for src, dst, size, compare in plan.files}
+            for future in as_completed(futures):
+                plan, src, dst, size = futures[future]
+                try:
+                    result = future.result()
+                except OSError as e:
+                    plan.errors.append((src, dst, str(e)))
+                    continue
+
+                if result is not None:
+                    plan.stats.copied += 1
+                    plan.stats.copied_bytes += result.size
+                    plan.stats.methods[result.method] += 1
+                    plan.stats.sparse += result.sparse
+                else:
+                    plan.stats.skipped += 1
+                    plan.stats.skipped_bytes += size
+
+        # как в shutil.copytree, метаданные директорий копируются после содержимого, иначе его запись их изменит
+        for plan in plans:
+            for src, dst in reversed(plan.dirs):
+                try:
+                    shutil.copystat(src, dst)
+                except OSError as e:
+                    plan.errors.append((src, dst, str(e)))
+
+            for extra in plan.extras:
+                try:
+                    if os.path.isdir(extra) and not os.path.islink(extra):
+                        shutil.rmtree(extra)
+                    else:
+                        os.remove(extra)
+                    plan.stats.deleted += 1
+                except OSError as e:
+                    plan.errors.append((extra, extra, str(e)))
+
+    @staticmethod
+    def __copy_file(src: str, dst: str, metadata: bool, compare: bool) -> FileCopyResult | None:
+        """
+        :param compare: Сначала сравнить содержимое и не копировать одинаковые файлы.
+        :return: Способ копирования или None, если файл не изменился.
+        """
+        if compare and _same_content(src, dst):
+            return None
+        return FileCopyService.copy_file(src, dst, metadata=metadata)
+
+    @classmethod
+    def move(cls, source: Path, destination: Path, override: bool = False, jobs: int | None = None):
         """
         Перемещает или переименовывает объект. Перезапись существующего объекта только при 'override' = True.
         Если 'destination' - существующая директория, то перемещает внутрь с исходным названием.
+        Перемещение между ФС выполняется копированием, см. 'move_many'.
         :param override: Разрешает перезапись существующего файла.
+        :param jobs: Количество потоков для копирования файлов между ФС. По умолчанию как в ThreadPoolExecutor.
         :raises FlagRequiredError: Попытка перезаписи объекта без 'override' = True.
+        :raises shutil.Error: Часть объектов не удалось переместить между ФС. Они остались в источнике.
         """
+        PathGuardService(destination).check(source)
+        if cls.__is_overriding_move(source, destination) and not override:
+            raise FlagRequiredError("Destination already exists, 'override' must be True")
+
+        errors = cls.__move(source, destination, jobs)
+        if errors:
+            raise shutil.Error(errors)
 
+    @classmethod
+    def move_many(cls, sources: list[Path], destination: Path, jobs: int | None = None) \
+            -> Generator[tuple[Path, Exception], Any, None]:
+        """
+        Перемещает все объекты 'sources' в 'destination'. Протокол такой же, как у 'copy_many'.
+        В пределах одной ФС объекты переименовываются. Между ФС файлы копируются в пуле потоков средствами ядра,
+        и каждый исходный файл удаляется сразу после проверки его копии. Ход перемещения записывается в журнал
+        в директории назначения, поэтому прерванное перемещение при повторном запуске продолжается с места остановки.
+        :param jobs: Количество потоков для копирования файлов между ФС. По умолчанию как в ThreadPoolExecutor.
+        :return:
+            Кортеж (path, exception) для каждого объекта, при перемещении которого возникло предвиденное исключение.
+            ConfirmationRequiredError - запрос подтверждения на перезапись объекта. Ожидает bool в качестве ответа.
+            OSError - любое исключение ОС, возникшее при перемещении объекта.
+        """
+        if not destination.is_dir() and len(sources) != 1:
+            raise OSError("Can't move many objects to one file")
+
+        # все источники проверяются по одному множеству родителей назначения
+        checked = PathGuardService(destination).check_many(source for source in sources if os.path.lexists(source))
+        approved = []
+        for source in sources:
+            if not os.path.lexists(source):
+                yield source, FileNotFoundError(f"No such file or directory: '{source}'")
+            elif isinstance(error := checked[source], OSError):
+                yield source, error
+            elif cls.__is_overriding_move(source, destination) and not cls.__is_resumable(source, destination):
+                confirmed = yield source, ConfirmationRequiredError("Destination already exists")
+                if confirmed:
+                    approved.append(source)
+            else:
+                approved.append(source)
+
+        for source in approved:
+            try:
+                errors = cls.__move(source, destination, jobs)
+            except OSError as e:
+                yield source, e
+                continue
+            if errors:
+                yield source, shutil.Error(errors)
+
+    @staticmethod
+    def __is_overriding_move(source: Path, destination: Path) -> bool:
         if destination.is_dir():
-            overriding = (destination / source.name).exists()
+            return (destination / source.name).exists()
+        return destination.exists()
+
+    @staticmethod
+    def __is_resumable(source: Path, destination: Path) -> bool:
+        """
+        Назначение существует, потому что перемещение этого же объекта было прервано. Подтверждение не нужно.
+        """
+        target = destination / source.name if destination.is_dir() else destination
+        return _MoveJournal.exists(source, target)
+
+    @classmethod
+    def __move(cls, source: Path, destination: Path, jobs: int | None) -> list[tuple[str, str, str]]:
+        """
+        Перемещает объект переименованием, а если источник на другой ФС - копированием с удалением.
+        :return: Ошибки перемещения между ФС в формате shutil.Error.
+        """
+        target = destination / source.name if destination.is_dir() else destination
+        # при продолжении прерванного перемещения уже известно, что источник на другой ФС
+        if not _MoveJournal.exists(source, target):
+            try:
+                os.replace(source, target)
+                return []
+            except OSError as e:
+                if e.errno != errno.EXDEV:
+                    raise
+
+        journal = _MoveJournal(source, target)
+        errors = cls.__move_across_devices(source, target, jobs, journal)
+        journal.close(completed=not errors)
+        return errors
+
+    @classmethod
+    def __move_across_devices(cls, source: Path, target: Path, jobs: int | None,
+                              journal: "_MoveJournal") -> list[tuple[str, str, str]]:
+        """
+        Копирует дерево на другую ФС и удаляет из источника каждый файл, копия которого проверена.
+        Символические ссылки переносятся как ссылки. Исходные директории удаляются, если после переноса они пусты.
+        """
+        errors: list[tuple[str, str, str]] = []
+        dirs: list[tuple[str, str]] = []
+        files: list[tuple[str, str]] = []
+        if source.is_dir() and not source.is_symlink():
+            def on_error(path: str, e: OSError):
+                errors.append((path, os.path.join(target, os.path.relpath(path, source)), str(e)))
+
+            dirs.append((str(source), str(target)))
+            # директория возвращается раньше своего содержимого, поэтому создаются и удаляются они в правильном порядке
+            for rel, entry in WalkService().iter_relative(source, on_error):
+                entry_dst = os.path.join(target, rel)
+                if entry.is_dir(follow_symlinks=False):
+                    dirs.append((entry.path, entry_dst))
+                else:
+                    files.append((entry.path, entry_dst))
         else:
-            overriding = destination.exists()
+            files.append((str(source), str(target)))
 
-        if overriding and not override:
-            raise FlagRequiredError("Destination already exists, 'override' must be True")
+        for src, dst in dirs:
+            try:
+                os.makedirs(dst, exist_ok=True)
+            except OSError as e:
+                errors.append((src, dst, str(e)))
 
-        shutil.move(source, destination)
+        with ThreadPoolExecutor(jobs) as executor:
+            futures = {executor.submit(cls.__move_file, src, dst, journal): (src, dst) for src, dst in files}
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except OSError as e:
+                    errors.append((*futures[future], str(e)))
+
+        for src, dst in reversed(dirs):
+            try:
+                shutil.copystat(src, dst)
+                os.rmdir(src)
+            except OSError as e:
+                # непустая директория значит, что часть файлов не перенесена, и ошибка уже записана
+                if e.errno != errno.ENOTEMPTY:
+                    errors.append((src, dst, str(e)))
+        return errors
+
+    @staticmethod
+    def __move_file(src: str, dst: str, journal: "_MoveJournal"):
+        """
+        Копирует файл и удаляет источник, если копия совпадает с ним по размеру, а сам источник не менялся во время копирования.
+        Проверенная копия записывается в журнал до удаления источника. Файл, уже скопированный до прерывания,
+        повторно не копируется.
+        """
+        st = os.lstat(src)
+        if stat.S_ISLNK(st.st_mode):
+            if os.path.lexists(dst):
+                os.remove(dst)
+            os.symlink(os.readlink(src), dst)
+        elif stat.S_ISREG(st.st_mode):
+            if not journal.is_copied(src, st, dst):
+                FileCopyService.copy_file(src, dst, metadata=True)
+
+            after = os.lstat(src)
+            if (after.st_size, after.st_mtime_ns) != (st.st_size, st.st_mtime_ns):
+                raise OSError(f"'{src}' changed while being moved, the source is kept")
+            if os.stat(dst).st_size != st.st_size:
+                raise OSError(f"Size of the copy '{dst}' doesn't match the source, the source is kept")
+            journal.record(src, st)
+        else:
+            raise OSError(f"Can't move special file '{src}' to another filesystem")
+
+        os.remove(src)
 
     @classmethod
-    def remove(cls, item: Path, recursive: bool = False, confirmed: bool = False):
+    def remove(cls, item: Path, recursive: bool = False, confirmed: bool = False,
+               jobs: int | None = None, trash: bool = False, st: os.stat_result | None = None,
+               purge: bool = True) -> Path | None:
         """
         Удаляет объект. Удаление директорий только с 'recursive' = True.
+        Символическая ссылка удаляется сама, без объекта, на который она указывает.
         :param recursive: Разрешает удаление непустых директорий.
         :param confirmed: Разрешает удаление элементов, для которых требуется подтверждение.
+        :param jobs: Количество потоков для удаления содержимого директорий. По умолчанию как в ThreadPoolExecutor.
+        :param trash: Мгновенно переместить объект в корзину на той же ФС и удалить его в фоновом процессе.
+        :param st: stat объекта, полученный при проверке 'PathGuardService.check_many'. При удалении многих объектов
+            лучше проверить их все сразу. По умолчанию объект проверяется относительно текущей директории.
+        :param purge: Сразу запустить очистку корзины. При удалении многих объектов лучше выключить
+            и очистить все корзины одним вызовом 'purge_trash'.
+        :return: Корзина, в которую перемещен объект, если 'trash' = True.
         :raises FlagRequiredError: Попытка удаления непустой директории без 'recursive' = True.
+        :raises shutil.Error: Часть содержимого директории не удалось удалить. Содержит список (путь, ошибка).
         """
-        cls.__assert_is_not_anchor(item)
-        cls.__assert_is_not_parent(item, Path.cwd())
+        if st is None:
+            st = PathGuardService().check(item)
 
-        if item.is_dir() and any(item.iterdir()) and not recursive:
+        is_dir = stat.S_ISDIR(st.st_mode)
+        if is_dir and not recursive and not cls.__is_empty_dir(item):
             raise FlagRequiredError("Can't remove a non-empty directory with 'recursive' = False.")
 
         # по факту дублирует 'recursive', но так написано в ТЗ(
-        if item.is_dir() and not confirmed:
+        if is_dir and not confirmed:
             raise ConfirmationRequiredError("Can't remove a non-empty directory with 'confirmed' = False.")
 
-        if item.is_dir():
-            shutil.rmtree(item)
+        if trash:
+            trash_dir = cls.__move_to_trash(item)
+            if purge:
+                cls.purge_trash([trash_dir])
+            return trash_dir
+
+        if is_dir:
+            cls.__remove_tree(item, jobs)
         else:
             os.remove(item)
+        return None
 
     @staticmethod
-    def __assert_is_not_parent(potential_parent: Path, path: Path):
+    def __is_empty_dir(path: Path) -> bool:
+        # в отличие от iterdir, не читает всю директорию
+        with os.scandir(path) as it:
+            return next(it, None) is None
+
+    @classmethod
+    def __remove_tree(cls, path: Path, jobs: int | None):
         """
-        Вызывает исключение, если 'path' является дочерним путём для 'potential_parent'.
-        Иными словами, исключение если 'path' находится внутри 'potential_parent'.
-        :raises OSError: 'potential_parent' является одним из родителей 'path'
+        Удаляет дерево директорий. Каждая поддиректория открывается относительно дескриптора родителя,
+        и все объекты удаляются относительно дескриптора своей директории, без разбора полного пути.
+        Поэтому подмена директории в середине пути символической ссылкой не уводит удаление за пределы дерева.
+        Директории обрабатываются параллельно в пуле потоков, а каждая удаляется, как только удалено всё её содержимое.
+        Открытых директорий не больше REMOVE_MAX_OPEN_DIRS, кроме цепочек вложенности глубже этого предела.
+        :raises shutil.Error: Часть объектов не удалось удалить.
         """
+        if not _DIR_FD_SUPPORTED:
+            shutil.rmtree(path)
+            return
 
-        while True:
-            if path.samefile(potential_parent):
-                raise OSError("Operation is not allowed with parent directory.")
+        errors: list[tuple[str, str]] = []
+        executor = ThreadPoolExecutor(jobs)
+        futures: dict[Future, _RemoveNode] = {}
+        opened: set[int] = set()
+        # директории, которые еще не открыты. Первыми берутся последние добавленные, то есть обход идет в глубину,
+        # и открытые директории закрываются раньше, чем открываются их соседи
+        queued = [_RemoveNode(str(path), None)]
+        try:
+            while queued or futures:
+                # если всё открытое ждет своих поддиректорий, то следующая открывается сверх предела, иначе удаление встанет
+                while queued and (len(opened) + len(futures) < REMOVE_MAX_OPEN_DIRS or not futures):
+                    node = queued.pop()
+                    if node.parent is None:
+                        future = executor.submit(cls.__clear_dir, None, node.path, node.path)
+                    else:
+                        future = executor.submit(cls.__clear_dir, node.parent.fd, os.path.basename(node.path), node.path)
+                    futures[future] = node
+
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    node = futures.pop(future)
+                    try:
+                        node.fd, subdirs, file_errors = future.result()
+                        opened.add(node.fd)
+                        errors.extend(file_errors)
+                    except OSError as e:
+                        errors.append((node.path, str(e)))
+                        subdirs = []
+
+                    node.pending = len(subdirs)
+                    # в обратном порядке, чтобы поддиректории открывались в порядке чтения
+                    queued.extend(_RemoveNode(os.path.join(node.path, name), node) for name in reversed(subdirs))
+
+                    if not subdirs:
+                        cls.__complete_remove_node(node, opened, errors)
+        finally:
+            executor.shutdown(cancel_futures=True)
+            for fd in opened:
+                os.close(fd)
 
-            if path.parent.samefile(path):
+        if errors:
+            raise shutil.Error(errors)
+
+    @staticmethod
+    def __clear_dir(parent_fd: int | None, name: str, path: str) -> tuple[int, list[str], list[tuple[str, str]]]:
+        """
+        Открывает директорию и удаляет все её объекты, кроме поддиректорий.
+        :param parent_fd: Дескриптор родителя, относительно которого открывается 'name'. None для корня дерева.
+        :param path: Полный путь для сообщений об ошибках.
+        :return: Открытый дескриптор директории, имена поддиректорий и ошибки удаления файлов.
+        """
+        subdirs = []
+        errors = []
+        # O_NOFOLLOW: если директорию подменили ссылкой, удалять её содержимое нельзя
+        fd = os.open(name, os.O_RDONLY | os.O_DIRECTORY | os.O_NOFOLLOW, dir_fd=parent_fd)
+        try:
+            with os.scandir(fd) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.name)
+                        continue
+                    try:
+                        os.unlink(entry.name, dir_fd=fd)
+                    except FileNotFoundError:
+                        pass
+                    except OSError as e:
+                        errors.append((os.path.join(path, entry.name), str(e)))
+        except BaseException:
+            os.close(fd)
+            raise
+        return fd, subdirs, errors
+
+    @staticmethod
+    def __complete_remove_node(node: "_RemoveNode | None", opened: set[int], errors: list[tuple[str, str]]):
+        """
+        Закрывает дескриптор опустевшей директории и удаляет её и родителей, у которых удалено всё остальное.
+        """
+        while node is not None:
+            if node.fd is not None:
+                opened.discard(node.fd)
+                os.close(node.fd)
+                node.fd = None
+
+            parent = node.parent
+            try:
+                if parent is None:
+                    os.rmdir(node.path)
+                else:
+                    os.rmdir(os.path.basename(node.path), dir_fd=parent.fd)
+            except OSError as e:
+                # непустая директория значит, что часть содержимого не удалена, и ошибка уже записана
+                if e.errno != errno.ENOTEMPTY or not errors:
+                    errors.append((node.path, str(e)))
+
+            if parent is None:
                 break
+            parent.pending -= 1
+            if parent.pending:
+                break
+            node = parent
 
-            path = path.parent
+    @staticmethod
+    def purge_trash(trashes: Iterable[Path]):
+        """
+        Запускает очистку корзин в одном отдельном процессе, который продолжает работу и после завершения оболочки.
+        """
+        paths = sorted({str(trash) for trash in trashes})
+        if not paths:
+            return
+        subprocess.Popen([sys.executable, "-c", _PURGE_SCRIPT, *paths],
+                         stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                         start_new_session=True)
+
+    @classmethod
+    def __move_to_trash(cls, item: Path) -> Path:
+        """
+        Атомарно переименовывает объект в корзину на той же ФС.
+        :return: Корзина.
+        :raises OSError: На ФС объекта не удалось создать корзину.
+        """
+        trash = cls.__get_trash_dir(item)
+        os.rename(item, trash / f"{uuid.uuid4().hex}-{item.name}")
+        return trash
+
+    @staticmethod
+    def __get_trash_dir(item: Path) -> Path:
+        """
+        Корзина в корне ФС объекта, а если там нет прав на запись - рядом с объектом.
+        """
+        dev = os.lstat(item).st_dev
+        parent = item.absolute().parent
+        if os.stat(parent).st_dev != dev:
+            raise OSError(f"'{item}' is a mount point and can't be moved to trash")
+
+        mount = parent
+        while mount.parent != mount and os.stat(mount.parent).st_dev == dev:
+            mount = mount.parent
+
+        for candidate in (mount / TRASH_DIR_NAME, parent / TRASH_DIR_NAME):
+            try:
+                candidate.mkdir(mode=0o700, exist_ok=True)
+            except OSError:
+                continue
+            if os.access(candidate, os.W_OK) and os.stat(candidate).st_dev == dev:
+                return candidate
+        raise OSError(f"Can't create a trash directory on the filesystem of '{item}'")
+
+    @classmethod
+    def disk_usage(cls, sources: Iterable[Path], max_depth: int | None = None, jobs: int | None = None,
+                   apparent_size: bool = False) -> Generator[tuple[Path, int | OSError], None, None]:
+        """
+        Считает место, занимаемое объектами. Директории обходятся параллельно в пуле потоков,
+        чтобы задержки stat на сетевых ФС накладывались друг на друга.
+        Файлы с несколькими жесткими ссылками учитываются один раз. Символические ссылки не раскрываются.
+        :param max_depth: Максимальная глубина директорий, для которых возвращается размер. 0 - только сами 'sources'.
+        :param jobs: Количество потоков. По умолчанию как в ThreadPoolExecutor.
+        :param apparent_size: Считать размер файлов, а не занимаемое на диске место.
+        :return:
+            Кортеж (path, size) для каждой директории, как только посчитано всё её содержимое, и для каждого файла из 'sources'.
+            Кортеж (path, exception), если директорию не удалось прочитать. Её содержимое в размере не учитывается.
+        :raises ValueError: 'max_depth' меньше 0.
+        """
+        if max_depth is not None and max_depth < 0:
+            raise ValueError("'max_depth' must be non-negative")
+
+        seen: set[tuple[int, int]] = set()
+        lock = threading.Lock()
+
+        def usage(st: os.stat_result) -> int:
+            if st.st_nlink > 1 and not stat.S_ISDIR(st.st_mode):
+                with lock:
+                    if (st.st_dev, st.st_ino) in seen:
+                        return 0
+                    seen.add((st.st_dev, st.st_ino))
+
+            if apparent_size or not hasattr(st, "st_blocks"):
+                return st.st_size
+            return st.st_blocks * 512
+
+        def scan(path: str) -> tuple[int, list[tuple[str, int]]]:
+            # возвращает размер файлов директории и поддиректории с их собственным размером
+            size = 0
+            subdirs = []
+            for entry in scandir(path):
+                try:
+                    st = entry.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+                if stat.S_ISDIR(st.st_mode):
+                    subdirs.append((entry.path, usage(st)))
+                else:
+                    size += usage(st)
+            return size, subdirs
+
+        executor = ThreadPoolExecutor(jobs)
+        futures: dict[Future, _UsageNode] = {}
+        try:
+            for source in sources:
+                try:
+                    st = os.lstat(source)
+                except OSError as e:
+                    yield source, e
+                    continue
+                if not stat.S_ISDIR(st.st_mode):
+                    yield source, usage(st)
+                    continue
+                node = _UsageNode(str(source), None, 0, usage(st))
+                futures[executor.submit(scan, node.path)] = node
+
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    node = futures.pop(future)
+                    try:
+                        size, subdirs = future.result()
+                    except OSError as e:
+                        yield Path(node.path), e
+                        size, subdirs = 0, []
+
+                    node.size += size
+                    node.pending = len(subdirs)
+                    for path, own_size in subdirs:
+                        child = _UsageNode(path, node, node.depth + 1, own_size)
+                        futures[executor.submit(scan, path)] = child
+
+                    if not subdirs:
+                        yield from cls.__complete_usage_node(node, max_depth)
+        finally:
+            executor.shutdown(cancel_futures=True)
+
+    @staticmethod
+    def __complete_usage_node(node: _UsageNode | None, max_depth: int | None) \
+            -> Generator[tuple[Path, int], None, None]:
+        """
+        Возвращает размер посчитанной директории и прибавляет его к родителям, у которых посчитано всё остальное.
+        """
+        while node is not None:
+            if max_depth is None or node.depth <= max_depth:
+                yield Path(node.path), node.size
+
+            parent = node.parent
+            if parent is None:
+                break
+            parent.size += node.size
+            parent.pending -= 1
+            if parent.pending:
+                break
+            node = parent
+
+
+def _same_content(first: str, second: str, block_size: int = 1024 * 1024) -> bool:
+    """
+    Побайтово сравнивает файлы одного размера. В отличие от сравнения хешей, останавливается на первом отличии.
+    """
+    with open(first, "rb") as f1, open(second, "rb") as f2:
+        while True:
+            block = f1.read(block_size)
+            if block != f2.read(block_size):
+                return False
+            if not block:
+                return True
+
+
+class _MoveJournal:
+    """
+    Журнал перемещения между ФС. Хранится рядом с назначением и удаляется после успешного перемещения.
+    Первая строка - JSON с источником и назначением, дальше по строке JSON на каждый файл, копия которого проверена:
+    путь, размер и время изменения источника.
+    """
+
+    __path: Path
+    __lock: threading.Lock
+    __resumed: bool
+    __file: TextIO
+    __copied: dict[str, tuple[int, int]]
+    """
+    Файлы, скопированные до прерывания: путь источника -> (размер, время изменения в нс).
+    """
+
+    def __init__(self, source: Path, target: Path):
+        self.__path, header = self.__locate(source, target)
+        self.__lock = threading.Lock()
+        self.__resumed = self.exists(source, target)
+        self.__copied = {}
+
+        if self.__resumed:
+            self.__replay()
+        else:
+            self.__path.write_text(header + "\n", encoding="utf-8")
+        self.__file = open(self.__path, "a", encoding="utf-8")
+
+    def __replay(self):
+        with open(self.__path, "r", encoding="utf-8") as f:
+            f.readline()
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # последняя строка могла не дописаться до прерывания
+                    continue
+                self.__copied[entry["path"]] = (entry["size"], entry["mtime_ns"])
+
+    @classmethod
+    def exists(cls, source: Path, target: Path) -> bool:
+        """
+        Проверяет, осталось ли от прерванного перемещения тех же объектов журнал.
+        """
+        path, header = cls.__locate(source, target)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return f.readline().rstrip("\n") == header
+        except FileNotFoundError:
+            return False
 
     @staticmethod
-    def __assert_is_not_anchor(path: Path):
+    def __locate(source: Path, target: Path) -> tuple[Path, str]:
+        """
+        :return: Путь журнала и его заголовок.
+        """
+        header = json.dumps({"source": os.path.abspath(source), "target": os.path.abspath(target)})
+        digest = hashlib.sha1(header.encode("utf-8")).hexdigest()[:16]
+        return target.parent / f".pybash-mv-{digest}.journal", header
+
+    def is_copied(self, src: str, st: os.stat_result, dst: str) -> bool:
+        """
+        Проверяет, был ли файл скопирован до прерывания. Если копия записана в журнал, а источник с тех пор
+        не менялся, то достаточно размера копии. Иначе копирование могло прерваться на середине,
+        когда размер копии уже выставлен, поэтому копия сравнивается с источником побайтово.
+        """
+        if not self.__resumed:
+            return False
+        try:
+            existing = os.stat(dst)
+        except FileNotFoundError:
+            return False
+        if existing.st_size != st.st_size:
+            return False
+        if self.__copied.get(src) == (st.st_size, st.st_mtime_ns):
+            return True
+        return _same_content(src, dst)
+
+    def record(self, src: str, st: os.stat_result):
+        """
+        Записывает файл, копия которого проверена. Вызывается до удаления источника.
+        """
+        line = json.dumps({"path": src, "size": st.st_size, "mtime_ns": st.st_mtime_ns})
+        with self.__lock:
+            self.__file.write(line + "\n")
+            self.__file.flush()
+
+    def close(self, completed: bool):
         """
-        Вызывает исключение, если 'path' является корневым каталогом.
-        Например '/' или 'C:/'.
-        :raises OSError: 'path' является корневым каталогом.
+        :param completed: Перемещение завершено без ошибок, журнал больше не нужен.
         """
-        if path.samefile(path.anchor):
-            raise OSError("Operation is not allowed with root path.")
+        self.__file.close()
+        if completed:
+            self.__path.unlink(missing_ok=True)
@@ -0,0 +1,251 @@
+import fnmatch
+import os
+import re
+from pathlib import Path
+from typing import Generator, Iterable, Iterator, Sequence
+
+from src.services.archive_fs_service import ArchiveFileSystemService
+from src.services.cache_service import DirEntryLike, scandir
+
+
+GLOB_CHARS = frozenset("*?[")
+"""
+Символы, с которыми аргумент считается шаблоном путей.
+"""
+
+_SEPARATORS = re.compile(r"[\\/]" if os.sep == "\\" else "/")
+
+_State = tuple[str, Sequence[DirEntryLike] | None]
+"""
+Путь, совпавший с началом шаблона, и содержимое директории по нему, если оно уже прочитано.
+"""
+
+
+class GlobService:
+    """
+    Разбор строки команды на аргументы и раскрытие шаблонов путей, как в bash: '*', '?', '[...]'
+    и '**' - любое количество вложенных директорий. Шаблоны в кавычках и экранированные символы не раскрываются,
+    а шаблон без совпадений остается как есть. Скрытые объекты совпадают, только если компонент шаблона начинается с точки.
+    Шаблон раскрывается по компонентам цепочкой генераторов: каждая директория читается один раз,
+    в памяти держатся только читаемые сейчас директории, а имена сравниваются с заранее скомпилированным выражением.
+    Если текущая директория находится внутри архива, относительные шаблоны раскрываются по записям архива.
+    """
+
+    @classmethod
+    def split(cls, line: str) -> list[str]:
+        """
+        Разбивает строку на аргументы по правилам shlex.split и раскрывает шаблоны путей.
+        :raises ValueError: Незакрытая кавычка или '\\' в конце строки.
+        """
+        return cls.__expand_words(_tokenize(line))
+
+    @classmethod
+    def expand_args(cls, args: Iterable[str]) -> list[str]:
+        """
+        Раскрывает шаблоны в уже разобранных аргументах. Кавычки здесь уже сняты, поэтому шаблоном считается любой аргумент со спецсимволами.
+        """
+        return cls.__expand_words((arg, arg if GLOB_CHARS.intersection(arg) else None) for arg in args)
+
+    @classmethod
+    def expand(cls, pattern: str) -> list[str]:
+        """
+        :return: Пути, совпадающие с шаблоном. Содержимое каждой директории отсортировано по имени.
+        """
+        parts = _SEPARATORS.split(pattern)
+        if not any(parts):
+            return []
+        dirs_only = len(parts) > 1 and parts[-1] == ""
+        if dirs_only:
+            parts.pop()
+        if parts[-1] == "**":
+            # '**' в конце - все объекты на любой глубине
+            parts.append("*")
+
+        states: Iterator[_State]
+        if parts[0] == "":
+            states = iter([("/", None)])
+            parts = parts[1:]
+        else:
+            states = iter([("", None)])
+
+        last = len(parts) - 1
+        for i, part in enumerate(parts):
+            if not part:
+                # повторные разделители: 'a//b'
+                continue
+            if part == "**":
+                states = cls.__walk(states)
+            elif GLOB_CHARS.intersection(part):
+                states = cls.__match(states, part, dirs_only or i != last)
+            else:
+                states = cls.__append(states, part)
+
+        suffix = "/" if dirs_only else ""
+        if GLOB_CHARS.intersection(parts[-1]):
+            return [path + suffix for path, _ in states]
+        # обычный последний компонент только дописан к путям, поэтому их существование нужно проверить
+        return [path + suffix for path, _ in states if _lexists(path)]
+
+    @classmethod
+    def __expand_words(cls, words: Iterable[tuple[str, str | None]]) -> list[str]:
+        result = []
+        for value, pattern in words:
+            matches = cls.expand(pattern) if pattern is not None else None
+            if matches:
+                result.extend(matches)
+            else:
+                result.append(value)
+        return result
+
+    @staticmethod
+    def __append(states: Iterable[_State], part: str) -> Generator[_State, None, None]:
+        """
+        Дописывает обычный компонент без чтения директорий. Существование пути проверит следующий компонент или 'expand'.
+        """
+        for path, _ in states:
+            yield _join(path, part), None
+
+    @staticmethod
+    def __match(states: Iterable[_State], part: str, dirs_only: bool) -> Generator[_State, None, None]:
+        """
+        Объекты каждой директории, имена которых совпадают с компонентом шаблона.
+        :param dirs_only: Оставлять только директории: за компонентом следуют другие.
+        """
+        flags = re.IGNORECASE if os.name == "nt" else 0
+        match = re.compile(fnmatch.translate(part), flags).match
+        show_hidden = part.startswith(".")
+
+        for path, entries in states:
+            if entries is None:
+                try:
+                    entries = _scandir(path)
+                except OSError:
+                    continue
+
+            if dirs_only:
+                entries = [entry for entry in entries if match(entry.name) and _is_dir(entry)]
+            # сравниваются и сортируются строки, а не DirEntry: на сотнях тысяч объектов это заметно быстрее
+            names = [name for name in map(_get_name, entries)
+                     if match(name) and (show_hidden or name[0] != ".")]
+            names.sort()
+            prefix = _join(path, "")
+            for name in names:
+                yield prefix + name, None
+
+    @staticmethod
+    def __walk(states: Iterable[_State]) -> Generator[_State, None, None]:
+        """
+        Каждая директория и все её поддиректории на любой глубине, в порядке обхода в глубину.
+        Прочитанное содержимое передается дальше, чтобы следующий компонент не читал директорию повторно.
+        Символические ссылки на директории, как и в bash, не раскрываются.
+        """
+        for root, entries in states:
+            stack = [(root, entries)]
+            while stack:
+                path, entries = stack.pop()
+                if entries is None:
+                    try:
+                        entries = _scandir(path)
+                    except OSError:
+                        continue
+                yield path, entries
+
+                subdirs = sorted((entry.name for entry in entries
+                                  if not entry.name.startswith(".") and entry.is_dir(follow_symlinks=False)),
+                                 reverse=True)
+                stack.extend((_join(path, name), None) for name in subdirs)
+
+
+def _scandir(path: str) -> Sequence[DirEntryLike]:
+    # внутри архива пути отсчитываются от текущей директории в нем, а не от настоящей текущей директории
+    if ArchiveFileSystemService.get_cwd() is not None:
+        location = ArchiveFileSystemService.locate(ArchiveFileSystemService.absolute(Path(path or os.curdir)),
+                                                   archive_as_dir=True)
+        if location is not None:
+            return ArchiveFileSystemService.scandir(location)
+    return list(scandir(path or "."))
+
+
+def _lexists(path: str) -> bool:
+    if ArchiveFileSystemService.get_cwd() is not None:
+        return ArchiveFileSystemService.lexists(ArchiveFileSystemService.absolute(Path(path)))
+    return os.path.lexists(path)
+
+
+def _join(path: str, name: str) -> str:
+    if not path:
+        return name
+    if path.endswith("/"):
+        return path + name
+    return f"{path}/{name}"
+
+
+def _get_name(entry: DirEntryLike) -> str:
+    return entry.name
+
+
+def _is_dir(entry: DirEntryLike) -> bool:
+    try:
+        return entry.is_dir()
+    except OSError:
+        return False
+
+
+def _tokenize(line: str) -> Generator[tuple[str, str | None], None, None]:
+    """
+    Разбивает строку на слова, как shlex.split в режиме posix, но запоминает, какие символы были в кавычках.
+    :return: Пары (слово, шаблон). Шаблон None, если в слове нет спецсимволов вне кавычек.
+        В шаблоне спецсимволы из кавычек экранированы, например '[*]'.
+    """
+    value: list[str] = []
+    pattern: list[str] = []
+    magic = False
+    in_word = False
+    quote = None
+
+    def add(char: str, quoted: bool):
+        nonlocal magic, in_word
+        value.append(char)
+        if char in GLOB_CHARS:
+            pattern.append(f"[{char}]" if quoted else char)
+            magic = magic or not quoted
+        else:
+            pattern.append(char)
+        in_word = True
+
+    i = 0
+    while i < len(line):
+        char = line[i]
+        if quote == "'":
+            if char == "'":
+                quote = None
+            else:
+                add(char, True)
+        elif quote == '"':
+            if char == '"':
+                quote = None
+            elif char == "\\" and i + 1 < len(line) and line[i + 1] in '"\\':
+                i += 1
+                add(line[i], True)
+            else:
+                add(char, True)
+        elif char in "'\"":
+            quote = char
+            in_word = True
+        elif char == "\\":
+            if i + 1 == len(line):
+                raise ValueError("No escaped character")
+            i += 1
+            add(line[i], True)
+        elif char.isspace():
+            if in_word:
+                yield "".join(value), "".join(pattern) if magic else None
+                value, pattern, magic, in_word = [], [], False, False
+        else:
+            add(char, False)
+        i += 1
+
+    if quote is not None:
+        raise ValueError("No closing quotation")
+    if in_word:
+        yield "".join(value), "".join(pattern) if magic else None
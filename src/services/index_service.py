@@ -0,0 +1,344 @@
+import codecs
+import contextlib
+import hashlib
+import logging
+import re
+import re._parser as re_parser    # type: ignore
+import sqlite3
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, Sequence
+
+from src.services.cache_service import DirEntryLike
+from src.services.walk_service import WalkService
+
+
+INDEX_ROOT = Path.home() / ".cache" / "pybash" / "index"
+"""
+Директория, в которой хранятся индексы. Индекс не кладется в саму директорию, чтобы не попадать в поиск.
+"""
+
+MAX_INDEXED_SIZE = 64 * 1024 * 1024
+"""
+Файлы больше этого размера не индексируются и всегда считаются кандидатами.
+"""
+
+HEAD_SIZE = 8 * 1024
+"""
+Размер начала файла, по которому определяется, можно ли индексировать файл.
+"""
+
+MAX_QUERY_TRIGRAMS = 64
+"""
+Максимальное количество триграмм в одном запросе. Лишние триграммы почти не сужают выборку, но замедляют запрос.
+"""
+
+_TRIGRAM = re.compile(b"...", re.DOTALL)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    indexed INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS trigrams (
+    trigram INTEGER NOT NULL,
+    file_id INTEGER NOT NULL,
+    PRIMARY KEY (trigram, file_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS trigrams_file ON trigrams (file_id);
+"""
+
+
+@dataclass
+class IndexUpdateStats:
+    added: int = 0
+    updated: int = 0
+    removed: int = 0
+    unchanged: int = 0
+
+
+class IndexSelection:
+    """
+    Результат запроса к индексу: какие файлы могут содержать совпадение.
+    """
+
+    __prefix: str
+    __excluded: dict[str, tuple[int, int]]
+
+    def __init__(self, prefix: str, excluded: dict[str, tuple[int, int]]):
+        """
+        :param prefix: Путь директории поиска относительно корня индекса.
+        :param excluded: mtime_ns и размер по относительному пути каждого проиндексированного файла,
+            в котором нет нужных триграмм.
+        """
+        self.__prefix = prefix
+        self.__excluded = excluded
+
+    def may_match(self, directory: Path, entry: DirEntryLike) -> bool:
+        """
+        Проверяет, может ли в файле быть совпадение.
+        Файлы, которых нет в индексе или которые изменились после индексации, всегда считаются кандидатами.
+        :param directory: Директория поиска, для которой получена выборка.
+        :param entry: Файл из обхода 'directory'.
+        """
+        key = self.__prefix + Path(entry.path).relative_to(directory).as_posix()
+        record = self.__excluded.get(key)
+        if record is None:
+            return True
+
+        try:
+            st = entry.stat()
+        except OSError:
+            # пусть ошибку обработает сам поиск
+            return True
+        return (st.st_mtime_ns, st.st_size) != record
+
+
+class IndexService:
+    """
+    Триграммный индекс директорий для ускорения повторного поиска.
+    Для каждого файла хранит набор триграмм его байтов в нижнем регистре.
+    Поиск по индексу отсеивает файлы, в которых нет всех триграмм обязательных литералов шаблона.
+    """
+
+    _logger: logging.Logger
+
+    __index_root: Path
+
+    def __init__(self, index_root: Path | None = None):
+        self._logger = logging.getLogger(self.__class__.__name__)
+        self.__index_root = index_root or INDEX_ROOT
+
+    def update(self, directory: Path, walker: WalkService | None = None) -> IndexUpdateStats:
+        """
+        Создает или обновляет индекс директории.
+        Заново индексируются только новые файлы и файлы с изменившимися mtime или размером.
+        :param walker: Обход директории. По умолчанию, как и в поиске, учитывает '.gitignore'.
+        :raises NotADirectoryError: 'directory' не является директорией.
+        """
+        if not directory.is_dir():
+            raise NotADirectoryError(str(directory))
+
+        directory = directory.resolve()
+        index_path = self.__get_index_path(directory)
+        index_path.parent.mkdir(parents=True, exist_ok=True)
+
+        stats = IndexUpdateStats()
+        with contextlib.closing(sqlite3.connect(index_path)) as connection, connection:
+            connection.executescript(_SCHEMA)
+            known = {path: (file_id, mtime_ns, size) for file_id, path, mtime_ns, size
+                     in connection.execute("SELECT id, path, mtime_ns, size FROM files")}
+
+            walker = walker or WalkService(use_ignore_files=True)
+            for entry in walker.iter_files(directory):
+                path = Path(entry.path)
+                try:
+                    st = entry.stat()
+                    key = path.relative_to(directory).as_posix()
+                    record = known.pop(key, None)
+                    if record is not None and record[1:] == (st.st_mtime_ns, st.st_size):
+                        stats.unchanged += 1
+                        continue
+
+                    trigrams = self.__read_trigrams(path, st.st_size)
+                except OSError as e:
+                    self._logger.warning("Failed to index %s: %s", path, e)
+                    continue
+
+                if record is None:
+                    stats.added += 1
+                else:
+                    stats.updated += 1
+                    self.__remove_file(connection, record[0])
+
+                cursor = connection.execute(
+                    "INSERT INTO files (path, mtime_ns, size, indexed) VALUES (?, ?, ?, ?)",
+                    (key, st.st_mtime_ns, st.st_size, trigrams is not None))
+                if trigrams:
+                    connection.executemany("INSERT INTO trigrams (trigram, file_id) VALUES (?, ?)",
+                                           ((trigram, cursor.lastrowid) for trigram in trigrams))
+
+            # всё, что осталось в known, удалено с диска
+            for file_id, _, _ in known.values():
+                self.__remove_file(connection, file_id)
+                stats.removed += 1
+
+        self._logger.debug("Updated index %s for %s: %s", index_path, directory, stats)
+        return stats
+
+    def select(self, directory: Path, pattern: str | Sequence[str], case_insensitive: bool = False,
+               encoding: str = "utf-8") -> IndexSelection | None:
+        """
+        Выбирает из индекса файлы, которые могут содержать совпадение с шаблоном.
+        Используется индекс самой директории или ближайшего из её родителей.
+        :param pattern: Регулярное выражение или несколько выражений, из которых должно совпасть хотя бы одно.
+        :return: None, если индекса нет или хотя бы из одного шаблона не удалось извлечь триграммы.
+        """
+        alternatives: list[set[int]] = []
+        for regex in ([pattern] if isinstance(pattern, str) else pattern):
+            required = _pattern_trigrams(regex, case_insensitive, encoding)
+            if required is None:
+                return None
+            alternatives.extend(required)
+        if not alternatives:
+            return None
+
+        directory = directory.resolve()
+        for root in (directory, *directory.parents):
+            index_path = self.__get_index_path(root)
+            if index_path.is_file():
+                break
+        else:
+            return None
+
+        prefix = directory.relative_to(root).as_posix() + "/" if directory != root else ""
+        # из индекса читаются только проиндексированные файлы директории поиска: остальные файлы и так просматриваются
+        query = "SELECT id, path, mtime_ns, size FROM files WHERE indexed"
+        parameters: tuple[str, ...] = ()
+        if prefix:
+            # все пути, начинающиеся с 'a/b/', лежат между 'a/b/' и 'a/b0', поэтому выборка идет по индексу пути
+            query += " AND path >= ? AND path < ?"
+            parameters = (prefix, prefix[:-1] + chr(ord("/") + 1))
+
+        # mode=ro, чтобы поиск никогда не создавал и не менял индекс
+        with contextlib.closing(sqlite3.connect(index_path.as_uri() + "?mode=ro", uri=True)) as connection:
+            candidates: set[int] = set()
+            for trigrams in alternatives:
+                placeholders = ",".join("?" * len(trigrams))
+                rows = connection.execute(
+                    f"SELECT file_id FROM trigrams WHERE trigram IN ({placeholders}) "
+                    f"GROUP BY file_id HAVING COUNT(*) = ?",
+                    (*trigrams, len(trigrams)))
+                candidates.update(file_id for file_id, in rows)
+
+            excluded = {path: (mtime_ns, size) for file_id, path, mtime_ns, size in connection.execute(query, parameters)
+                        if file_id not in candidates}
+
+        self._logger.debug("Index %s selected %s files and excluded %s for pattern %r",
+                           index_path, len(candidates), len(excluded), pattern)
+        return IndexSelection(prefix, excluded)
+
+    def __get_index_path(self, directory: Path) -> Path:
+        digest = hashlib.sha1(str(directory).encode("utf-8")).hexdigest()
+        return self.__index_root / f"{digest}.sqlite"
+
+    @staticmethod
+    def __read_trigrams(path: Path, size: int) -> set[int] | None:
+        """
+        :return: Триграммы файла или None, если файл не индексируется: слишком большой, бинарный или в UTF-16/32.
+        """
+        if size > MAX_INDEXED_SIZE:
+            return None
+
+        with open(path, "rb") as f:
+            head = f.read(HEAD_SIZE)
+            # нулевые байты есть и в бинарных файлах, и в UTF-16/32 тексте
+            if b"\0" in head or head.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+                return None
+            data = head + f.read()
+
+        return _trigrams(data.lower())
+
+    @staticmethod
+    def __remove_file(connection: sqlite3.Connection, file_id: int):
+        connection.execute("DELETE FROM trigrams WHERE file_id = ?", (file_id,))
+        connection.execute("DELETE FROM files WHERE id = ?", (file_id,))
+
+
+def _trigrams(data: bytes) -> set[int]:
+    """
+    Все различные триграммы байтов в виде чисел.
+    findall со смещением перебирает триграммы внутри re, что намного быстрее цикла по байтам.
+    """
+    result: set[bytes] = set()
+    for offset in range(3):
+        result.update(_TRIGRAM.findall(data, offset))
+    return {int.from_bytes(trigram, "big") for trigram in result}
+
+
+def _pattern_trigrams(pattern: str, case_insensitive: bool, encoding: str) -> list[set[int]] | None:
+    """
+    Триграммы, которые обязательно есть в файле с совпадением.
+    :return:
+        Альтернативы: файл может содержать совпадение, если в нем есть все триграммы хотя бы одной из них.
+        None, если сузить поиск нельзя.
+    """
+    # индекс хранит байты файлов как есть, поэтому литералы в других кодировках в нем не найти
+    if "\n".encode(encoding) != b"\n":
+        return None
+
+    try:
+        parsed = re_parser.parse(pattern, re.IGNORECASE if case_insensitive else 0)
+    except Exception:
+        # внутренний парсер re - не публичный API, при любой проблеме просто не используем индекс
+        return None
+
+    items = list(parsed)
+    if len(items) == 1 and items[0][0] == re_parser.BRANCH:
+        branches = items[0][1][1]
+    else:
+        branches = [items]
+
+    ignore_case = bool(parsed.state.flags & re.IGNORECASE)
+    alternatives = []
+    for branch in branches:
+        literals, branch_ignore_case = _required_literals(branch)
+        trigrams = _literal_trigrams(literals, ignore_case or branch_ignore_case, encoding)
+        if not trigrams:
+            return None
+        alternatives.append(trigrams)
+    return alternatives
+
+
+def _required_literals(items: Iterable) -> tuple[list[str], bool]:
+    """
+    Строки, которые обязательно входят в любое совпадение с последовательностью элементов шаблона.
+    :return: Строки и признак того, что внутри встречается локальный флаг '(?i:...)'.
+    """
+    literals = []
+    ignore_case = False
+    run: list[str] = []
+
+    def flush():
+        if run:
+            literals.append("".join(run))
+            run.clear()
+
+    for op, arg in items:
+        if op == re_parser.LITERAL:
+            run.append(chr(arg))
+            continue
+
+        flush()
+        if op == re_parser.SUBPATTERN:
+            _, add_flags, _, sub = arg
+            sub_literals, sub_ignore_case = _required_literals(sub)
+            literals.extend(sub_literals)
+            ignore_case |= sub_ignore_case or bool(add_flags & re.IGNORECASE)
+        elif op in (re_parser.MAX_REPEAT, re_parser.MIN_REPEAT) and arg[0] >= 1:
+            sub_literals, sub_ignore_case = _required_literals(arg[2])
+            literals.extend(sub_literals)
+            ignore_case |= sub_ignore_case
+
+    flush()
+    return literals, ignore_case
+
+
+def _literal_trigrams(literals: list[str], ignore_case: bool, encoding: str) -> set[int]:
+    result = set()
+    for literal in literals:
+        try:
+            data = literal.encode(encoding).lower()
+        except UnicodeEncodeError:
+            continue
+
+        trigrams = _TRIGRAM.findall(data) + _TRIGRAM.findall(data, 1) + _TRIGRAM.findall(data, 2)
+        for trigram in trigrams:
+            # bytes.lower меняет регистр только ASCII, поэтому без учета регистра годятся только ASCII триграммы
+            if ignore_case and not trigram.isascii():
+                continue
+            result.add(int.from_bytes(trigram, "big"))
+    return set(sorted(result)[:MAX_QUERY_TRIGRAMS])
@@ -0,0 +1,82 @@
+import os
+import stat
+from pathlib import Path
+from typing import Iterable
+
+
+class PathGuardService:
+    """
+    Проверяет, что над объектами можно выполнять разрушающие операции: объект не является корнем ФС
+    и не содержит базовую директорию. Для rm база - текущая директория, для cp и mv - назначение,
+    чтобы директорию нельзя было скопировать или переместить саму в себя.
+    Множество (st_dev, st_ino) базы и всех её родителей вычисляется один раз при создании,
+    поэтому проверка каждого объекта - это один stat, сколько бы объектов ни проверялось.
+    """
+
+    __base: Path
+    __protected: set[tuple[int, int]]
+    __roots: dict[str, tuple[int, int]]
+    """
+    (st_dev, st_ino) корня для каждого корня путей ('/', 'C:\\').
+    """
+
+    def __init__(self, base: Path | None = None):
+        """
+        :param base: Директория, которую нельзя удалить или переместить вместе с родителем. По умолчанию текущая.
+            Если это файл или её еще нет, то защищаются только существующие родительские директории.
+        """
+        self.__base = base if base is not None else Path.cwd()
+        self.__protected = set()
+        self.__roots = {}
+
+        # пути без символических ссылок, иначе родитель по пути не совпадет с настоящим
+        path = Path(os.path.realpath(self.__base))
+        while True:
+            try:
+                st = os.stat(path)
+                if stat.S_ISDIR(st.st_mode):
+                    self.__protected.add((st.st_dev, st.st_ino))
+            except OSError:
+                pass
+
+            if path.parent == path:
+                break
+            path = path.parent
+
+    def check(self, path: Path, follow_symlinks: bool = False) -> os.stat_result:
+        """
+        :param follow_symlinks: Проверять объект, на который указывает ссылка. Нужно для операций, раскрывающих ссылки, как cp.
+            Иначе проверяется сама ссылка: её удаление или перемещение не затрагивает цель.
+        :return: stat объекта, полученный при проверке. Его можно использовать вместо повторного stat.
+        :raises OSError: Объект является корнем ФС, базой или её родителем, или его не удалось прочитать.
+        """
+        st = os.stat(path, follow_symlinks=follow_symlinks)
+        key = (st.st_dev, st.st_ino)
+
+        if key == self.__get_root(path):
+            raise OSError("Operation is not allowed with root path.")
+        if key in self.__protected:
+            raise OSError(f"Operation is not allowed with '{path}' because it contains '{self.__base}'.")
+        return st
+
+    def check_many(self, paths: Iterable[Path], follow_symlinks: bool = False) -> dict[Path, os.stat_result | OSError]:
+        """
+        Проверяет все объекты.
+        :return: stat каждого объекта или ошибка, если объект не прошел проверку.
+        """
+        results: dict[Path, os.stat_result | OSError] = {}
+        for path in paths:
+            try:
+                results[path] = self.check(path, follow_symlinks)
+            except OSError as e:
+                results[path] = e
+        return results
+
+    def __get_root(self, path: Path) -> tuple[int, int]:
+        # у относительного пути корня нет, он берется от текущей директории
+        anchor = path.anchor or Path.cwd().anchor
+        root = self.__roots.get(anchor)
+        if root is None:
+            st = os.stat(anchor)
+            root = self.__roots[anchor] = (st.st_dev, st.st_ino)
+        return root
@@ -1,7 +1,96 @@
 import logging
+import os
+import mmap
+import contextlib
+import codecs
+import collections
+import functools
+import io
+import itertools
+from concurrent.futures import ProcessPoolExecutor, Future
+from functools import partial
 from pathlib import Path
 import re
 from dataclasses import dataclass
+from enum import StrEnum
+from typing import Iterable, Generator, Iterator, Callable, Sequence, IO, TypeVar
+
+from src.services.archive_fs_service import ArchiveFileSystemService
+from src.services.index_service import IndexService
+from src.services.walk_service import WalkService
+
+
+PARALLEL_MIN_FILES = 64
+"""
+Минимальное количество файлов, начиная с которого автоматический режим распределяет поиск по процессам.
+На меньших объемах запуск пула обходится дороже самого поиска.
+"""
+
+PARALLEL_WINDOW_PER_JOB = 4
+"""
+Сколько файлов на процесс отдается пулу наперед. Обход директорий продвигается только по мере вывода результатов,
+поэтому в памяти держится не больше jobs * PARALLEL_WINDOW_PER_JOB задач, а первый результат выводится сразу.
+"""
+
+MMAP_MIN_SIZE = 16 * 1024 * 1024
+"""
+Файлы от этого размера отображаются в память через mmap, меньшие читаются целиком одним вызовом.
+"""
+
+BLOCK_SIZE = 1024 * 1024
+"""
+Размер блока, которым буфер файла декодируется в текст и по которому считаются переводы строк.
+"""
+
+SNIFF_SIZE = 8 * 1024
+"""
+Размер начала файла, по которому определяются кодировка и бинарность файла.
+"""
+
+_BINARY_UNSAFE = re.compile(r"\.|\\[wWsSdDbBZ]|\[\^|\$")
+"""
+Конструкции, которые на байтах ведут себя иначе, чем на тексте.
+Например, '.' на байтах совпадает с половиной кириллической буквы, а '$' не учитывает '\\r\\n'.
+"""
+
+_Text = TypeVar("_Text", bytes, str)
+"""
+Тип строк при поиске: по байтам файла или по декодированному тексту.
+"""
+
+_REGEX_META = re.compile(r"[.^$*+?{}\[\]\\|()]")
+"""
+Метасимволы регулярных выражений. Шаблон без них ищется как обычная строка.
+"""
+
+_BOMS = (
+    (codecs.BOM_UTF32_LE, "utf-32"),    # начинается так же, как BOM_UTF16_LE, поэтому проверяется раньше
+    (codecs.BOM_UTF32_BE, "utf-32"),
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
+
+
+class BinaryFiles(StrEnum):
+    """
+    Обработка бинарных файлов. Аналог '--binary-files' в GNU grep.
+    """
+
+    BINARY = "binary"
+    """
+    Искать, но вместо строк сообщать только о наличии совпадений.
+    """
+
+    TEXT = "text"
+    """
+    Искать как в текстовых файлах.
+    """
+
+    WITHOUT_MATCH = "without-match"
+    """
+    Пропускать, не читая дальше начала файла.
+    """
 
 
 @dataclass
@@ -17,10 +106,321 @@ class SearchResultLine:
 class FileSearchResult:
     file_path: Path
     fragments: list[SearchResultLine]
+    binary: bool
 
     def __init__(self, file_path: Path):
         self.file_path = file_path
         self.fragments = []
+        self.binary = False
+
+
+_Trie = dict[str, "_Trie"]
+"""
+Узел префиксного дерева: дочерние узлы по следующему символу. Ключ '' отмечает конец строки.
+"""
+
+
+def _literals_regex(literals: Sequence[str]) -> str:
+    """
+    Собирает строки в регулярное выражение в виде префиксного дерева.
+    Общие префиксы проверяются один раз, поэтому поиск любого количества строк идет за один проход,
+    как в алгоритме Ахо-Корасик, но внутри re, а не в цикле Python.
+    """
+    trie: _Trie = {}
+    for literal in literals:
+        node = trie
+        for char in literal:
+            node = node.setdefault(char, {})
+        node[""] = {}    # конец строки
+
+    def build(node: _Trie) -> str:
+        parts = []
+        while True:
+            children = sorted((char, child) for char, child in node.items() if char)
+            terminal = "" in node
+            # цепочки без ветвлений разворачиваются циклом, чтобы длинные строки не упирались в лимит рекурсии
+            if len(children) == 1 and not terminal:
+                char, node = children[0]
+                parts.append(re.escape(char))
+                continue
+
+            if children:
+                branches = "|".join(re.escape(char) + build(child) for char, child in children)
+                parts.append(f"(?:{branches})" + ("?" if terminal else ""))
+            return "".join(parts)
+
+    return build(trie)
+
+
+@functools.cache
+def _is_ascii_superset(encoding: str) -> bool:
+    """
+    Совпадают ли ASCII символы в кодировке со своими байтами. Только в таких кодировках можно искать по байтам.
+    """
+    return "\n".encode(encoding) == b"\n"
+
+
+@functools.cache
+def _splits_on_newline(encoding: str) -> bool:
+    """
+    Можно ли декодировать текст в этой кодировке по частям, разрезая его по байту перевода строки.
+    """
+    try:
+        return b"\n".decode(encoding) == "\n"
+    except UnicodeDecodeError:
+        return False
+
+
+class LineMatcher:
+    """
+    Шаблон поиска, скомпилированный один раз на весь поиск.
+    Ищет совпадения сразу во всём буфере файла и определяет номера только тех строк, в которых есть совпадение.
+    ASCII шаблоны без Unicode-зависимых конструкций и строки без метасимволов ищутся прямо по байтам,
+    без декодирования файла. Одна строка с учетом регистра ищется обычным поиском подстроки,
+    несколько строк - одним проходом по регулярному выражению в виде префиксного дерева.
+    """
+
+    binary_files: BinaryFiles
+    regexes: list[str]
+    """
+    Регулярные выражения всех шаблонов по отдельности. Строки без метасимволов экранированы.
+    """
+
+    __regex: re.Pattern[str]
+    __flags: int
+    __literals: list[str] | None
+    __bytes_searchers: dict[str, re.Pattern[bytes] | bytes | None]
+    __encoding: str
+
+    def __init__(self, pattern: str | Sequence[str], case_insensitive: bool = False, fixed_strings: bool = False,
+                 encoding: str = "utf-8", binary_files: BinaryFiles = BinaryFiles.WITHOUT_MATCH):
+        """
+        :param pattern: Шаблон или несколько шаблонов. Строка совпадает, если совпадает хотя бы один из них.
+        :param fixed_strings: Искать шаблоны как обычные строки. Включается автоматически, если в шаблонах нет метасимволов.
+        :param encoding: Кодировка файлов. Файлы с BOM читаются в кодировке из BOM.
+        :param binary_files: Обработка бинарных файлов и файлов, начало которых не декодируется в 'encoding'.
+        :raises ValueError: Не передано ни одного шаблона.
+        :raises LookupError: Неизвестная кодировка.
+        """
+        codecs.lookup(encoding)
+
+        # как в GNU grep, перевод строки разделяет шаблоны: строки ищутся по отдельности и совпасть с ним не могут
+        patterns = [part for p in ([pattern] if isinstance(pattern, str) else pattern) for part in p.split("\n")]
+        if not patterns:
+            raise ValueError("At least one pattern is required")
+
+        self.__flags = re.MULTILINE
+        if case_insensitive:
+            self.__flags |= re.IGNORECASE
+
+        self.binary_files = binary_files
+        self.__encoding = encoding
+        self.__bytes_searchers = {}
+
+        if fixed_strings or not any(_REGEX_META.search(p) for p in patterns):
+            self.__literals = patterns
+            self.regexes = [re.escape(p) for p in patterns]
+            self.__regex = re.compile(_literals_regex(patterns), self.__flags)
+        else:
+            self.__literals = None
+            self.regexes = patterns
+            source = patterns[0] if len(patterns) == 1 else "|".join(f"(?:{p})" for p in patterns)
+            self.__regex = re.compile(source, self.__flags)
+
+    def sniff(self, head: bytes) -> tuple[str, bool]:
+        """
+        Определяет кодировку файла и является ли он бинарным по его началу.
+        Бинарным считается файл с нулевым байтом или с началом, которое не декодируется в заданной кодировке.
+        :return: Кодировка и признак бинарного файла.
+        """
+        for bom, encoding in _BOMS:
+            if head.startswith(bom):
+                return encoding, False
+
+        # в UTF-16 и UTF-32 без BOM нулевые байты - обычное дело
+        if _is_ascii_superset(self.__encoding) and b"\0" in head:
+            return self.__encoding, True
+
+        try:
+            # final=False не считает ошибкой символ, обрезанный на границе SNIFF_SIZE
+            codecs.getincrementaldecoder(self.__encoding)().decode(head, final=False)
+        except UnicodeDecodeError:
+            return self.__encoding, True
+
+        return self.__encoding, False
+
+    def search(self, f: IO[bytes], head: bytes, encoding: str) -> Generator[SearchResultLine, None, None]:
+        """
+        Последовательно возвращает строки файла, в которых есть совпадение.
+        Большие файлы отображаются в память, поэтому при поиске по байтам даже очень длинные строки
+        не загружаются в память целиком. Недекодируемые байты заменяются.
+        :param f: Файл, открытый в бинарном режиме.
+        :param head: Уже прочитанное начало файла, см. 'sniff'.
+        :param encoding: Кодировка файла, см. 'sniff'.
+        """
+        with self.__open_buffer(f, head) as buffer:
+            bytes_searcher = self.__get_bytes_searcher(encoding)
+            if bytes_searcher is not None:
+                for line_num, raw_line in self.__scan(bytes_searcher, buffer, b"\n", 1):
+                    yield SearchResultLine(line_num, self.__normalize(raw_line.decode(encoding, "replace")))
+                return
+
+            searcher: re.Pattern[str] | str = self.__regex
+            if self.__literals is not None and len(self.__literals) == 1 and not self.__flags & re.IGNORECASE:
+                searcher = self.__literals[0]
+
+            blocks = self.__iter_blocks(buffer) if _splits_on_newline(encoding) else (buffer[:],)
+            first_line = 1
+            for block in blocks:
+                text = self.__normalize(block.decode(encoding, "replace"))
+                for line_num, line in self.__scan(searcher, text, "\n", first_line):
+                    yield SearchResultLine(line_num, line)
+                first_line += text.count("\n")
+
+    def __get_bytes_searcher(self, encoding: str) -> re.Pattern[bytes] | bytes | None:
+        """
+        Подбирает способ поиска прямо по байтам файла в заданной кодировке.
+        :return: Байтовая строка для поиска подстроки, байтовое регулярное выражение или None, если по байтам искать нельзя.
+        """
+        if encoding in self.__bytes_searchers:
+            return self.__bytes_searchers[encoding]
+
+        searcher: re.Pattern[bytes] | bytes | None = None
+        ignore_case = bool(self.__flags & re.IGNORECASE)
+        if not _is_ascii_superset(encoding):
+            pass
+        elif self.__literals is not None:
+            # bytes.lower и IGNORECASE на байтах меняют регистр только у ASCII
+            if not ignore_case and len(self.__literals) == 1:
+                searcher = self.__encode(self.__literals[0], encoding)
+            elif not ignore_case or all(literal.isascii() for literal in self.__literals):
+                source = self.__encode(_literals_regex(self.__literals), encoding)
+                searcher = re.compile(source, self.__flags) if source is not None else None
+        elif self.__regex.pattern.isascii() and not _BINARY_UNSAFE.search(self.__regex.pattern):
+            searcher = re.compile(self.__regex.pattern.encode("ascii"), self.__flags)
+
+        self.__bytes_searchers[encoding] = searcher
+        return searcher
+
+    @staticmethod
+    def __encode(text: str, encoding: str) -> bytes | None:
+        try:
+            return text.encode(encoding)
+        except UnicodeEncodeError:
+            return None
+
+    @staticmethod
+    @contextlib.contextmanager
+    def __open_buffer(f: IO[bytes], head: bytes) -> Iterator[bytes | mmap.mmap]:
+        # начало короче SNIFF_SIZE - значит, файл уже прочитан целиком
+        if len(head) < SNIFF_SIZE:
+            yield head
+            return
+
+        # файл внутри архива: у его потока может быть fileno самого архива, поэтому отображать в память нельзя
+        if not isinstance(getattr(f, "raw", None), io.FileIO):
+            yield head + f.read()
+            return
+
+        size = os.fstat(f.fileno()).st_size
+        if size < MMAP_MIN_SIZE:
+            yield head + f.read()
+            return
+
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            yield mapped
+
+    @classmethod
+    def __scan(cls, searcher: re.Pattern[_Text] | _Text, buffer, newline: _Text, first_line: int) \
+            -> Generator[tuple[int, _Text], None, None]:
+        """
+        Ищет совпадения во всём буфере.
+        :param searcher: Регулярное выражение или строка для поиска подстроки.
+        :param first_line: Номер строки, с которой начинается буфер.
+        :return: Номер строки и саму строку вместе с переводом строки.
+        """
+        size = len(buffer)
+        line_num = first_line
+        counted = 0
+        pos = 0
+        while pos < size:
+            span = cls.__find(searcher, buffer, pos, size)
+            if span is None:
+                return
+
+            line_start = buffer.rfind(newline, 0, span[0]) + 1
+            if line_start >= size:
+                return
+
+            line_end = buffer.find(newline, span[0])
+            line_end = size if line_end == -1 else line_end + 1
+
+            # совпадение захватило следующие строки, поэтому проверяем строку отдельно, как в построчном поиске
+            if span[1] > line_end and cls.__find(searcher, buffer, line_start, line_end) is None:
+                pos = line_end
+                continue
+
+            line_num += cls.__count_newlines(buffer, newline, counted, line_start)
+            counted = line_start
+            yield line_num, buffer[line_start:line_end]
+            pos = line_end
+
+    @staticmethod
+    def __find(searcher: re.Pattern | bytes | str, buffer, start: int, end: int) -> tuple[int, int] | None:
+        """
+        :return: Начало и конец первого совпадения в buffer[start:end].
+        """
+        if isinstance(searcher, re.Pattern):
+            match = searcher.search(buffer, start, end)
+            return match.span() if match is not None else None
+
+        found = buffer.find(searcher, start, end)
+        return (found, found + len(searcher)) if found != -1 else None
+
+    @staticmethod
+    def __iter_blocks(buffer: bytes | mmap.mmap) -> Generator[bytes, None, None]:
+        """
+        Делит буфер на блоки примерно по BLOCK_SIZE, заканчивающиеся на перевод строки.
+        Перевод строки не встречается внутри многобайтовых символов UTF-8, поэтому каждый блок декодируется отдельно.
+        """
+        size = len(buffer)
+        start = 0
+        while start < size:
+            end = start + BLOCK_SIZE
+            if end < size:
+                newline = buffer.find(b"\n", end)
+                end = size if newline == -1 else newline + 1
+            yield buffer[start:end]
+            start = end
+
+    @staticmethod
+    def __count_newlines(buffer, newline, start: int, end: int) -> int:
+        # у mmap нет count, поэтому считаем по срезам ограниченного размера
+        count = 0
+        while start < end:
+            stop = min(start + BLOCK_SIZE, end)
+            count += buffer[start:stop].count(newline)
+            start = stop
+        return count
+
+    @staticmethod
+    def __normalize(text: str) -> str:
+        """
+        Приводит переводы строк к '\\n', как при чтении файла в текстовом режиме.
+        """
+        return text.replace("\r\n", "\n")
+
+
+def _search_file_task(filepath: Path, matcher: LineMatcher, max_count: int | None) \
+        -> tuple[Path, FileSearchResult | Exception]:
+    """
+    Задача для процессов пула. Находится на уровне модуля, чтобы её можно было передать в другой процесс.
+    Исключение возвращается, а не выбрасывается, чтобы его залогировал основной процесс.
+    """
+    try:
+        return filepath, SearchService.find_by_matcher(filepath, matcher, max_count=max_count)
+    except Exception as e:
+        return filepath, e
 
 
 class SearchService:
@@ -30,37 +430,157 @@ class SearchService:
     def __init__(self):
         self._logger = logging.getLogger(self.__class__.__name__)
 
-    def find_in_file(self, filepath: Path, pattern: str, case_insensitive: bool = False) -> FileSearchResult:
-        if not filepath.is_file():
+    def find_in_file(self, filepath: Path, pattern: str | Sequence[str], case_insensitive: bool = False,
+                     max_count: int | None = None, fixed_strings: bool = False, encoding: str = "utf-8",
+                     binary_files: BinaryFiles = BinaryFiles.WITHOUT_MATCH) -> FileSearchResult:
+        """
+        :param pattern: Шаблон или несколько шаблонов, см. 'LineMatcher'.
+        :param max_count: Максимальное количество строк с совпадениями. После него чтение файла прекращается.
+        :param fixed_strings: См. 'LineMatcher'.
+        :param encoding: См. 'LineMatcher'.
+        :param binary_files: См. 'LineMatcher'.
+        """
+        matcher = LineMatcher(pattern, case_insensitive=case_insensitive, fixed_strings=fixed_strings,
+                              encoding=encoding, binary_files=binary_files)
+        return self.find_by_matcher(filepath, matcher, max_count=max_count)
+
+    @staticmethod
+    def find_by_matcher(filepath: Path, matcher: LineMatcher, max_count: int | None = None) -> FileSearchResult:
+        """
+        То же, что 'find_in_file', но с заранее скомпилированным шаблоном.
+        """
+        if not ArchiveFileSystemService.is_file(filepath):
             raise IsADirectoryError(f"File {filepath} is not a file")
 
         result = FileSearchResult(filepath)
-        with open(filepath, "r", encoding="utf-8") as f:
-            for line_index, line in enumerate(f):
-                if case_insensitive:
-                    flag = re.IGNORECASE
-                else:
-                    flag = 0    # type: ignore
-
-                found = tuple(re.finditer(pattern, line, flags=flag))
-                if not any(found):
-                    continue
-
-                line_obj = SearchResultLine(line_index+1, line)
-                result.fragments.append(line_obj)
+        with ArchiveFileSystemService.open(filepath) as f:
+            head = f.read(SNIFF_SIZE)
+            encoding, result.binary = matcher.sniff(head)
+            if result.binary and matcher.binary_files == BinaryFiles.WITHOUT_MATCH:
+                return result
+            if matcher.binary_files == BinaryFiles.TEXT:
+                result.binary = False
+
+            # islice закрывает генератор после max_count строк, и файл дальше не читается
+            result.fragments.extend(itertools.islice(matcher.search(f, head, encoding), max_count))
         return result
 
-    def find_in_files_recursively(self, source: Path, pattern: str, case_insensitive: bool = False) -> list[FileSearchResult]:
-        if not source.is_dir():
-            raise NotADirectoryError(str(source))
+    def find_in_files(self, files: Iterable[Path], pattern: str | Sequence[str], case_insensitive: bool = False,
+                      jobs: int | None = None, max_count: int | None = None, fixed_strings: bool = False,
+                      encoding: str = "utf-8", binary_files: BinaryFiles = BinaryFiles.WITHOUT_MATCH) \
+            -> Generator[FileSearchResult, None, None]:
+        """
+        Ищет шаблон в каждом из файлов. Ошибка в отдельном файле логируется и не прерывает поиск.
+        Результаты возвращаются по мере готовности, не дожидаясь окончания всего поиска.
+        :param jobs: Количество процессов. None - автоматически по количеству ядер. 1 - поиск в текущем процессе.
+        :param max_count: См. 'find_in_file'.
+        :param fixed_strings: См. 'LineMatcher'.
+        :param encoding: См. 'LineMatcher'.
+        :param binary_files: См. 'LineMatcher'.
+        :return: Результаты по файлам, в которых есть хотя бы одно совпадение. Порядок совпадает с порядком 'files'.
+        :raises ValueError: 'jobs' меньше 1 или не передано ни одного шаблона.
+        :raises LookupError: Неизвестная кодировка.
+        """
+        matcher = LineMatcher(pattern, case_insensitive=case_insensitive, fixed_strings=fixed_strings,
+                              encoding=encoding, binary_files=binary_files)
+        return self.__find(iter(files), matcher, jobs, max_count)
+
+    def find_in_files_recursively(self, source: Path | Iterable[Path], pattern: str | Sequence[str],
+                                  case_insensitive: bool = False, jobs: int | None = None,
+                                  max_count: int | None = None, fixed_strings: bool = False, encoding: str = "utf-8",
+                                  binary_files: BinaryFiles = BinaryFiles.WITHOUT_MATCH, use_index: bool = True,
+                                  walker: WalkService | None = None) \
+            -> Generator[FileSearchResult, None, None]:
+        """
+        Ищет шаблон во всех файлах директорий и их поддиректорий.
+        :param source: Директория или несколько директорий.
+        :param jobs: См. 'find_in_files'.
+        :param max_count: См. 'find_in_file'.
+        :param fixed_strings: См. 'LineMatcher'.
+        :param encoding: См. 'LineMatcher'.
+        :param binary_files: См. 'LineMatcher'.
+        :param use_index: Пропускать файлы, в которых по индексу (см. 'IndexService') точно нет совпадений.
+        :param walker: Обход директорий с нужными исключениями. По умолчанию учитывает '.gitignore'.
+        :raises NotADirectoryError: Один из источников не является директорией.
+        """
+        sources = [source] if isinstance(source, Path) else list(source)
+        for directory in sources:
+            if not directory.is_dir():
+                raise NotADirectoryError(str(directory))
 
-        result = []
-        for file in (p for p in source.rglob("*") if p.is_file()):
+        matcher = LineMatcher(pattern, case_insensitive=case_insensitive, fixed_strings=fixed_strings,
+                              encoding=encoding, binary_files=binary_files)
+        walker = walker or WalkService(use_ignore_files=True)
+        files = itertools.chain.from_iterable(
+            self.__iter_files(walker, directory, matcher, case_insensitive, encoding, use_index)
+            for directory in sources)
+        return self.__find(files, matcher, jobs, max_count)
+
+    def __find(self, files: Iterator[Path], matcher: LineMatcher, jobs: int | None, max_count: int | None) \
+            -> Generator[FileSearchResult, None, None]:
+        if jobs is not None and jobs < 1:
+            raise ValueError("'jobs' must be greater than 0")
+
+        task = partial(_search_file_task, matcher=matcher, max_count=max_count)
+        return self.__iter_results(files, task, jobs)
+
+    def __iter_files(self, walker: WalkService, directory: Path, matcher: LineMatcher, case_insensitive: bool,
+                     encoding: str, use_index: bool) -> Generator[Path, None, None]:
+        selection = None
+        if use_index:
             try:
-                res = self.find_in_file(file, pattern, case_insensitive=case_insensitive)
-                if any(res.fragments):
-                    result.append(res)
+                selection = IndexService().select(directory, matcher.regexes,
+                                                  case_insensitive=case_insensitive, encoding=encoding)
             except Exception as e:
-                self._logger.exception("Failed to find in file", exc_info=e)
+                # индекс только ускоряет поиск, поэтому без него просто просматриваются все файлы
+                self._logger.warning("Failed to use index for %s: %s", directory, e)
 
-        return result
+        for entry in walker.iter_files(directory):
+            if selection is None or selection.may_match(directory, entry):
+                yield Path(entry.path)
+
+    def __iter_results(self, files: Iterator[Path], task: Callable, jobs: int | None) \
+            -> Generator[FileSearchResult, None, None]:
+        if jobs is None:
+            # в автоматическом режиме по первым файлам решаем, стоит ли запускать пул
+            head = list(itertools.islice(files, PARALLEL_MIN_FILES))
+            jobs = 1 if len(head) < PARALLEL_MIN_FILES else os.cpu_count() or 1
+            files = itertools.chain(head, files)
+
+        if jobs == 1:
+            yield from self.__filter_results(map(task, files))
+            return
+
+        executor = ProcessPoolExecutor(max_workers=jobs)
+        try:
+            # executor.map забирает все входные данные сразу, поэтому задачи отдаются окном
+            yield from self.__filter_results(self.__map_window(executor, task, files, jobs * PARALLEL_WINDOW_PER_JOB))
+        finally:
+            # если вывод прервали, оставшиеся задачи не нужны
+            executor.shutdown(cancel_futures=True)
+
+    @staticmethod
+    def __map_window(executor: ProcessPoolExecutor, task: Callable, files: Iterator[Path], size: int) \
+            -> Generator[tuple[Path, FileSearchResult | Exception], None, None]:
+        """
+        Как executor.map, но в работе не больше 'size' задач. Результаты отдаются в порядке файлов, поэтому вывод детерминирован.
+        """
+        window: collections.deque[Future] = collections.deque(
+            executor.submit(task, file) for file in itertools.islice(files, size))
+        while window:
+            future = window.popleft()
+            # новая задача отправляется до ожидания результата, чтобы пул не простаивал
+            for file in itertools.islice(files, 1):
+                window.append(executor.submit(task, file))
+            yield future.result()
+
+    def __filter_results(self, results: Iterable[tuple[Path, FileSearchResult | Exception]]) \
+            -> Generator[FileSearchResult, None, None]:
+        for file, res in results:
+            if isinstance(res, OSError):
+                # ошибки доступа ожидаемы при обходе больших деревьев, traceback для них не нужен
+                self._logger.warning("Failed to find in file %s: %s", file, res)
+            elif isinstance(res, Exception):
+                self._logger.error("Failed to find in file %s", file, exc_info=res)
+            elif any(res.fragments):
+                yield res
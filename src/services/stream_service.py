@@ -0,0 +1,115 @@
+import errno
+import io
+import os
+import stat
+from typing import IO
+
+
+STREAM_CHUNK_SIZE = 1024 * 1024
+"""
+Размер блока при копировании потока через буфер. Память на копирование не зависит от размера файла.
+"""
+
+SENDFILE_CHUNK_SIZE = 64 * 1024 * 1024
+"""
+Сколько байт передается одним вызовом sendfile. Ядро копирует их без выхода в пространство пользователя.
+"""
+
+_SENDFILE_UNSUPPORTED = frozenset((errno.EINVAL, errno.ENOSYS, errno.ENOTSOCK, errno.EOPNOTSUPP, errno.EBADF))
+"""
+Ошибки sendfile, при которых назначение или источник его не поддерживают, и копировать нужно через буфер.
+"""
+
+
+class StreamService:
+    """
+    Копирование файлов в вывод без декодирования и разметки. Если и источник, и назначение - файловые дескрипторы,
+    а назначение - не терминал, данные передаются через os.sendfile внутри ядра. Иначе - блоками через один буфер.
+    """
+
+    @classmethod
+    def copy(cls, source: IO[bytes], destination: IO[bytes], count: int | None = None) -> int:
+        """
+        Копирует данные с текущей позиции источника.
+        :param count: Сколько байт скопировать. По умолчанию до конца источника.
+        :return: Сколько байт скопировано.
+        """
+        destination.flush()
+        in_fd = _get_file_fd(source)
+        out_fd = _get_fd(destination)
+        if in_fd is not None and out_fd is not None and hasattr(os, "sendfile") and not os.isatty(out_fd):
+            copied = cls.__sendfile(source, in_fd, out_fd, count)
+            if copied is not None:
+                return copied
+        return cls.__copy_chunks(source, destination, count)
+
+    @staticmethod
+    def is_regular_file(stream: IO[bytes]) -> bool:
+        """
+        Читается ли поток напрямую из обычного файла. Такой поток дешево читать с любого места, в том числе с конца.
+        """
+        return _get_file_fd(stream) is not None
+
+    @staticmethod
+    def __sendfile(source: IO[bytes], in_fd: int, out_fd: int, count: int | None) -> int | None:
+        """
+        :return: Сколько байт скопировано или None, если sendfile не поддерживается и ничего не скопировано.
+        """
+        # позиция берется у буферизованного объекта: он мог прочитать вперед больше, чем отдал
+        offset = source.tell()
+        copied = 0
+        try:
+            while count is None or copied < count:
+                size = SENDFILE_CHUNK_SIZE if count is None else min(SENDFILE_CHUNK_SIZE, count - copied)
+                # со смещением sendfile не двигает позицию дескриптора, поэтому она выставляется в конце
+                sent = os.sendfile(out_fd, in_fd, offset + copied, size)
+                if sent == 0:
+                    break
+                copied += sent
+        except OSError as e:
+            if copied == 0 and e.errno in _SENDFILE_UNSUPPORTED:
+                return None
+            raise
+        finally:
+            source.seek(offset + copied)
+        return copied
+
+    @staticmethod
+    def __copy_chunks(source: IO[bytes], destination: IO[bytes], count: int | None) -> int:
+        buffer = memoryview(bytearray(STREAM_CHUNK_SIZE))
+        readinto = getattr(source, "readinto", None)
+        copied = 0
+        chunk: bytes | memoryview
+        while count is None or copied < count:
+            size = STREAM_CHUNK_SIZE if count is None else min(STREAM_CHUNK_SIZE, count - copied)
+            if readinto is not None:
+                read = readinto(buffer[:size])
+                chunk = buffer[:read]
+            else:
+                chunk = source.read(size)
+                read = len(chunk)
+            if not read:
+                break
+            destination.write(chunk)
+            copied += read
+        destination.flush()
+        return copied
+
+
+def _get_fd(stream: IO[bytes]) -> int | None:
+    try:
+        return stream.fileno()
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        return None
+
+
+def _get_file_fd(stream: IO[bytes]) -> int | None:
+    """
+    Дескриптор обычного файла, из которого читается поток напрямую. Для записей архивов и других потоков None.
+    """
+    if not isinstance(getattr(stream, "raw", stream), io.FileIO):
+        return None
+    fd = _get_fd(stream)
+    if fd is None or not stat.S_ISREG(os.fstat(fd).st_mode):
+        return None
+    return fd
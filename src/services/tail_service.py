@@ -0,0 +1,206 @@
+import collections
+import os
+import select
+import threading
+import time
+from enum import StrEnum
+from pathlib import Path
+from typing import IO, Generator
+
+from src.services.cache_service import Inotify
+from src.services.stream_service import StreamService
+
+
+LINES_BLOCK_SIZE = 64 * 1024
+"""
+Размер блока при поиске переводов строк. Для 'head -n' и 'tail -n' читается столько блоков, сколько занимает вывод.
+"""
+
+FOLLOW_INTERVAL = 1.0
+"""
+Как часто 'tail -f' проверяет файл без событий inotify, в секундах. С inotify проверка идет сразу по событию,
+а интервал только ограничивает время реакции на остановку и на переименование самой директории.
+"""
+
+
+class FollowEvent(StrEnum):
+    """
+    Что произошло с файлом, за которым следит 'tail -f'.
+    """
+
+    TRUNCATED = "truncated"
+    """
+    Файл стал короче прочитанного, например, 'copytruncate' в logrotate. Чтение продолжается с начала.
+    """
+
+    REPLACED = "replaced"
+    """
+    По пути теперь другой файл: старый переименован или удален при ротации. Старый дочитывается, а новый читается с начала.
+    """
+
+
+class TailService:
+    """
+    Начало и конец файлов. У обычных файлов конец ищется чтением блоков с конца назад,
+    поэтому время зависит от размера вывода, а не файла. Записи архивов читаются подряд.
+    """
+
+    @classmethod
+    def head(cls, source: IO[bytes], destination: IO[bytes], lines: int = 10, count: int | None = None):
+        """
+        Копирует начало потока.
+        :param lines: Сколько строк скопировать.
+        :param count: Сколько байт скопировать. Если указано, то 'lines' не учитывается.
+        """
+        if count is not None:
+            StreamService.copy(source, destination, count)
+            return
+
+        remaining = lines
+        while remaining > 0:
+            block = source.read(LINES_BLOCK_SIZE)
+            if not block:
+                break
+            found = block.count(b"\n")
+            if found >= remaining:
+                block = block[:_find_nth(block, remaining) + 1]
+            destination.write(block)
+            remaining -= found
+        destination.flush()
+
+    @classmethod
+    def tail(cls, source: IO[bytes], destination: IO[bytes], lines: int = 10, count: int | None = None):
+        """
+        Копирует конец потока. После копирования позиция потока - в его конце.
+        :param lines: Сколько строк скопировать. Перевод строки в конце файла не считается началом новой строки.
+        :param count: Сколько байт скопировать. Если указано, то 'lines' не учитывается.
+        """
+        if not StreamService.is_regular_file(source):
+            cls.__tail_stream(source, destination, lines, count)
+            return
+
+        end = source.seek(0, os.SEEK_END)
+        if count is not None:
+            start = max(0, end - count)
+        else:
+            start = cls.__find_lines_start(source, end, lines)
+        source.seek(start)
+        StreamService.copy(source, destination, end - start)
+
+    @classmethod
+    def follow(cls, path: Path, destination: IO[bytes], lines: int = 10, count: int | None = None,
+               stop: threading.Event | None = None,
+               interval: float = FOLLOW_INTERVAL) -> Generator[FollowEvent, None, None]:
+        """
+        Копирует конец файла, а затем дописываемые в него данные, пока не установлен 'stop'.
+        На Linux ждет событий inotify в директории файла, иначе проверяет файл раз в 'interval' секунд.
+        Следит за путем, а не за открытым файлом, поэтому переживает ротацию логов.
+        :return: События ротации и усечения файла.
+        :raises OSError: Файл не удалось открыть.
+        """
+        file = open(path, "rb")
+        inotify = None
+        try:
+            cls.tail(file, destination, lines, count)
+            try:
+                inotify = Inotify()
+                inotify.add_watch(os.path.dirname(os.path.abspath(path)))
+            except OSError:
+                # без inotify (не Linux или исчерпан лимит наблюдений) файл проверяется раз в 'interval'
+                if inotify is not None:
+                    inotify.close()
+                    inotify = None
+
+            while stop is None or not stop.is_set():
+                StreamService.copy(file, destination)
+                cls.__wait(inotify, path.name, interval)
+
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    # старый файл уже переименован, а новый еще не создан: пока дочитывается старый
+                    continue
+
+                current = os.fstat(file.fileno())
+                if (st.st_dev, st.st_ino) != (current.st_dev, current.st_ino):
+                    StreamService.copy(file, destination)
+                    file.close()
+                    file = open(path, "rb")
+                    yield FollowEvent.REPLACED
+                elif st.st_size < file.tell():
+                    file.seek(0)
+                    yield FollowEvent.TRUNCATED
+        finally:
+            file.close()
+            if inotify is not None:
+                inotify.close()
+
+    @staticmethod
+    def __find_lines_start(source: IO[bytes], end: int, lines: int) -> int:
+        """
+        Читает файл блоками с конца, пока не найдет 'lines' переводов строк.
+        :return: Смещение начала последних 'lines' строк.
+        """
+        if lines <= 0:
+            return end
+
+        found = 0
+        position = end
+        # перевод строки в самом конце файла завершает последнюю строку, а не начинает новую
+        skip_last = True
+        while position > 0:
+            size = min(LINES_BLOCK_SIZE, position)
+            position -= size
+            source.seek(position)
+            block = source.read(size)
+
+            index = len(block)
+            if skip_last:
+                skip_last = False
+                if block.endswith(b"\n"):
+                    index -= 1
+            while True:
+                index = block.rfind(b"\n", 0, index)
+                if index < 0:
+                    break
+                found += 1
+                if found == lines:
+                    return position + index + 1
+        return 0
+
+    @staticmethod
+    def __tail_stream(source: IO[bytes], destination: IO[bytes], lines: int, count: int | None):
+        # у потока без произвольного доступа конец находится только чтением целиком,
+        # но в памяти держится не больше вывода
+        if count is not None:
+            buffer = bytearray()
+            while block := source.read(LINES_BLOCK_SIZE):
+                buffer += block
+                del buffer[:max(0, len(buffer) - count)]
+            destination.write(buffer)
+        elif lines > 0:
+            destination.writelines(collections.deque(source, maxlen=lines))
+        destination.flush()
+
+    @staticmethod
+    def __wait(inotify: Inotify | None, name: str, interval: float):
+        if inotify is None:
+            time.sleep(interval)
+            return
+
+        deadline = time.monotonic() + interval
+        while (timeout := deadline - time.monotonic()) > 0:
+            ready, _, _ = select.select([inotify], [], [], timeout)
+            # события о других файлах директории не будят чтение
+            if ready and any(not event_name or event_name == name for _, _, event_name in inotify.read_events()):
+                return
+
+
+def _find_nth(block: bytes, n: int) -> int:
+    """
+    :return: Индекс n-го перевода строки в блоке. Он должен быть в блоке.
+    """
+    index = -1
+    for _ in range(n):
+        index = block.index(b"\n", index + 1)
+    return index
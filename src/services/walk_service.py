@@ -0,0 +1,225 @@
+import fnmatch
+import logging
+import os
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Generator, Sequence
+
+from src.services.cache_service import DirEntryLike, scandir
+
+
+DEFAULT_IGNORED_DIRS = frozenset({".git", ".hg", ".svn", "node_modules", "venv", ".venv", "__pycache__"})
+"""
+Директории, которые пропускаются при учете игнорируемых файлов, даже если они не указаны в '.gitignore'.
+"""
+
+IGNORE_FILES = (".gitignore", ".ignore")
+"""
+Файлы с шаблонами игнорирования в формате '.gitignore'. Действуют на свою директорию и все вложенные.
+"""
+
+
+@dataclass
+class _IgnoreRule:
+    regex: re.Pattern
+    negate: bool
+    dir_only: bool
+
+
+@dataclass
+class _IgnoreFile:
+    base: str
+    """
+    Путь директории файла относительно корня обхода. Пустой для корня, иначе заканчивается на '/'.
+    """
+
+    rules: list[_IgnoreRule]
+
+
+class WalkService:
+    """
+    Обход дерева директорий через os.scandir.
+    Тип объекта берется из DirEntry, поэтому на большинстве ФС обход стоит примерно один системный вызов
+    на директорию, а не на каждый объект. Поддиректории, попавшие под исключения, не обходятся вовсе.
+    """
+
+    _logger: logging.Logger
+
+    __exclude: list[str]
+    __include: list[str]
+    __use_ignore_files: bool
+
+    def __init__(self, exclude: Sequence[str] = (), include: Sequence[str] = (), use_ignore_files: bool = False):
+        """
+        :param exclude: Glob шаблоны имен или относительных путей файлов и директорий, которые нужно пропустить.
+        :param include: Glob шаблоны имен или относительных путей файлов. Если указаны, то остальные файлы пропускаются.
+        :param use_ignore_files: Учитывать '.gitignore' и '.ignore' и пропускать служебные директории вроде '.git'.
+        """
+        self._logger = logging.getLogger(self.__class__.__name__)
+        self.__exclude = list(exclude)
+        self.__include = list(include)
+        self.__use_ignore_files = use_ignore_files
+
+    def iter_entries(self, root: Path,
+                     on_error: Callable[[str, OSError], None] | None = None) -> Generator[DirEntryLike, None, None]:
+        """
+        Обходит дерево в глубину. Для каждой директории сначала возвращает её содержимое, потом обходит поддиректории.
+        Символические ссылки на директории возвращаются, но не обходятся.
+        :param on_error: Вызывается с путем и ошибкой, если директорию не удалось прочитать. Исключение из него
+            прерывает обход. По умолчанию ошибки логируются и не прерывают обход.
+        """
+        for _, entry in self.iter_relative(root, on_error):
+            yield entry
+
+    def iter_relative(self, root: Path, on_error: Callable[[str, OSError], None] | None = None) \
+            -> Generator[tuple[str, DirEntryLike], None, None]:
+        """
+        То же, что 'iter_entries', но вместе с путем каждого объекта относительно 'root' через '/'.
+        """
+        stack: list[tuple[str, str, tuple[_IgnoreFile, ...]]] = [(str(root), "", ())]
+        while stack:
+            path, rel, ignore_files = stack.pop()
+            try:
+                entries = list(scandir(path))
+            except OSError as e:
+                if on_error is None:
+                    self._logger.warning("Failed to list %s: %s", path, e)
+                else:
+                    on_error(path, e)
+                continue
+
+            if self.__use_ignore_files:
+                ignore_files = self.__read_ignore_files(path, rel, entries, ignore_files)
+
+            subdirs = []
+            for entry in entries:
+                entry_rel = rel + entry.name
+                is_dir = entry.is_dir(follow_symlinks=False)
+                if self.__is_skipped(entry.name, entry_rel, is_dir, ignore_files):
+                    continue
+
+                yield entry_rel, entry
+                if is_dir:
+                    subdirs.append((entry.path, entry_rel + "/", ignore_files))
+
+            # в обратном порядке, чтобы поддиректории обходились в порядке scandir
+            stack.extend(reversed(subdirs))
+
+    def iter_files(self, root: Path) -> Generator[DirEntryLike, None, None]:
+        """
+        То же, что 'iter_entries', но только файлы, включая символические ссылки на файлы.
+        """
+        for entry in self.iter_entries(root):
+            if entry.is_file() and self.__is_included(entry):
+                yield entry
+
+    def __is_included(self, entry: DirEntryLike) -> bool:
+        if not self.__include:
+            return True
+        return any(fnmatch.fnmatch(entry.name, pattern) for pattern in self.__include)
+
+    def __is_skipped(self, name: str, rel: str, is_dir: bool, ignore_files: tuple[_IgnoreFile, ...]) -> bool:
+        if any(fnmatch.fnmatch(name, pattern) or fnmatch.fnmatch(rel, pattern) for pattern in self.__exclude):
+            return True
+
+        if not self.__use_ignore_files:
+            return False
+
+        if is_dir and name in DEFAULT_IGNORED_DIRS:
+            return True
+
+        # как в git, решает последнее подходящее правило, а правила вложенных директорий важнее родительских
+        ignored = False
+        for ignore_file in ignore_files:
+            relative = rel[len(ignore_file.base):]
+            for rule in ignore_file.rules:
+                if rule.dir_only and not is_dir:
+                    continue
+                if rule.regex.fullmatch(relative):
+                    ignored = not rule.negate
+        return ignored
+
+    def __read_ignore_files(self, path: str, rel: str, entries: list[DirEntryLike],
+                            ignore_files: tuple[_IgnoreFile, ...]) -> tuple[_IgnoreFile, ...]:
+        # наличие файлов проверяется по уже прочитанному списку, без лишних системных вызовов
+        names = {entry.name for entry in entries}
+        for name in IGNORE_FILES:
+            if name not in names:
+                continue
+
+            try:
+                with open(os.path.join(path, name), "r", encoding="utf-8", errors="replace") as f:
+                    rules = [rule for line in f if (rule := _parse_ignore_line(line)) is not None]
+            except OSError as e:
+                self._logger.warning("Failed to read %s in %s: %s", name, path, e)
+                continue
+
+            if rules:
+                ignore_files = (*ignore_files, _IgnoreFile(rel, rules))
+        return ignore_files
+
+
+def _parse_ignore_line(line: str) -> _IgnoreRule | None:
+    """
+    Разбирает строку в формате '.gitignore'.
+    :return: None для пустых строк и комментариев.
+    """
+    line = line.rstrip("\r\n")
+    if not line.endswith("\\ "):
+        line = line.rstrip(" ")
+    if not line or line.startswith("#"):
+        return None
+
+    negate = line.startswith("!")
+    if negate or line.startswith("\\"):
+        line = line[1:]
+
+    dir_only = line.endswith("/")
+    line = line.rstrip("/")
+    if not line:
+        return None
+
+    # шаблон со слэшем в начале или середине привязан к директории файла, иначе сравнивается с именем на любой глубине
+    anchored = "/" in line
+    line = line.lstrip("/")
+    prefix = "" if anchored else "(?:.*/)?"
+    return _IgnoreRule(re.compile(prefix + _translate_glob(line)), negate, dir_only)
+
+
+def _translate_glob(pattern: str) -> str:
+    """
+    Переводит glob шаблон '.gitignore' в регулярное выражение. В отличие от fnmatch, '*' не совпадает с '/'.
+    """
+    result = []
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if pattern.startswith("**/", i):
+            result.append("(?:.*/)?")
+            i += 3
+            continue
+        if pattern.startswith("**", i):
+            result.append(".*")
+            i += 2
+            continue
+
+        if char == "*":
+            result.append("[^/]*")
+        elif char == "?":
+            result.append("[^/]")
+        elif char == "[" and (end := pattern.find("]", i + 2)) != -1:
+            body = pattern[i + 1:end]
+            if body.startswith("!"):
+                body = "^" + body[1:]
+            result.append("[" + body.replace("\\", "\\\\") + "]")
+            i = end + 1
+            continue
+        elif char == "\\" and i + 1 < len(pattern):
+            result.append(re.escape(pattern[i + 1]))
+            i += 2
+            continue
+        else:
+            result.append(re.escape(char))
+        i += 1
+    return "".join(result)
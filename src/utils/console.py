@@ -1,4 +1,6 @@
+from pathlib import Path
 from rich import print
+import sys
 
 
 def rich_input(prompt: str) -> str:
@@ -14,3 +16,24 @@ def ask_confirmation(prompt: str) -> bool:
             return True
         elif response.lower() in ("n", "no"):
             return False
+
+
+def format_size(size_bytes: float) -> str:
+    """
+    Форматирует размер в байтах с подходящей единицей измерения. Например, '1.5 MB'.
+    """
+    for lit in ("B", "KB", "MB", "GB", "TB"):
+        if size_bytes < 1024:
+            break
+        size_bytes /= 1024
+
+    return f"{size_bytes:.1f} {lit}"
+
+
+def write_file_header(path: Path, first: bool):
+    """
+    Заголовок перед содержимым каждого из нескольких файлов, как в GNU head и tail: '==> путь <=='.
+    Пишется в stdout напрямую, как и содержимое файлов.
+    """
+    separator = "" if first else "\n"
+    sys.stdout.buffer.write(f"{separator}==> {path} <==\n".encode())
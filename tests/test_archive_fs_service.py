@@ -0,0 +1,105 @@
+from pathlib import Path
+import os
+import tarfile
+import zipfile
+import pytest
+
+from src.services.archive_fs_service import ArchiveFileSystemService, ArchiveLocation
+from src.services.glob_service import GlobService
+
+
+@pytest.fixture(params=["data.zip", "data.tar.gz", "data.tar"])
+def archive(request, tmp_path: Path):
+    source = tmp_path / "src"
+    (source / "dir" / "sub").mkdir(parents=True)
+    (source / "top.txt").write_text("top")
+    (source / "dir" / "a.txt").write_text("a" * 10)
+    (source / "dir" / "sub" / "b.txt").write_text("needle")
+
+    path = tmp_path / request.param
+    if request.param.endswith(".zip"):
+        with zipfile.ZipFile(path, "w") as f:
+            # без записей директорий: они восстанавливаются из путей файлов
+            for file in source.rglob("*.txt"):
+                f.write(file, file.relative_to(source).as_posix())
+    else:
+        with tarfile.open(path, "w:gz" if request.param.endswith(".gz") else "w") as f:
+            f.add(source, arcname=".")
+
+    cwd = os.getcwd()
+    yield path
+    ArchiveFileSystemService.chdir(Path(cwd))
+    ArchiveFileSystemService.close()
+
+
+def names(entries) -> set[str]:
+    return {entry.name for entry in entries}
+
+
+class TestArchiveFileSystem:
+
+    def test_locate(self, archive):
+        assert ArchiveFileSystemService.locate(archive / "dir" / "a.txt") == ArchiveLocation(archive, "dir/a.txt")
+        assert ArchiveFileSystemService.locate(archive) is None
+        assert ArchiveFileSystemService.locate(archive, archive_as_dir=True) == ArchiveLocation(archive, "")
+        assert ArchiveFileSystemService.locate(archive.parent / "missing" / "a.txt") is None
+
+    def test_scandir(self, archive):
+        root = ArchiveFileSystemService.scandir(ArchiveLocation(archive, ""))
+        assert names(root) == {"top.txt", "dir"}
+        entries = {entry.name: entry for entry in ArchiveFileSystemService.scandir(ArchiveLocation(archive, "dir"))}
+        assert entries["sub"].is_dir()
+        assert entries["a.txt"].is_file()
+        assert entries["a.txt"].stat().st_size == 10
+        assert entries["a.txt"].path == str(archive / "dir" / "a.txt")
+
+    def test_scandir_errors(self, archive):
+        with pytest.raises(FileNotFoundError):
+            ArchiveFileSystemService.scandir(ArchiveLocation(archive, "missing"))
+        with pytest.raises(NotADirectoryError):
+            ArchiveFileSystemService.scandir(ArchiveLocation(archive, "top.txt"))
+
+    def test_open(self, archive):
+        with ArchiveFileSystemService.open(archive / "dir" / "sub" / "b.txt") as f:
+            assert f.read() == b"needle"
+        with pytest.raises(IsADirectoryError):
+            ArchiveFileSystemService.open(archive / "dir")
+
+    def test_is_file(self, archive):
+        assert ArchiveFileSystemService.is_file(archive / "top.txt")
+        assert not ArchiveFileSystemService.is_file(archive / "dir")
+        assert not ArchiveFileSystemService.is_file(archive / "missing.txt")
+
+    def test_iter_files(self, archive):
+        files = set(ArchiveFileSystemService.iter_files(ArchiveLocation(archive, "dir")))
+        assert files == {archive / "dir" / "a.txt", archive / "dir" / "sub" / "b.txt"}
+
+    def test_index_cached(self, archive, mocker):
+        ArchiveFileSystemService.scandir(ArchiveLocation(archive, ""))
+        spy = mocker.spy(zipfile.ZipFile, "__init__")
+        spy_tar = mocker.spy(tarfile, "open")
+        ArchiveFileSystemService.scandir(ArchiveLocation(archive, "dir"))
+        assert spy.call_count == 0 and spy_tar.call_count == 0
+
+    def test_chdir(self, archive):
+        ArchiveFileSystemService.chdir(archive / "dir")
+        assert ArchiveFileSystemService.get_cwd() == ArchiveLocation(archive, "dir")
+        assert ArchiveFileSystemService.absolute(Path("sub/b.txt")) == archive / "dir" / "sub" / "b.txt"
+        assert ArchiveFileSystemService.is_file(ArchiveFileSystemService.absolute(Path("../top.txt")))
+
+        ArchiveFileSystemService.chdir(Path("../.."))
+        assert ArchiveFileSystemService.get_cwd() is None
+        assert Path.cwd() == archive.parent
+
+    def test_glob(self, archive):
+        os.chdir(archive.parent)
+        ArchiveFileSystemService.chdir(archive / "dir")
+        # шаблоны раскрываются по записям архива, а не по настоящей текущей директории
+        assert GlobService.expand("*.txt") == ["a.txt"]
+        assert GlobService.expand("**/*.txt") == ["a.txt", "sub/b.txt"]
+        assert GlobService.expand("sub/b.txt") == ["sub/b.txt"]
+        assert GlobService.split("cat ../*.txt d*") == ["cat", "../top.txt", "d*"]
+
+    def test_chdir_file(self, archive):
+        with pytest.raises(NotADirectoryError):
+            ArchiveFileSystemService.chdir(archive / "top.txt")
@@ -0,0 +1,322 @@
+from pathlib import Path
+import gzip
+import io
+import json
+import os
+import shutil
+import time
+import tarfile
+import zipfile
+import pytest
+
+from src.services import archive_service
+from src.services.archive_service import ArchiveService, ParallelGzipWriter, ZipMethod, GZIP_BLOCK_SIZE
+
+
+@pytest.fixture
+def tree(tmp_path: Path) -> Path:
+    source = tmp_path / "src"
+    (source / "sub").mkdir(parents=True)
+    (source / "a.txt").write_text("a" * 100_000)
+    (source / "sub" / "b.bin").write_bytes(bytes(range(256)) * 1000)
+    return source
+
+
+class TestParallelGzip:
+
+    @pytest.mark.parametrize("size", [0, 1, 4096, 100_000])
+    def test_roundtrip(self, size):
+        data = bytes(i % 251 for i in range(size))
+        out = io.BytesIO()
+        with ParallelGzipWriter(out, jobs=4, block_size=1000) as gz:
+            gz.write(data)
+        assert gzip.decompress(out.getvalue()) == data
+
+    def test_members(self):
+        out = io.BytesIO()
+        with ParallelGzipWriter(out, jobs=2, block_size=10) as gz:
+            for _ in range(10):
+                gz.write(b"0123456789")
+        # каждый блок - отдельный член gzip со своим заголовком
+        assert out.getvalue().count(b"\x1f\x8b\x08") == 10
+
+
+class TestCreateArchive:
+
+    def test_tar(self, tree, tmp_path):
+        ArchiveService().create_archive(tree, tmp_path / "out", "gztar", jobs=3)
+        with tarfile.open(tmp_path / "out.tar.gz") as tar:
+            assert set(tar.getnames()) == {".", "./a.txt", "./sub", "./sub/b.bin"}
+            assert tar.extractfile("./a.txt").read() == b"a" * 100_000
+
+    def test_extension_kept(self, tree, tmp_path):
+        ArchiveService().create_archive(tree, tmp_path / "out.tgz", "gztar")
+        assert (tmp_path / "out.tgz").exists()
+
+    def test_stdout(self, tree, mocker):
+        stdout = mocker.patch("sys.stdout")
+        stdout.buffer = io.BytesIO()
+        ArchiveService().create_archive(tree, Path("-"), "gztar")
+        with tarfile.open(fileobj=io.BytesIO(stdout.buffer.getvalue())) as tar:
+            assert "./sub/b.bin" in tar.getnames()
+
+    def test_zip(self, tree, tmp_path):
+        ArchiveService().create_archive(tree, tmp_path / "out", "zip")
+        with zipfile.ZipFile(tmp_path / "out.zip") as archive:
+            assert set(archive.namelist()) == {"sub/", "a.txt", "sub/b.bin"}
+
+    @pytest.mark.parametrize("arc_type, name", [("tar", "sub/out.tar"), ("gztar", "sub/out.tar.gz"),
+                                                ("zip", "sub/out.zip")])
+    def test_inside_source(self, tree, arc_type, name):
+        # архив не попадает сам в себя, даже если его путь проходит через ссылку
+        (tree / "link").symlink_to("sub")
+        ArchiveService().create_archive(tree, tree / "link" / "out", arc_type)
+        if arc_type == "zip":
+            with zipfile.ZipFile(tree / name) as archive:
+                names = set(archive.namelist())
+        else:
+            with tarfile.open(tree / name) as tar:
+                names = {member.lstrip("./") for member in tar.getnames()} - {""}
+        assert names >= {"a.txt", "sub/b.bin"}
+        assert name not in names
+
+    def test_not_directory(self, tree, tmp_path):
+        with pytest.raises(Exception):
+            ArchiveService().create_archive(tree / "a.txt", tmp_path / "out", "gztar")
+
+
+class TestCompression:
+
+    @pytest.mark.parametrize("arc_type, name", [("tar", "out.tar"), ("bztar", "out.tar.bz2"), ("xztar", "out.tar.xz")])
+    def test_tar_formats(self, tree, tmp_path, arc_type, name):
+        ArchiveService().create_archive(tree, tmp_path / "out", arc_type, level=1)
+        with tarfile.open(tmp_path / name) as tar:
+            assert tar.extractfile("./a.txt").read() == b"a" * 100_000
+
+    @pytest.mark.parametrize("method, compress_type", [(ZipMethod.BZIP2, zipfile.ZIP_BZIP2),
+                                                       (ZipMethod.LZMA, zipfile.ZIP_LZMA),
+                                                       (ZipMethod.STORED, zipfile.ZIP_STORED)])
+    def test_zip_methods(self, tree, tmp_path, method, compress_type):
+        ArchiveService().create_archive(tree, tmp_path / "out", "zip", method=method)
+        with zipfile.ZipFile(tmp_path / "out.zip") as archive:
+            assert archive.getinfo("a.txt").compress_type == compress_type
+            assert archive.read("a.txt") == b"a" * 100_000
+
+    def test_zip_auto_store(self, tree, tmp_path):
+        (tree / "photo.jpg").write_bytes(b"a" * 1000)
+        (tree / "random.bin").write_bytes(os.urandom(100_000))
+        ArchiveService().create_archive(tree, tmp_path / "out", "zip", auto_store=True)
+        with zipfile.ZipFile(tmp_path / "out.zip") as archive:
+            assert archive.getinfo("photo.jpg").compress_type == zipfile.ZIP_STORED
+            assert archive.getinfo("random.bin").compress_type == zipfile.ZIP_STORED
+            assert archive.getinfo("a.txt").compress_type == zipfile.ZIP_DEFLATED
+
+    def test_gzip_auto_store(self):
+        data = os.urandom(10_000) + b"a" * 10_000
+        out = io.BytesIO()
+        with ParallelGzipWriter(out, jobs=2, block_size=10_000, auto_store=True) as gz:
+            gz.write(data)
+        assert gzip.decompress(out.getvalue()) == data
+        # случайный блок хранится как есть, а повторяющийся сжимается
+        assert 10_000 < len(out.getvalue()) < 10_500
+
+    def test_invalid_level(self, tree, tmp_path):
+        with pytest.raises(Exception, match="level"):
+            ArchiveService().create_archive(tree, tmp_path / "out", "bztar", level=0)
+
+
+class TestUnarchive:
+
+    @pytest.mark.parametrize("fmt, name", [("zip", "out.zip"), ("gztar", "out.tar.gz")])
+    def test_roundtrip(self, tree, tmp_path, fmt, name):
+        ArchiveService().create_archive(tree, tmp_path / "out", fmt)
+        ArchiveService().unarchive(tmp_path / name, fmt, destination=tmp_path / "dst", jobs=4)
+        assert (tmp_path / "dst" / "a.txt").read_text() == "a" * 100_000
+        assert (tmp_path / "dst" / "sub" / "b.bin").read_bytes() == bytes(range(256)) * 1000
+
+    def test_multiple_gzip_members(self, tree, tmp_path):
+        # больше GZIP_BLOCK_SIZE: архив состоит из нескольких членов gzip
+        data = os.urandom(GZIP_BLOCK_SIZE) * 3
+        (tree / "big.bin").write_bytes(data)
+        ArchiveService().create_archive(tree, tmp_path / "out", "gztar", jobs=2)
+        ArchiveService().unarchive(tmp_path / "out.tar.gz", "gztar", destination=tmp_path / "dst")
+        assert (tmp_path / "dst" / "big.bin").read_bytes() == data
+
+    @pytest.mark.parametrize("fmt, name", [("zip", "out.zip"), ("gztar", "out.tar.gz")])
+    def test_patterns(self, tree, tmp_path, fmt, name):
+        ArchiveService().create_archive(tree, tmp_path / "out", fmt)
+        ArchiveService().unarchive(tmp_path / name, fmt, destination=tmp_path / "dst", patterns=["*.bin"])
+        assert (tmp_path / "dst" / "sub" / "b.bin").exists()
+        assert not (tmp_path / "dst" / "a.txt").exists()
+
+    def test_zip_unsafe(self, tmp_path):
+        with zipfile.ZipFile(tmp_path / "evil.zip", "w") as archive:
+            archive.writestr("../evil.txt", "x")
+            archive.writestr("ok.txt", "y")
+        ArchiveService().unarchive(tmp_path / "evil.zip", "zip", destination=tmp_path / "dst")
+        assert not (tmp_path / "evil.txt").exists()
+        assert (tmp_path / "dst" / "ok.txt").read_text() == "y"
+
+    def test_tar_links(self, tmp_path):
+        with tarfile.open(tmp_path / "links.tar", "w") as tar:
+            for name, kind, linkname in [("outside", tarfile.SYMTYPE, "/etc"),
+                                         ("up", tarfile.SYMTYPE, "../.."),
+                                         ("dir", tarfile.SYMTYPE, "."),
+                                         ("dir/file.txt", tarfile.REGTYPE, ""),
+                                         ("data.txt", tarfile.REGTYPE, ""),
+                                         ("hard", tarfile.LNKTYPE, "data.txt"),
+                                         ("ok", tarfile.SYMTYPE, "data.txt")]:
+                info = tarfile.TarInfo(name)
+                info.type, info.linkname = kind, linkname
+                data = b"data" if kind == tarfile.REGTYPE else b""
+                info.size = len(data)
+                tar.addfile(info, io.BytesIO(data))
+
+        ArchiveService().unarchive(tmp_path / "links.tar", "tar", destination=tmp_path / "dst")
+        dst = tmp_path / "dst"
+        assert not (dst / "outside").is_symlink() and not (dst / "up").is_symlink()
+        # путь через ссылку из этого же архива не распаковывается
+        assert not (dst / "file.txt").exists()
+        assert (dst / "hard").read_text() == "data"
+        assert (dst / "ok").resolve() == dst / "data.txt"
+
+    def test_hardlinks(self, tree, tmp_path, mocker):
+        # tar сохраняет имена как './file', и жесткие ссылки должны дождаться записи цели в пуле
+        write_file = archive_service._write_file
+
+        def slow_write_file(*args):
+            time.sleep(0.005)
+            write_file(*args)
+
+        mocker.patch("src.services.archive_service._write_file", slow_write_file)
+        for i in range(50):
+            (tree / f"file{i}.txt").write_text(str(i))
+            os.link(tree / f"file{i}.txt", tree / f"link{i}.txt")
+        ArchiveService().create_archive(tree, tmp_path / "out", "gztar")
+        ArchiveService().unarchive(tmp_path / "out.tar.gz", "gztar", destination=tmp_path / "dst", jobs=4)
+        for i in range(50):
+            assert (tmp_path / "dst" / f"link{i}.txt").read_text() == str(i)
+
+    def test_link_chain_escape(self, tmp_path):
+        victim = tmp_path / "victim.txt"
+        victim.write_text("keep")
+        with tarfile.open(tmp_path / "chain.tar", "w") as tar:
+            # по строкам 'l1/..' - это '.', но l1 - ссылка на '.', поэтому на деле 'up' ведет в родителя назначения
+            for name, kind, linkname, data in [("l1", tarfile.SYMTYPE, ".", b""),
+                                               ("up", tarfile.SYMTYPE, "l1/..", b""),
+                                               ("hl", tarfile.LNKTYPE, "up/victim.txt", b""),
+                                               ("hl", tarfile.REGTYPE, "", b"overwritten")]:
+                info = tarfile.TarInfo(name)
+                info.type, info.linkname, info.size = kind, linkname, len(data)
+                tar.addfile(info, io.BytesIO(data))
+
+        with pytest.raises(shutil.Error):
+            ArchiveService().unarchive(tmp_path / "chain.tar", "tar", destination=tmp_path / "dst")
+        assert victim.read_text() == "keep"
+        assert not (tmp_path / "dst" / "up").is_symlink()
+
+    def test_existing_symlink(self, tmp_path):
+        (tmp_path / "dst").mkdir()
+        (tmp_path / "target.txt").write_text("keep")
+        (tmp_path / "dst" / "file.txt").symlink_to(tmp_path / "target.txt")
+        with zipfile.ZipFile(tmp_path / "a.zip", "w") as archive:
+            archive.writestr("file.txt", "new")
+        ArchiveService().unarchive(tmp_path / "a.zip", "zip", destination=tmp_path / "dst")
+        # ссылка заменяется файлом, а её цель не перезаписывается
+        assert (tmp_path / "target.txt").read_text() == "keep"
+        assert (tmp_path / "dst" / "file.txt").read_text() == "new"
+
+
+class TestSnapshots:
+
+    def test_chain(self, tree, tmp_path):
+        service = ArchiveService()
+        manifest = tmp_path / "manifest.json"
+        service.create_archive(tree, tmp_path / "full", "gztar", manifest=manifest)
+
+        (tree / "new.txt").write_text("new")
+        (tree / "a.txt").rename(tree / "sub" / "moved.txt")
+        (tree / "sub" / "b.bin").unlink()
+        service.create_archive(tree, tmp_path / "inc1", "gztar", manifest=manifest)
+
+        with tarfile.open(tmp_path / "inc1.tar.gz") as tar:
+            names = tar.getnames()
+            header = json.load(tar.extractfile(names[0]))
+        # переименованный файл не архивируется повторно
+        assert "./sub/moved.txt" not in names and "./new.txt" in names
+        assert header["renamed"] == [["a.txt", "sub/moved.txt"]]
+        assert header["deleted"] == ["sub/b.bin"]
+
+        (tree / "sub" / "moved.txt").write_text("changed")
+        service.create_archive(tree, tmp_path / "inc2", "gztar", manifest=manifest)
+
+        restored = tmp_path / "restored"
+        service.restore_snapshots([tmp_path / "full.tar.gz", tmp_path / "inc1.tar.gz", tmp_path / "inc2.tar.gz"],
+                                  destination=restored)
+        assert sorted(p.relative_to(restored).as_posix() for p in restored.rglob("*")) == \
+               ["new.txt", "sub", "sub/moved.txt"]
+        assert (restored / "sub" / "moved.txt").read_text() == "changed"
+
+    def test_large_chain(self, tree, tmp_path):
+        # оба снимка больше GZIP_BLOCK_SIZE и состоят из нескольких членов gzip
+        service = ArchiveService()
+        manifest = tmp_path / "manifest.json"
+        first = os.urandom(GZIP_BLOCK_SIZE) * 2
+        (tree / "first.bin").write_bytes(first)
+        service.create_archive(tree, tmp_path / "full", "gztar", jobs=2, manifest=manifest)
+        second = os.urandom(GZIP_BLOCK_SIZE) * 2
+        (tree / "second.bin").write_bytes(second)
+        service.create_archive(tree, tmp_path / "inc", "gztar", jobs=2, manifest=manifest)
+
+        restored = tmp_path / "restored"
+        service.restore_snapshots([tmp_path / "full.tar.gz", tmp_path / "inc.tar.gz"], destination=restored)
+        assert (restored / "first.bin").read_bytes() == first
+        assert (restored / "second.bin").read_bytes() == second
+
+    def test_unchanged(self, tree, tmp_path):
+        manifest = tmp_path / "manifest.json"
+        ArchiveService().create_archive(tree, tmp_path / "full", "gztar", manifest=manifest)
+        ArchiveService().create_archive(tree, tmp_path / "inc", "gztar", manifest=manifest)
+        with tarfile.open(tmp_path / "inc.tar.gz") as tar:
+            assert tar.getnames() == [".pybash-snapshot.json"]
+
+    def test_type_change(self, tree, tmp_path):
+        manifest = tmp_path / "manifest.json"
+        ArchiveService().create_archive(tree, tmp_path / "full", "gztar", manifest=manifest)
+        shutil.rmtree(tree / "sub")
+        (tree / "sub").write_text("file")
+        ArchiveService().create_archive(tree, tmp_path / "inc", "gztar", manifest=manifest)
+
+        restored = tmp_path / "restored"
+        ArchiveService().restore_snapshots([tmp_path / "full.tar.gz", tmp_path / "inc.tar.gz"], destination=restored)
+        assert (restored / "sub").read_text() == "file"
+
+    def test_inside_source(self, tree, tmp_path):
+        manifest = tmp_path / "manifest.json"
+        # прошлый снимок с тем же именем уже лежит в директории и перезаписывается новым
+        ArchiveService().create_archive(tree, tree / "snapshot", "tar", manifest=manifest)
+        (tree / "a.txt").write_text("changed")
+        ArchiveService().create_archive(tree, tree / "snapshot", "tar", manifest=manifest)
+        with tarfile.open(tree / "snapshot.tar") as tar:
+            assert "./a.txt" in tar.getnames()
+            assert "./snapshot.tar" not in tar.getnames()
+
+    def test_wrong_order(self, tree, tmp_path):
+        manifest = tmp_path / "manifest.json"
+        ArchiveService().create_archive(tree, tmp_path / "full", "gztar", manifest=manifest)
+        ArchiveService().create_archive(tree, tmp_path / "inc1", "gztar", manifest=manifest)
+        ArchiveService().create_archive(tree, tmp_path / "inc2", "gztar", manifest=manifest)
+        with pytest.raises(Exception, match="does not follow"):
+            ArchiveService().restore_snapshots([tmp_path / "full.tar.gz", tmp_path / "inc2.tar.gz"],
+                                               destination=tmp_path / "restored")
+
+    def test_failed_archive_keeps_manifest(self, tree, tmp_path, mocker):
+        manifest = tmp_path / "manifest.json"
+        ArchiveService().create_archive(tree, tmp_path / "full", "gztar", manifest=manifest)
+        before = manifest.read_text()
+        (tree / "new.txt").write_text("new")
+        mocker.patch("tarfile.TarFile.add", side_effect=PermissionError("denied"))
+        with pytest.raises(PermissionError):
+            ArchiveService().create_archive(tree, tmp_path / "inc", "gztar", manifest=manifest)
+        assert manifest.read_text() == before
+        assert not (tmp_path / "inc.tar.gz").exists()
@@ -0,0 +1,131 @@
+from pathlib import Path
+import os
+import sys
+import pytest
+
+from src.services.cache_service import MetadataCacheService, scandir
+from src.services.walk_service import WalkService
+
+
+linux_only = pytest.mark.skipif(not sys.platform.startswith("linux"), reason="inotify есть только на Linux")
+
+
+def make_old(path: Path):
+    # без inotify свежие директории не кешируются
+    os.utime(path, ns=(10 ** 18, 10 ** 18))
+
+
+@pytest.fixture
+def tree(tmp_path: Path) -> Path:
+    (tmp_path / "dir").mkdir()
+    (tmp_path / "dir" / "a.txt").write_text("a")
+    (tmp_path / "b.txt").write_text("b")
+    make_old(tmp_path / "dir")
+    make_old(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture(params=[True, False], ids=["inotify", "mtime"])
+def cache(request):
+    if request.param and not sys.platform.startswith("linux"):
+        pytest.skip("inotify есть только на Linux")
+    cache = MetadataCacheService(use_inotify=request.param)
+    yield cache
+    cache.close()
+
+
+def names(entries) -> set[str]:
+    return {entry.name for entry in entries}
+
+
+class TestCache:
+
+    def test_hit(self, tree, cache):
+        first = cache.scandir(tree)
+        assert names(first) == {"dir", "b.txt"}
+        assert cache.scandir(tree) is first
+
+    def test_entry(self, tree, cache):
+        entries = {entry.name: entry for entry in cache.scandir(tree)}
+        assert entries["dir"].is_dir()
+        assert entries["b.txt"].is_file()
+        assert entries["b.txt"].stat().st_size == 1
+        assert os.fspath(entries["b.txt"]) == str(tree / "b.txt")
+
+    def test_created(self, tree, cache):
+        cache.scandir(tree)
+        (tree / "c.txt").write_text("c")
+        assert names(cache.scandir(tree)) == {"dir", "b.txt", "c.txt"}
+
+    def test_removed(self, tree, cache):
+        cache.scandir(tree)
+        (tree / "b.txt").unlink()
+        assert names(cache.scandir(tree)) == {"dir"}
+
+    def test_modified_file(self, tree, cache):
+        cache.scandir(tree)
+        (tree / "b.txt").write_text("bbb")
+        entries = {entry.name: entry for entry in cache.scandir(tree)}
+        assert entries["b.txt"].stat().st_size == 3
+
+    def test_renamed_parent(self, tree, cache):
+        cache.scandir(tree / "dir")
+        (tree / "dir").rename(tree / "moved")
+        with pytest.raises(FileNotFoundError):
+            cache.scandir(tree / "dir")
+        assert names(cache.scandir(tree / "moved")) == {"a.txt"}
+
+    def test_eviction(self, tree):
+        cache = MetadataCacheService(max_entries=2, use_inotify=False)
+        first = cache.scandir(tree)
+        cache.scandir(tree / "dir")
+        assert cache.scandir(tree) is not first
+        cache.close()
+
+    def test_invalidate(self, tree, cache):
+        first = cache.scandir(tree)
+        cache.invalidate(tree)
+        assert cache.scandir(tree) is not first
+
+    @linux_only
+    def test_stat_cached_with_inotify(self, tree, mocker):
+        cache = MetadataCacheService()
+        entry = next(entry for entry in cache.scandir(tree) if entry.name == "b.txt")
+        entry.stat()
+        spy = mocker.spy(os, "stat")
+        assert entry.stat().st_size == 1
+        spy.assert_not_called()
+        cache.close()
+
+    def test_modified_subdirectory(self, tree, cache):
+        entry = next(entry for entry in cache.scandir(tree) if entry.name == "dir")
+        entry.stat()
+        (tree / "dir" / "c.txt").write_text("c")
+        entries = {entry.name: entry for entry in cache.scandir(tree)}
+        assert entries["dir"].stat().st_mtime_ns == (tree / "dir").stat().st_mtime_ns != 10 ** 18
+
+    def test_racy_mtime_not_cached(self, tmp_path):
+        cache = MetadataCacheService(use_inotify=False)
+        first = cache.scandir(tmp_path)
+        assert cache.scandir(tmp_path) is not first
+        cache.close()
+
+
+class TestActivate:
+
+    def test_scandir_without_cache(self, tree):
+        assert MetadataCacheService.get_active() is None
+        assert all(isinstance(entry, os.DirEntry) for entry in scandir(tree))
+
+    def test_scandir_with_cache(self, tree, cache):
+        with cache.activate():
+            assert MetadataCacheService.get_active() is cache
+            assert list(scandir(tree)) == cache.scandir(tree)
+        assert MetadataCacheService.get_active() is None
+
+    def test_walk(self, tree, cache):
+        with cache.activate():
+            first = {entry.path for entry in WalkService().iter_files(tree)}
+            (tree / "dir" / "new.txt").write_text("new")
+            second = {entry.path for entry in WalkService().iter_files(tree)}
+        assert second - first == {str(tree / "dir" / "new.txt")}
@@ -0,0 +1,113 @@
+from pathlib import Path
+import errno
+import os
+import sys
+import pytest
+
+from src.services.copy_service import FileCopyService, CopyMethod
+
+
+pytestmark = pytest.mark.skipif(not sys.platform.startswith("linux"), reason="Копирование ядром есть только на Linux")
+
+
+@pytest.fixture
+def no_reflink(mocker):
+    mocker.patch("fcntl.ioctl", side_effect=OSError(errno.EOPNOTSUPP, "Operation not supported"))
+
+
+@pytest.fixture
+def dense(tmp_path: Path) -> Path:
+    path = tmp_path / "dense.bin"
+    path.write_bytes(os.urandom(3 * 1024 * 1024 + 17))
+    return path
+
+
+@pytest.fixture
+def sparse(tmp_path: Path) -> Path:
+    path = tmp_path / "sparse.bin"
+    with open(path, "wb") as f:
+        f.seek(8 * 1024 * 1024)
+        f.write(b"data")
+        f.seek(32 * 1024 * 1024)
+        f.write(b"more")
+        f.truncate(64 * 1024 * 1024)
+    if os.stat(path).st_blocks * 512 >= os.stat(path).st_size:
+        pytest.skip("ФС не поддерживает разреженные файлы")
+    return path
+
+
+class TestCopyFile:
+
+    def test_dense(self, dense, tmp_path, no_reflink):
+        result = FileCopyService.copy_file(dense, tmp_path / "copy.bin")
+        assert result.method == CopyMethod.COPY_FILE_RANGE
+        assert not result.sparse
+        assert (tmp_path / "copy.bin").read_bytes() == dense.read_bytes()
+
+    def test_sparse(self, sparse, tmp_path, no_reflink):
+        result = FileCopyService.copy_file(sparse, tmp_path / "copy.bin")
+        assert result.sparse
+        copy = tmp_path / "copy.bin"
+        assert copy.read_bytes() == sparse.read_bytes()
+        assert os.stat(copy).st_blocks * 512 < os.stat(copy).st_size
+
+    def test_sendfile_fallback(self, dense, tmp_path, no_reflink, mocker):
+        mocker.patch("os.copy_file_range", side_effect=OSError(errno.EXDEV, "Cross-device link"))
+        result = FileCopyService.copy_file(dense, tmp_path / "copy.bin")
+        assert result.method == CopyMethod.SENDFILE
+        assert (tmp_path / "copy.bin").read_bytes() == dense.read_bytes()
+
+    def test_userspace_fallback(self, sparse, tmp_path, no_reflink, mocker):
+        mocker.patch("os.copy_file_range", side_effect=OSError(errno.ENOSYS, "Function not implemented"))
+        mocker.patch("os.sendfile", side_effect=OSError(errno.EINVAL, "Invalid argument"))
+        result = FileCopyService.copy_file(sparse, tmp_path / "copy.bin")
+        assert result.method == CopyMethod.USERSPACE
+        assert (tmp_path / "copy.bin").read_bytes() == sparse.read_bytes()
+
+    def test_procfs(self, tmp_path, no_reflink):
+        # у файлов procfs st_size равен 0, а содержимое генерируется при чтении
+        result = FileCopyService.copy_file("/proc/self/status", tmp_path / "copy.txt", metadata=False)
+        content = (tmp_path / "copy.txt").read_text()
+        assert content.startswith("Name:")
+        assert result.size == len(content) > 0
+
+    def test_shrunk(self, dense, tmp_path, no_reflink, mocker):
+        copy_file_range = os.copy_file_range
+
+        def shrinking(src_fd, dst_fd, count, offset_src=None, offset_dst=None):
+            os.truncate(dense, 1024 * 1024)
+            return copy_file_range(src_fd, dst_fd, count, offset_src, offset_dst)
+
+        mocker.patch("os.copy_file_range", side_effect=shrinking)
+        result = FileCopyService.copy_file(dense, tmp_path / "copy.bin")
+        assert result.size == 1024 * 1024
+        assert (tmp_path / "copy.bin").read_bytes() == dense.read_bytes()
+
+    def test_reflink(self, dense, tmp_path, mocker):
+        ioctl = mocker.patch("fcntl.ioctl")
+        result = FileCopyService.copy_file(dense, tmp_path / "copy.bin")
+        assert result.method == CopyMethod.REFLINK
+        ioctl.assert_called_once()
+
+    def test_other_errors(self, dense, tmp_path, no_reflink, mocker):
+        mocker.patch("os.copy_file_range", side_effect=OSError(errno.ENOSPC, "No space left on device"))
+        with pytest.raises(OSError):
+            FileCopyService.copy_file(dense, tmp_path / "copy.bin")
+
+    def test_metadata(self, dense, tmp_path):
+        os.utime(dense, ns=(10 ** 18, 10 ** 18))
+        FileCopyService.copy_file(dense, tmp_path / "copy.bin")
+        assert os.stat(tmp_path / "copy.bin").st_mtime_ns == 10 ** 18
+        FileCopyService.copy_file(dense, tmp_path / "plain.bin", metadata=False)
+        assert os.stat(tmp_path / "plain.bin").st_mtime_ns != 10 ** 18
+
+    def test_overwrite(self, dense, tmp_path):
+        copy = tmp_path / "copy.bin"
+        copy.write_bytes(b"x" * (5 * 1024 * 1024))
+        FileCopyService.copy_file(dense, copy)
+        assert copy.read_bytes() == dense.read_bytes()
+
+    def test_same_file(self, dense):
+        with pytest.raises(OSError):
+            FileCopyService.copy_file(dense, dense)
+        assert dense.stat().st_size == 3 * 1024 * 1024 + 17
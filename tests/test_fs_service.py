@@ -1,14 +1,19 @@
 from pathlib import Path
 from typing import Generator
 import pytest
+import shutil
+import sys
 from pyfakefs.fake_filesystem_unittest import Patcher
 import os
 
 from src.services.fs_service import FileSystemService, FlagRequiredError, ConfirmationRequiredError
+from src.services.copy_service import FileCopyService
 
 
 @pytest.fixture
-def filesystem() -> Generator[Patcher, None, None]:
+def filesystem(mocker) -> Generator[Patcher, None, None]:
+    # pyfakefs не эмулирует ioctl и copy_file_range, поэтому копирование идет через shutil
+    mocker.patch("src.services.copy_service.KERNEL_COPY", False)
     with Patcher() as p:
         yield p
 
@@ -33,6 +38,26 @@ def fake_files(filesystem: Patcher):
     os.chdir("/tmp")
 
 
+class TestIsHidden:
+    def test_dot_name(self, fake_files):
+        Path("/tmp/.hidden").touch()
+        assert FileSystemService.is_hidden(Path("/tmp/.hidden"))
+        assert not FileSystemService.is_hidden(Path("/tmp/file1.txt"))
+
+    def test_dir_entry(self, fake_files):
+        Path("/tmp/.hidden").touch()
+        with os.scandir("/tmp") as it:
+            hidden = {entry.name for entry in it if FileSystemService.is_hidden(entry)}
+        assert hidden == {".hidden"}
+
+    @pytest.mark.skipif(os.name == "nt", reason="Атрибуты читаются только на Windows")
+    def test_no_stat(self, fake_files, mocker):
+        path = mocker.Mock(spec=["name", "stat"])
+        path.name = "file1.txt"
+        assert not FileSystemService.is_hidden(path)
+        path.stat.assert_not_called()
+
+
 class TestCopy:
     def test_basic(self, fake_files):
         src = Path('/tmp/file1.txt')
@@ -52,7 +77,7 @@ class TestCopy:
         dst = Path('/tmp/dir3')
         FileSystemService.copy(src, dst, recursive=True)
         assert dst.exists()
-        assert os.listdir(src) == os.listdir(dst)
+        assert sorted(os.listdir(src)) == sorted(os.listdir(dst))
 
     def test_override_basic(self, fake_files):
         src = Path('/tmp/file1.txt')
@@ -81,6 +106,123 @@ class TestCopy:
         assert (dst / "file3.txt").exists()
         assert (dst / "file3.txt").read_text() == "Content 3"
 
+    def test_copy_tree(self, fake_files, filesystem):
+        filesystem.fs.create_file('/tmp/dir1/sub/deep/file.txt').set_contents("Deep")
+        FileSystemService.copy(Path('/tmp/dir1'), Path('/tmp/dir2'), recursive=True, jobs=4)
+        assert Path('/tmp/dir2/dir1/sub/deep/file.txt').read_text() == "Deep"
+        assert Path('/tmp/dir2/dir1/file2.txt').read_text() == "Content 1 2"
+
+    def test_copy_tree_symlink_loop(self, fake_files, filesystem):
+        filesystem.fs.create_symlink('/tmp/dir1/loop', '/tmp/dir1')
+        with pytest.raises(OSError):
+            FileSystemService.copy(Path('/tmp/dir1'), Path('/tmp/dir3'), recursive=True)
+        assert Path('/tmp/dir3/file1.txt').exists()
+
+
+class TestCopyMany:
+
+    def test_confirmations(self, fake_files):
+        gen = FileSystemService.copy_many([Path('/tmp/file1.txt'), Path('/tmp/dir1'), Path('/tmp/dir2')],
+                                          Path('/usr'), recursive=False)
+        source, exception = next(gen)
+        assert source == Path('/tmp/dir1') and isinstance(exception, FlagRequiredError)
+        source, exception = next(gen)
+        assert source == Path('/tmp/dir2') and isinstance(exception, FlagRequiredError)
+        with pytest.raises(StopIteration):
+            next(gen)
+        assert Path('/usr/file1.txt').read_text() == "Content 1"
+
+    def test_override(self, fake_files):
+        Path('/usr/file1.txt').write_text("Old")
+        Path('/usr/file2.txt').write_text("Old")
+        gen = FileSystemService.copy_many([Path('/tmp/file1.txt'), Path('/tmp/file2.txt'), Path('/tmp/dir1')],
+                                          Path('/usr'), recursive=True, jobs=2)
+        source, exception = next(gen)
+        assert isinstance(exception, ConfirmationRequiredError)
+        source, exception = gen.send(True)
+        assert source == Path('/tmp/file2.txt') and isinstance(exception, ConfirmationRequiredError)
+        with pytest.raises(StopIteration):
+            gen.send(False)
+
+        assert Path('/usr/file1.txt').read_text() == "Content 1"
+        assert Path('/usr/file2.txt').read_text() == "Old"
+        assert Path('/usr/dir1/file1.txt').read_text() == "Content 1 1"
+
+    def test_errors(self, fake_files):
+        results = list(FileSystemService.copy_many([Path('/tmp/missing.txt'), Path('/tmp/file1.txt')], Path('/usr')))
+        assert [source for source, _ in results] == [Path('/tmp/missing.txt')]
+        assert isinstance(results[0][1], OSError)
+        assert Path('/usr/file1.txt').exists()
+
+
+class TestSync:
+
+    @pytest.fixture
+    def synced(self, fake_files) -> Path:
+        FileSystemService.copy(Path('/tmp/dir1'), Path('/usr/dir1'), recursive=True, sync=True)
+        return Path('/usr/dir1')
+
+    def test_first(self, fake_files):
+        stats = FileSystemService.copy(Path('/tmp/dir1'), Path('/usr/dir1'), recursive=True, sync=True)
+        assert stats.copied == 2 and stats.copied_bytes == 22
+        assert stats.skipped == 0
+
+    def test_unchanged(self, synced):
+        stats = FileSystemService.copy(Path('/tmp/dir1'), Path('/usr'), recursive=True, sync=True)
+        assert stats.copied == 0
+        assert stats.skipped == 2 and stats.skipped_bytes == 22
+
+    def test_changed(self, synced):
+        Path('/tmp/dir1/file1.txt').write_text("Changed content")
+        Path('/tmp/dir1/new.txt').write_text("New")
+        stats = FileSystemService.copy(Path('/tmp/dir1'), Path('/usr'), recursive=True, sync=True)
+        assert (stats.copied, stats.skipped) == (2, 1)
+        assert (synced / "file1.txt").read_text() == "Changed content"
+        assert (synced / "new.txt").read_text() == "New"
+
+    def test_checksum(self, synced):
+        # тот же размер и время изменения, но другое содержимое
+        st = os.stat('/tmp/dir1/file1.txt')
+        Path('/tmp/dir1/file1.txt').write_text("Content X 1")
+        os.utime('/tmp/dir1/file1.txt', ns=(st.st_atime_ns, st.st_mtime_ns))
+
+        stats = FileSystemService.copy(Path('/tmp/dir1'), Path('/usr'), recursive=True, sync=True)
+        assert stats.copied == 0
+        stats = FileSystemService.copy(Path('/tmp/dir1'), Path('/usr'), recursive=True, sync=True, checksum=True)
+        assert (stats.copied, stats.skipped) == (1, 1)
+        assert (synced / "file1.txt").read_text() == "Content X 1"
+
+    def test_delete(self, synced):
+        (synced / "extra.txt").write_text("Extra")
+        (synced / "extra_dir").mkdir()
+        (synced / "extra_dir" / "file.txt").write_text("Extra")
+
+        stats = FileSystemService.copy(Path('/tmp/dir1'), Path('/usr'), recursive=True, sync=True)
+        assert stats.deleted == 0 and (synced / "extra.txt").exists()
+        stats = FileSystemService.copy(Path('/tmp/dir1'), Path('/usr'), recursive=True, sync=True, delete=True)
+        assert stats.deleted == 2
+        assert sorted(os.listdir(synced)) == ["file1.txt", "file2.txt"]
+
+    def test_copy_many_stats(self, synced):
+        gen = FileSystemService.copy_many([Path('/tmp/dir1'), Path('/tmp/file1.txt')], Path('/usr'),
+                                          recursive=True, sync=True)
+        with pytest.raises(StopIteration) as e:
+            next(gen)
+        assert (e.value.value.copied, e.value.value.skipped) == (1, 2)
+
+
+class TestIntoItself:
+
+    def test_copy(self, fake_files):
+        with pytest.raises(OSError):
+            FileSystemService.copy(Path("/tmp/dir1"), Path("/tmp/dir1/sub"), recursive=True)
+        assert not Path("/tmp/dir1/sub").exists()
+
+    def test_move_many(self, fake_files):
+        result = list(FileSystemService.move_many([Path("/tmp/dir1"), Path("/tmp/file3.txt")], Path("/tmp/dir1")))
+        assert len(result) == 1 and result[0][0] == Path("/tmp/dir1")
+        assert Path("/tmp/dir1/file3.txt").read_text() == "Content 3"
+
 
 class TestMove:
 
@@ -126,36 +268,122 @@ class TestMove:
         assert (dst / "file3.txt").read_text() == "Content 3"
 
 
-class TestAsserts:
-
-    def test_parent_positive(self, fake_files):
-        path1 = Path("/tmp")
-        path2 = Path("/usr")
-        FileSystemService._FileSystemService__assert_is_not_parent(path1, path2)    # type: ignore
-
-    @pytest.mark.parametrize("path1, path2", [("/", "/tmp"), ("/usr", "/usr/bin"), ("/tmp/dir1/../", "/tmp/dir2")])
-    def test_parent_raises(self, fake_files, path1: str, path2: str):
-        with pytest.raises(OSError):
-            FileSystemService._FileSystemService__assert_is_not_parent(Path(path1), Path(path2))    # type: ignore
-
-    def test_anchor_positive(self, fake_files):
-        FileSystemService._FileSystemService__assert_is_not_anchor(Path("/tmp"))    # type: ignore
+class TestMoveMany:
 
-    @pytest.mark.parametrize("path", ["/", "//", "C://", "F:/", "/tmp/.."])
-    def test_anchor_raises(self, fake_files, path: str):
-        with pytest.raises(OSError):
-            FileSystemService._FileSystemService__assert_is_not_anchor(Path(path))    # type: ignore
+    @pytest.fixture
+    def mount(self, fake_files, filesystem) -> Path:
+        filesystem.fs.add_mount_point("/mnt")
+        filesystem.fs.create_file("/tmp/dir1/sub/file3.txt").set_contents("Content 1 3")
+        os.symlink("file1.txt", "/tmp/dir1/link")
+        return Path("/mnt")
+
+    def test_many(self, fake_files):
+        results = list(FileSystemService.move_many([Path("/tmp/file1.txt"), Path("/tmp/dir2")], Path("/usr")))
+        assert results == []
+        assert Path("/usr/file1.txt").read_text() == "Content 1"
+        assert Path("/usr/dir2/file2.txt").exists()
+        assert not Path("/tmp/dir2").exists()
+
+    def test_confirmation(self, fake_files):
+        Path("/usr/file1.txt").write_text("Old")
+        Path("/usr/file2.txt").write_text("Old")
+        gen = FileSystemService.move_many([Path("/tmp/file1.txt"), Path("/tmp/file2.txt")], Path("/usr"))
+        source, exception = next(gen)
+        assert isinstance(exception, ConfirmationRequiredError)
+        source, exception = gen.send(True)
+        assert source == Path("/tmp/file2.txt")
+        with pytest.raises(StopIteration):
+            gen.send(False)
+        assert Path("/usr/file1.txt").read_text() == "Content 1"
+        assert Path("/usr/file2.txt").read_text() == "Old"
+        assert Path("/tmp/file2.txt").exists()
+
+    def test_missing(self, fake_files):
+        results = list(FileSystemService.move_many([Path("/tmp/missing.txt")], Path("/usr")))
+        assert isinstance(results[0][1], FileNotFoundError)
+
+    def test_cross_device(self, mount):
+        assert list(FileSystemService.move_many([Path("/tmp/dir1"), Path("/tmp/file1.txt")], mount, jobs=4)) == []
+        assert not Path("/tmp/dir1").exists()
+        assert Path("/mnt/dir1/sub/file3.txt").read_text() == "Content 1 3"
+        assert os.readlink("/mnt/dir1/link") == "file1.txt"
+        assert Path("/mnt/file1.txt").read_text() == "Content 1"
+        assert not any(name.endswith(".journal") for name in os.listdir(mount))
+
+    def test_resume(self, mount, mocker):
+        copy_file = FileCopyService.copy_file
+
+        def failing(src, dst, metadata=True):
+            if src.endswith("file3.txt"):
+                raise OSError("Interrupted")
+            return copy_file(src, dst, metadata=metadata)
+
+        mocker.patch.object(FileCopyService, "copy_file", side_effect=failing)
+        results = list(FileSystemService.move_many([Path("/tmp/dir1")], mount))
+        assert len(results) == 1 and isinstance(results[0][1], shutil.Error)
+        assert sorted(os.listdir("/tmp/dir1")) == ["sub"]
+        assert Path("/tmp/dir1/sub/file3.txt").exists()
+        assert any(name.endswith(".journal") for name in os.listdir(mount))
+
+        # файл успел скопироваться, но не удалиться до прерывания
+        shutil.copy2("/tmp/dir1/sub/file3.txt", "/mnt/dir1/sub/file3.txt")
+        spy = mocker.patch.object(FileCopyService, "copy_file", side_effect=copy_file)
+        assert list(FileSystemService.move_many([Path("/tmp/dir1")], mount)) == []
+        spy.assert_not_called()
+        assert not Path("/tmp/dir1").exists()
+        assert Path("/mnt/dir1/sub/file3.txt").read_text() == "Content 1 3"
+        assert not any(name.endswith(".journal") for name in os.listdir(mount))
+
+    def test_resume_partial_copy(self, mount, mocker):
+        copy_file = FileCopyService.copy_file
+
+        def failing(src, dst, metadata=True):
+            if src.endswith("file3.txt"):
+                raise OSError("Interrupted")
+            return copy_file(src, dst, metadata=metadata)
+
+        mocker.patch.object(FileCopyService, "copy_file", side_effect=failing)
+        assert len(list(FileSystemService.move_many([Path("/tmp/dir1")], mount))) == 1
+
+        # копирование прервалось, когда размер копии уже совпадал с источником
+        Path("/mnt/dir1/sub/file3.txt").write_text("\0" * len("Content 1 3"))
+        shutil.copystat("/tmp/dir1/sub/file3.txt", "/mnt/dir1/sub/file3.txt")
+        spy = mocker.patch.object(FileCopyService, "copy_file", side_effect=copy_file)
+        assert list(FileSystemService.move_many([Path("/tmp/dir1")], mount)) == []
+        spy.assert_called_once()
+        assert Path("/mnt/dir1/sub/file3.txt").read_text() == "Content 1 3"
+
+    def test_resume_recorded(self, mount, mocker):
+        remove = os.remove
+
+        def failing(path):
+            if str(path).endswith("file3.txt"):
+                raise OSError("Interrupted")
+            remove(path)
+
+        mocker.patch("os.remove", side_effect=failing)
+        assert len(list(FileSystemService.move_many([Path("/tmp/dir1")], mount))) == 1
+        assert Path("/tmp/dir1/sub/file3.txt").exists()
+        mocker.patch("os.remove", side_effect=remove)
+
+        # копия уже проверена и записана в журнал: источник удаляется без копирования и сравнения
+        spy = mocker.spy(FileCopyService, "copy_file")
+        compare = mocker.patch("src.services.fs_service._same_content")
+        assert list(FileSystemService.move_many([Path("/tmp/dir1")], mount)) == []
+        spy.assert_not_called()
+        compare.assert_not_called()
+        assert not Path("/tmp/dir1").exists()
+        assert Path("/mnt/dir1/sub/file3.txt").read_text() == "Content 1 3"
 
 
 class TestRemove:
 
     @pytest.fixture
     def asserts(self, mocker):
-        mocker.patch("src.services.fs_service.FileSystemService._FileSystemService__assert_is_not_parent")
-        mocker.patch("src.services.fs_service.FileSystemService._FileSystemService__assert_is_not_anchor")
+        check = mocker.patch("src.services.fs_service.PathGuardService.check",
+                             side_effect=lambda path, follow_symlinks=False: os.lstat(path))
         yield
-        FileSystemService._FileSystemService__assert_is_not_parent.assert_called()    # type: ignore
-        FileSystemService._FileSystemService__assert_is_not_anchor.assert_called()    # type: ignore
+        check.assert_called()
 
     def test_basic(self, fake_files, asserts):
         path = Path("/tmp/file1.txt")
@@ -178,3 +406,82 @@ class TestRemove:
         path = Path("/tmp/dir1")
         FileSystemService.remove(path, recursive=True, confirmed=True)
         assert not path.exists()
+
+    def test_tree(self, fake_files, asserts):
+        for i in range(20):
+            Path(f"/tmp/dir1/sub{i}/deep").mkdir(parents=True)
+            Path(f"/tmp/dir1/sub{i}/deep/file.txt").write_text("text")
+        FileSystemService.remove(Path("/tmp/dir1"), recursive=True, confirmed=True, jobs=4)
+        assert not Path("/tmp/dir1").exists()
+        assert Path("/tmp/dir2").exists()
+
+    @pytest.mark.skipif(not sys.platform.startswith("linux"), reason="Лимит дескрипторов меняется только на Linux")
+    def test_wide_tree_few_descriptors(self, tmp_path):
+        import resource
+
+        for i in range(300):
+            (tmp_path / "wide" / f"sub{i}" / "deep").mkdir(parents=True)
+
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (min(200, soft), hard))
+        try:
+            FileSystemService.remove(tmp_path / "wide", recursive=True, confirmed=True, jobs=8)
+        finally:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (soft, hard))
+        assert not (tmp_path / "wide").exists()
+
+    def test_symlink_to_directory(self, fake_files, asserts):
+        path = Path("/tmp/link")
+        path.symlink_to("/tmp/dir1")
+        FileSystemService.remove(path)
+        assert not path.exists()
+        assert Path("/tmp/dir1/file1.txt").exists()
+
+    def test_trash(self, fake_files, asserts, mocker):
+        popen = mocker.patch("subprocess.Popen")
+        FileSystemService.remove(Path("/tmp/dir1"), recursive=True, confirmed=True, trash=True)
+        assert not Path("/tmp/dir1").exists()
+        trashed = list(Path("/.pybash-trash").iterdir())
+        assert len(trashed) == 1 and trashed[0].name.endswith("-dir1")
+        assert popen.call_args.args[0][-1] == "/.pybash-trash"
+
+    def test_trash_many(self, fake_files, asserts, mocker):
+        popen = mocker.patch("subprocess.Popen")
+        trashes = {FileSystemService.remove(Path(path), recursive=True, confirmed=True, trash=True, purge=False)
+                   for path in ("/tmp/dir1", "/tmp/dir2", "/tmp/file1.txt")}
+        popen.assert_not_called()
+
+        FileSystemService.purge_trash(trashes)
+        assert len(list(Path("/.pybash-trash").iterdir())) == 3
+        popen.assert_called_once()
+        assert popen.call_args.args[0][-1] == "/.pybash-trash"
+
+
+class TestDiskUsage:
+    def test_basic(self, fake_files):
+        result = dict(FileSystemService.disk_usage([Path("dir1"), Path("file1.txt")], apparent_size=True))
+        assert result == {Path("dir1"): 22, Path("file1.txt"): 9}
+
+    def test_nested(self, fake_files):
+        result = dict(FileSystemService.disk_usage([Path("/tmp")], apparent_size=True))
+        assert result[Path("/tmp/dir1")] == 22
+        assert result[Path("/tmp/dir2")] == 22
+        assert result[Path("/tmp")] == 27 + 22 + 22
+
+    def test_children_first(self, fake_files):
+        result = [path for path, _ in FileSystemService.disk_usage([Path("/tmp")], apparent_size=True, jobs=4)]
+        assert result[-1] == Path("/tmp")
+        assert set(result) == {Path("/tmp"), Path("/tmp/dir1"), Path("/tmp/dir2")}
+
+    def test_max_depth(self, fake_files):
+        result = dict(FileSystemService.disk_usage([Path("/tmp")], max_depth=0, apparent_size=True))
+        assert result == {Path("/tmp"): 71}
+
+    def test_hardlinks(self, fake_files):
+        os.link("/tmp/dir1/file1.txt", "/tmp/dir2/link.txt")
+        result = dict(FileSystemService.disk_usage([Path("/tmp")], apparent_size=True))
+        assert result[Path("/tmp")] == 71
+
+    def test_error(self, fake_files):
+        result = dict(FileSystemService.disk_usage([Path("/tmp/missing")]))
+        assert isinstance(result[Path("/tmp/missing")], OSError)
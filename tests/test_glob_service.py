@@ -0,0 +1,73 @@
+from typing import Generator
+import os
+import pytest
+from pyfakefs.fake_filesystem_unittest import Patcher
+
+from src.services.glob_service import GlobService
+
+
+@pytest.fixture
+def fake_tree() -> Generator[Patcher, None, None]:
+    with Patcher() as p:
+        p.fs.create_file("/root/b.py")
+        p.fs.create_file("/root/a.py")
+        p.fs.create_file("/root/notes.txt")
+        p.fs.create_file("/root/.hidden.py")
+        p.fs.create_file("/root/s*.py")
+        p.fs.create_file("/root/src/app.py")
+        p.fs.create_file("/root/src/lib/util.py")
+        p.fs.create_file("/root/.git/hook.py")
+        os.chdir("/root")
+        yield p
+
+
+class TestSplit:
+
+    def test_plain(self, fake_tree):
+        assert GlobService.split("cp 'a b' c\\ d \"e\\\"f\"") == ["cp", "a b", "c d", 'e"f']
+
+    def test_star(self, fake_tree):
+        assert GlobService.split("rm *.py") == ["rm", "a.py", "b.py", "s*.py"]
+
+    def test_quoted(self, fake_tree):
+        assert GlobService.split("grep '*.py' \"*.py\" \\*.py") == ["grep", "*.py", "*.py", "*.py"]
+
+    def test_partially_quoted(self, fake_tree):
+        assert GlobService.split("rm 's*'.py") == ["rm", "s*.py"]
+        assert GlobService.split("rm s'*'*") == ["rm", "s*.py"]
+
+    def test_no_match(self, fake_tree):
+        assert GlobService.split("rm *.log") == ["rm", "*.log"]
+
+    def test_unclosed_quote(self, fake_tree):
+        with pytest.raises(ValueError):
+            GlobService.split("rm 'a")
+
+
+class TestExpand:
+
+    def test_question_and_range(self, fake_tree):
+        assert GlobService.expand("[ab].p?") == ["a.py", "b.py"]
+
+    def test_hidden(self, fake_tree):
+        assert GlobService.expand(".*.py") == [".hidden.py"]
+
+    def test_absolute(self, fake_tree):
+        assert GlobService.expand("/root/*.txt") == ["/root/notes.txt"]
+
+    def test_directories(self, fake_tree):
+        assert GlobService.expand("*/") == ["src/"]
+        assert GlobService.expand("*/app.py") == ["src/app.py"]
+        assert GlobService.expand("*/missing.py") == []
+
+    def test_recursive(self, fake_tree):
+        assert GlobService.expand("**/*.py") == ["a.py", "b.py", "s*.py", "src/app.py", "src/lib/util.py"]
+        assert GlobService.expand("src/**") == ["src/app.py", "src/lib", "src/lib/util.py"]
+
+    def test_reads_once(self, fake_tree, mocker):
+        spy = mocker.spy(os, "scandir")
+        GlobService.expand("**/*.py")
+        assert spy.call_count == 3
+
+    def test_expand_args(self, fake_tree):
+        assert GlobService.expand_args(["rm", "*.txt", "plain"]) == ["rm", "notes.txt", "plain"]
@@ -0,0 +1,107 @@
+from pathlib import Path
+import os
+import pytest
+
+from src.services.index_service import IndexService
+from src.services.search_service import SearchService
+from src.services.walk_service import WalkService
+
+
+# sqlite работает с настоящей файловой системой, поэтому вместо pyfakefs используется tmp_path
+@pytest.fixture
+def index_root(tmp_path: Path, mocker) -> Path:
+    root = tmp_path / "index"
+    mocker.patch("src.services.index_service.INDEX_ROOT", root)
+    return root
+
+
+@pytest.fixture
+def tree(tmp_path: Path) -> Path:
+    source = tmp_path / "source"
+    (source / "nested").mkdir(parents=True)
+    (source / "first.txt").write_text("hello world\nfoo bar\n")
+    (source / "second.txt").write_text("nothing here\n")
+    (source / "nested" / "third.txt").write_text("Hello again\n")
+    (source / "app.bin").write_bytes(b"\x00\x01hello world")
+    return source
+
+
+def touch_changed(path: Path, content: str):
+    path.write_text(content)
+    # mtime может не измениться за время теста, поэтому сдвигаем его явно
+    st = path.stat()
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+
+
+class TestUpdate:
+
+    def test_build(self, index_root, tree):
+        stats = IndexService().update(tree)
+        assert (stats.added, stats.updated, stats.removed, stats.unchanged) == (4, 0, 0, 0)
+
+    def test_incremental(self, index_root, tree):
+        IndexService().update(tree)
+
+        touch_changed(tree / "second.txt", "changed\n")
+        (tree / "first.txt").unlink()
+        (tree / "fourth.txt").write_text("new\n")
+
+        stats = IndexService().update(tree)
+        assert (stats.added, stats.updated, stats.removed, stats.unchanged) == (1, 1, 1, 2)
+
+    def test_on_file(self, index_root, tree):
+        with pytest.raises(NotADirectoryError):
+            IndexService().update(tree / "first.txt")
+
+
+class TestSelect:
+
+    def selected(self, tree: Path, directory: Path, pattern: str, case_insensitive: bool = False) -> set[str]:
+        selection = IndexService().select(directory, pattern, case_insensitive=case_insensitive)
+        assert selection is not None
+        return {entry.name for entry in WalkService().iter_files(directory) if selection.may_match(directory, entry)}
+
+    def test_no_index(self, index_root, tree):
+        assert IndexService().select(tree, "hello") is None
+
+    def test_literal(self, index_root, tree):
+        IndexService().update(tree)
+        # бинарные файлы не индексируются и всегда остаются кандидатами
+        assert self.selected(tree, tree, "world") == {"first.txt", "app.bin"}
+        assert self.selected(tree, tree, "HELLO", case_insensitive=True) == {"first.txt", "third.txt", "app.bin"}
+
+    def test_regex(self, index_root, tree):
+        IndexService().update(tree)
+        assert self.selected(tree, tree, r"foo\s+bar|nothing") == {"first.txt", "second.txt", "app.bin"}
+        assert self.selected(tree, tree, "(?i)HELLO+") == {"first.txt", "third.txt", "app.bin"}
+
+    def test_not_narrowable(self, index_root, tree):
+        IndexService().update(tree)
+        assert IndexService().select(tree, "h.l") is None
+        assert IndexService().select(tree, "hello|a") is None
+
+    def test_parent_index(self, index_root, tree):
+        IndexService().update(tree)
+        assert self.selected(tree, tree / "nested", "again") == {"third.txt"}
+
+    def test_changed_file(self, index_root, tree):
+        IndexService().update(tree)
+        touch_changed(tree / "second.txt", "world\n")
+        assert self.selected(tree, tree, "world") == {"first.txt", "second.txt", "app.bin"}
+
+
+class TestSearchWithIndex:
+
+    def test_same_results(self, index_root, tree):
+        without_index = list(SearchService().find_in_files_recursively(tree, "hello", case_insensitive=True))
+        IndexService().update(tree)
+        with_index = list(SearchService().find_in_files_recursively(tree, "hello", case_insensitive=True))
+
+        assert [r.file_path for r in with_index] == [r.file_path for r in without_index]
+
+    def test_skips_files(self, index_root, tree, mocker):
+        IndexService().update(tree)
+        spy = mocker.spy(SearchService, "find_by_matcher")
+
+        list(SearchService().find_in_files_recursively(tree, "nothing", jobs=1))
+        assert {call.args[0].name for call in spy.call_args_list} == {"second.txt", "app.bin"}
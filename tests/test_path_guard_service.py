@@ -0,0 +1,67 @@
+from pathlib import Path
+from typing import Generator
+import pytest
+from pyfakefs.fake_filesystem_unittest import Patcher
+import os
+
+from src.services.path_guard_service import PathGuardService
+
+
+@pytest.fixture
+def fake_files() -> Generator[Patcher, None, None]:
+    with Patcher() as p:
+        p.fs.create_file("/tmp/file1.txt")
+        p.fs.create_file("/tmp/dir1/file1.txt")
+        p.fs.create_dir("/tmp/dir2")
+        p.fs.create_dir("/usr/bin")
+        os.chdir("/tmp/dir1")
+        yield p
+
+
+class TestPathGuard:
+
+    @pytest.mark.parametrize("path", ["/usr", "/tmp/dir2", "/tmp/file1.txt", "file1.txt"])
+    def test_positive(self, fake_files, path: str):
+        PathGuardService().check(Path(path))
+
+    @pytest.mark.parametrize("path", ["/tmp", "/tmp/dir1", ".", "..", "/tmp/dir2/../", "/"])
+    def test_parent_raises(self, fake_files, path: str):
+        with pytest.raises(OSError):
+            PathGuardService().check(Path(path))
+
+    @pytest.mark.parametrize("path", ["/", "//", "C://", "F:/", "/tmp/.."])
+    def test_anchor_raises(self, fake_files, path: str):
+        with pytest.raises(OSError):
+            PathGuardService(Path("/usr")).check(Path(path))
+
+    def test_base(self, fake_files):
+        guard = PathGuardService(Path("/usr/bin/new"))
+        guard.check(Path("/tmp"))
+        with pytest.raises(OSError):
+            guard.check(Path("/usr"))
+
+    def test_file_base(self, fake_files):
+        # файл - не родитель самого себя
+        PathGuardService(Path("/tmp/file1.txt")).check(Path("/tmp/file1.txt"))
+
+    def test_symlink(self, fake_files):
+        Path("/tmp/dir2/link").symlink_to("/tmp")
+        guard = PathGuardService()
+        guard.check(Path("/tmp/dir2/link"))
+        with pytest.raises(OSError):
+            guard.check(Path("/tmp/dir2/link"), follow_symlinks=True)
+
+    def test_many(self, fake_files):
+        paths = [Path("/tmp"), Path("/usr"), Path("/missing"), Path("/tmp/dir2")]
+        results = PathGuardService().check_many(paths)
+        assert {path for path, result in results.items() if isinstance(result, OSError)} == {Path("/tmp"), Path("/missing")}
+        assert isinstance(results[Path("/missing")], FileNotFoundError)
+        st = results[Path("/usr")]
+        assert not isinstance(st, OSError) and st.st_ino == os.stat("/usr").st_ino
+
+    def test_stats_once(self, fake_files, mocker):
+        guard = PathGuardService()
+        spy = mocker.spy(os, "stat")
+        guard.check_many([Path("/tmp/file1.txt")] * 100)
+        # один stat на объект и один на корень
+        assert spy.call_count == 101
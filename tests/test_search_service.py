@@ -4,7 +4,7 @@ from typing import Generator
 import os
 from pathlib import Path
 
-from src.services.search_service import SearchService, SearchResultLine
+from src.services.search_service import SearchService, SearchResultLine, BinaryFiles, PARALLEL_WINDOW_PER_JOB
 
 
 @pytest.fixture
@@ -53,12 +53,110 @@ class TestFindInFile:
         assert result.file_path == source
         assert len(result.fragments) == 0
 
+    def test_match_does_not_span_lines(self, fake_files):
+        source = Path("/tmp/test.txt")
+
+        result = SearchService().find_in_file(source, r"1\s+Line")
+        assert len(result.fragments) == 0
+
+    def test_crlf(self, filesystem):
+        filesystem.fs.create_file("/data/crlf.txt", contents=b"first\r\nsecond\r\n")
+        source = Path("/data/crlf.txt")
+
+        result = SearchService().find_in_file(source, "d$")
+        assert result.fragments == [SearchResultLine(2, "second\n")]
+
+    def test_unicode(self, filesystem):
+        filesystem.fs.create_file("/data/ru.txt", contents="один\nдва\nтри\n".encode("utf-8"))
+        source = Path("/data/ru.txt")
+
+        result = SearchService().find_in_file(source, "д.а")
+        assert result.fragments == [SearchResultLine(2, "два\n")]
+
+        result = SearchService().find_in_file(source, "т.и", case_insensitive=True)
+        assert result.fragments == [SearchResultLine(3, "три\n")]
+
+    def test_max_count(self, fake_files):
+        source = Path("/tmp/test.txt")
+
+        result = SearchService().find_in_file(source, "Line", case_insensitive=True, max_count=2)
+        assert result.fragments == [SearchResultLine(1, "Line 1\n"), SearchResultLine(2, "Line 2\n")]
+
+    def test_fixed_strings(self, filesystem):
+        filesystem.fs.create_file("/data/dots.txt", contents="a.c\nabc\n")
+        source = Path("/data/dots.txt")
+
+        result = SearchService().find_in_file(source, "a.c", fixed_strings=True)
+        assert result.fragments == [SearchResultLine(1, "a.c\n")]
+
+    @pytest.mark.parametrize("fixed_strings", [False, True])
+    def test_many_patterns(self, fake_files, fixed_strings: bool):
+        source = Path("/tmp/test.txt")
+
+        result = SearchService().find_in_file(source, ["Line 2", "data", "Lin"], fixed_strings=fixed_strings)
+        assert result.fragments == [SearchResultLine(1, "Line 1\n"), SearchResultLine(2, "Line 2\n"),
+                                    SearchResultLine(3, "Test data on line 3")]
+
+    def test_many_patterns_insensitive(self, filesystem):
+        filesystem.fs.create_file("/data/ru.txt", contents="Один\nДВА\nтри\n".encode("utf-8"))
+        source = Path("/data/ru.txt")
+
+        result = SearchService().find_in_file(source, ["один", "два"], case_insensitive=True)
+        assert result.fragments == [SearchResultLine(1, "Один\n"), SearchResultLine(2, "ДВА\n")]
+
+    def test_no_patterns(self, fake_files):
+        with pytest.raises(ValueError):
+            SearchService().find_in_file(Path("/tmp/test.txt"), [])
+
+    def test_binary_skipped(self, filesystem):
+        filesystem.fs.create_file("/data/app.bin", contents=b"\x7fELF\x00\x01Line\n")
+
+        result = SearchService().find_in_file(Path("/data/app.bin"), "Line")
+        assert result.binary
+        assert len(result.fragments) == 0
+
+    @pytest.mark.parametrize("mode, binary", [(BinaryFiles.BINARY, True), (BinaryFiles.TEXT, False)])
+    def test_binary_searched(self, filesystem, mode: BinaryFiles, binary: bool):
+        filesystem.fs.create_file("/data/app.bin", contents=b"\x7fELF\x00\x01\nLine\n")
+
+        result = SearchService().find_in_file(Path("/data/app.bin"), "Line", binary_files=mode)
+        assert result.binary == binary
+        assert result.fragments == [SearchResultLine(2, "Line\n")]
+
+    def test_undecodable_skipped(self, filesystem):
+        filesystem.fs.create_file("/data/latin.txt", contents="café\nLine\n".encode("latin-1"))
+
+        result = SearchService().find_in_file(Path("/data/latin.txt"), "Line")
+        assert result.binary
+        assert len(result.fragments) == 0
+
+    def test_encoding(self, filesystem):
+        filesystem.fs.create_file("/data/latin.txt", contents="café\nLine\n".encode("latin-1"))
+
+        result = SearchService().find_in_file(Path("/data/latin.txt"), "caf.", encoding="latin-1")
+        assert result.fragments == [SearchResultLine(1, "café\n")]
+
+    def test_bom(self, filesystem):
+        filesystem.fs.create_file("/data/utf16.txt", contents="first\nLine 2\n".encode("utf-16"))
+
+        result = SearchService().find_in_file(Path("/data/utf16.txt"), "Line")
+        assert result.fragments == [SearchResultLine(2, "Line 2\n")]
+
+    def test_mmap(self, tmp_path: Path, mocker):
+        # pyfakefs не поддерживает mmap
+        mocker.patch("src.services.search_service.MMAP_MIN_SIZE", 0)
+        source = tmp_path / "big.txt"
+        source.write_text("Line 1\nother\nLine 3")
+
+        result = SearchService().find_in_file(source, "Line")
+        assert result.fragments == [SearchResultLine(1, "Line 1\n"), SearchResultLine(3, "Line 3")]
+
 
 class TestFindRecursively:
     def test_find_basic(self, fake_files):
         source = Path("/tmp")
 
-        result = SearchService().find_in_files_recursively(source, "Line")
+        result = list(SearchService().find_in_files_recursively(source, "Line"))
         assert len(result) == 2
 
         assert result[0].fragments[0] == SearchResultLine(1, "Line 1\n")
@@ -71,3 +169,59 @@ class TestFindRecursively:
 
         with pytest.raises(NotADirectoryError):
             SearchService().find_in_files_recursively(source, "Line")
+
+    def test_many_sources(self, filesystem):
+        filesystem.fs.create_file("/data/a/first.txt").set_contents("Line a")
+        filesystem.fs.create_file("/data/b/second.txt").set_contents("Line b")
+
+        result = list(SearchService().find_in_files_recursively([Path("/data/a"), Path("/data/b")], "Line"))
+        assert [r.file_path for r in result] == [Path("/data/a/first.txt"), Path("/data/b/second.txt")]
+
+    def test_parallel_same_as_sequential(self, tmp_path: Path):
+        # процессы пула не видят pyfakefs, поэтому настоящая временная директория
+        for i in range(20):
+            (tmp_path / f"file{i}.txt").write_text(f"Line {i}\nother\nLine end")
+
+        sequential = list(SearchService().find_in_files_recursively(tmp_path, "Line", jobs=1))
+        parallel = list(SearchService().find_in_files_recursively(tmp_path, "Line", jobs=2))
+
+        assert [r.file_path for r in parallel] == [r.file_path for r in sequential]
+        assert [r.fragments for r in parallel] == [r.fragments for r in sequential]
+
+    def test_parallel_streaming(self, tmp_path: Path):
+        for i in range(200):
+            (tmp_path / f"file{i}.txt").write_text(f"Line {i}")
+        consumed = 0
+
+        def files():
+            nonlocal consumed
+            for i in range(200):
+                consumed += 1
+                yield tmp_path / f"file{i}.txt"
+
+        result = SearchService().find_in_files(files(), "Line", jobs=2)
+        assert next(result).file_path == tmp_path / "file0.txt"
+        # обход идет вперед только на окно задач, а не до конца
+        assert consumed <= 2 * PARALLEL_WINDOW_PER_JOB + 1
+        assert len(list(result)) == 199
+
+
+class TestFindInFiles:
+    def test_skips_empty_results(self, fake_files):
+        files = [Path("/tmp/test.txt"), Path("/tmp/test2.txt")]
+
+        result = list(SearchService().find_in_files(files, "Test"))
+        assert len(result) == 1
+        assert result[0].file_path == files[0]
+
+    def test_streaming(self, fake_files):
+        def files():
+            yield Path("/tmp/test.txt")
+            raise AssertionError("Second file must not be requested before the first result is consumed")
+
+        result = SearchService().find_in_files(files(), "Line", jobs=1)
+        assert next(result).file_path == Path("/tmp/test.txt")
+
+    def test_invalid_jobs(self, fake_files):
+        with pytest.raises(ValueError):
+            SearchService().find_in_files([Path("/tmp/test.txt")], "Line", jobs=0)
@@ -0,0 +1,56 @@
+from pathlib import Path
+import io
+import zipfile
+import pytest
+
+from src.services.stream_service import StreamService
+
+
+@pytest.fixture
+def source(tmp_path: Path) -> Path:
+    path = tmp_path / "source.bin"
+    path.write_bytes(bytes(range(256)) * 4096 + b"[red]not markup[/red]\xff\xfe")
+    return path
+
+
+class TestCopy:
+
+    def test_sendfile(self, source, tmp_path, mocker):
+        sendfile = mocker.spy(StreamService, "_StreamService__sendfile")
+        with open(source, "rb") as f, open(tmp_path / "out", "wb") as out:
+            assert StreamService.copy(f, out) == source.stat().st_size
+        assert (tmp_path / "out").read_bytes() == source.read_bytes()
+        assert sendfile.call_count == 1
+
+    def test_buffer(self, source):
+        out = io.BytesIO()
+        with open(source, "rb") as f:
+            StreamService.copy(f, out)
+        assert out.getvalue() == source.read_bytes()
+
+    @pytest.mark.parametrize("to_file", [True, False])
+    def test_offset_and_count(self, source, tmp_path, to_file):
+        out = open(tmp_path / "out", "wb") if to_file else io.BytesIO()
+        with open(source, "rb") as f, out:
+            f.read(10)
+            assert StreamService.copy(f, out, count=100) == 100
+            # позиция источника сдвигается на скопированное
+            assert f.read(1) == source.read_bytes()[110:111]
+            if not to_file:
+                assert out.getvalue() == source.read_bytes()[10:110]
+        if to_file:
+            assert (tmp_path / "out").read_bytes() == source.read_bytes()[10:110]
+
+    def test_archive_member(self, source, tmp_path):
+        with zipfile.ZipFile(tmp_path / "a.zip", "w") as archive:
+            archive.write(source, "source.bin")
+        out = io.BytesIO()
+        with zipfile.ZipFile(tmp_path / "a.zip") as archive, archive.open("source.bin") as f:
+            StreamService.copy(f, out)
+        assert out.getvalue() == source.read_bytes()
+
+    def test_sendfile_unsupported(self, source, tmp_path, mocker):
+        mocker.patch("os.sendfile", side_effect=OSError(22, "Invalid argument"))
+        with open(source, "rb") as f, open(tmp_path / "out", "wb") as out:
+            StreamService.copy(f, out)
+        assert (tmp_path / "out").read_bytes() == source.read_bytes()
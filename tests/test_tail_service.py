@@ -0,0 +1,133 @@
+from pathlib import Path
+import io
+import os
+import threading
+import time
+import zipfile
+import pytest
+
+from src.services.tail_service import TailService, FollowEvent
+
+
+@pytest.fixture
+def log(tmp_path: Path) -> Path:
+    path = tmp_path / "app.log"
+    path.write_bytes(b"".join(b"line %d\n" % i for i in range(1, 20001)))
+    return path
+
+
+def run_tail(path: Path, **kwargs) -> bytes:
+    out = io.BytesIO()
+    with open(path, "rb") as f:
+        TailService.tail(f, out, **kwargs)
+    return out.getvalue()
+
+
+def run_head(path: Path, **kwargs) -> bytes:
+    out = io.BytesIO()
+    with open(path, "rb") as f:
+        TailService.head(f, out, **kwargs)
+    return out.getvalue()
+
+
+class TestHead:
+
+    def test_lines(self, log):
+        assert run_head(log, lines=3) == b"line 1\nline 2\nline 3\n"
+
+    def test_lines_across_blocks(self, log):
+        assert run_head(log, lines=15000) == b"".join(b"line %d\n" % i for i in range(1, 15001))
+
+    def test_bytes(self, log):
+        assert run_head(log, count=8) == b"line 1\nl"
+
+    def test_short_file(self, tmp_path):
+        (tmp_path / "f").write_bytes(b"a\nb")
+        assert run_head(tmp_path / "f", lines=10) == b"a\nb"
+
+
+class TestTail:
+
+    def test_lines(self, log):
+        assert run_tail(log, lines=2) == b"line 19999\nline 20000\n"
+
+    def test_lines_across_blocks(self, log):
+        assert run_tail(log, lines=15000) == b"".join(b"line %d\n" % i for i in range(5001, 20001))
+
+    def test_no_trailing_newline(self, tmp_path):
+        (tmp_path / "f").write_bytes(b"a\nb\nc")
+        assert run_tail(tmp_path / "f", lines=2) == b"b\nc"
+
+    def test_more_than_file(self, tmp_path):
+        (tmp_path / "f").write_bytes(b"a\nb\n")
+        assert run_tail(tmp_path / "f", lines=10) == b"a\nb\n"
+        assert run_tail(tmp_path / "f", lines=0) == b""
+
+    def test_bytes(self, log):
+        assert run_tail(log, count=6) == b"20000\n"
+
+    def test_reads_only_end(self, log, mocker):
+        read = mocker.spy(TailService, "_TailService__find_lines_start")
+        assert run_tail(log, lines=1) == b"line 20000\n"
+        assert read.call_count == 1
+
+    def test_archive_member(self, log, tmp_path):
+        with zipfile.ZipFile(tmp_path / "a.zip", "w") as archive:
+            archive.write(log, "app.log")
+        for kwargs, expected in [({"lines": 2}, b"line 19999\nline 20000\n"), ({"count": 6}, b"20000\n")]:
+            out = io.BytesIO()
+            with zipfile.ZipFile(tmp_path / "a.zip") as archive, archive.open("app.log") as f:
+                TailService.tail(f, out, **kwargs)
+            assert out.getvalue() == expected
+
+
+class TestFollow:
+
+    @pytest.fixture
+    def follow(self, tmp_path):
+        path = tmp_path / "app.log"
+        path.write_bytes(b"old 1\nold 2\n")
+        out = io.BytesIO()
+        stop = threading.Event()
+        events = []
+
+        def run():
+            events.extend(TailService.follow(path, out, lines=1, stop=stop, interval=0.05))
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        yield path, out, events
+        stop.set()
+        thread.join(5)
+
+    @staticmethod
+    def wait_for(out: io.BytesIO, expected: bytes):
+        for _ in range(100):
+            if out.getvalue() == expected:
+                return
+            time.sleep(0.02)
+        assert out.getvalue() == expected
+
+    def test_append(self, follow):
+        path, out, _ = follow
+        self.wait_for(out, b"old 2\n")
+        with open(path, "ab") as f:
+            f.write(b"new\n")
+        self.wait_for(out, b"old 2\nnew\n")
+
+    def test_rotation(self, follow):
+        path, out, events = follow
+        self.wait_for(out, b"old 2\n")
+        with open(path, "ab") as f:
+            f.write(b"last\n")
+        os.rename(path, path.with_name("app.log.1"))
+        path.write_bytes(b"rotated\n")
+        self.wait_for(out, b"old 2\nlast\nrotated\n")
+        assert events == [FollowEvent.REPLACED]
+
+    def test_truncate(self, follow):
+        path, out, events = follow
+        self.wait_for(out, b"old 2\n")
+        path.write_bytes(b"x\n")
+        self.wait_for(out, b"old 2\nx\n")
+        assert events == [FollowEvent.TRUNCATED]
@@ -0,0 +1,101 @@
+from pathlib import Path
+import os
+from typing import Generator
+import pytest
+from pyfakefs.fake_filesystem_unittest import Patcher
+
+from src.services.walk_service import WalkService
+
+
+@pytest.fixture
+def filesystem() -> Generator[Patcher, None, None]:
+    with Patcher() as p:
+        yield p
+
+
+@pytest.fixture
+def fake_tree(filesystem: Patcher) -> Path:
+    filesystem.fs.create_file("/repo/main.py")
+    filesystem.fs.create_file("/repo/debug.log")
+    filesystem.fs.create_file("/repo/keep.log")
+    filesystem.fs.create_file("/repo/build/out.bin")
+    filesystem.fs.create_file("/repo/src/build/generated.py")
+    filesystem.fs.create_file("/repo/src/app.py")
+    filesystem.fs.create_file("/repo/src/notes.tmp")
+    filesystem.fs.create_file("/repo/.git/HEAD")
+    filesystem.fs.create_file("/repo/node_modules/lib/index.js")
+    filesystem.fs.create_file("/repo/.gitignore").set_contents("# comment\n*.log\n!keep.log\n/build/\n")
+    filesystem.fs.create_file("/repo/src/.ignore").set_contents("*.tmp\n")
+    return Path("/repo")
+
+
+def walked(walker: WalkService, root: Path) -> set[str]:
+    return {Path(entry.path).relative_to(root).as_posix() for entry in walker.iter_files(root)}
+
+
+class TestWalk:
+
+    def test_plain(self, fake_tree):
+        files = walked(WalkService(), fake_tree)
+        assert len(files) == 11
+        assert ".git/HEAD" in files
+
+    def test_ignore_files(self, fake_tree):
+        files = walked(WalkService(use_ignore_files=True), fake_tree)
+        assert files == {"main.py", "keep.log", "src/build/generated.py", "src/app.py",
+                         ".gitignore", "src/.ignore"}
+
+    def test_exclude(self, fake_tree):
+        files = walked(WalkService(exclude=["src", "*.log"]), fake_tree)
+        assert files == {"main.py", "build/out.bin", ".git/HEAD", "node_modules/lib/index.js", ".gitignore"}
+
+    def test_include(self, fake_tree):
+        files = walked(WalkService(include=["*.py"], use_ignore_files=True), fake_tree)
+        assert files == {"main.py", "src/build/generated.py", "src/app.py"}
+
+    def test_directories_pruned(self, fake_tree, mocker):
+        scandir = mocker.spy(os, "scandir")
+        list(WalkService(use_ignore_files=True).iter_entries(fake_tree))
+        listed = {Path(call.args[0]).as_posix() for call in scandir.call_args_list}
+        assert listed == {"/repo", "/repo/src", "/repo/src/build"}
+
+    def test_relative(self, fake_tree):
+        walked_paths = dict(WalkService(exclude=["node_modules", ".git"]).iter_relative(fake_tree))
+        assert walked_paths.keys() == {"main.py", "debug.log", "keep.log", "build", "build/out.bin", "src",
+                                       "src/build", "src/build/generated.py", "src/app.py", "src/notes.tmp",
+                                       ".gitignore", "src/.ignore"}
+        assert walked_paths["src/app.py"].path == os.path.join("/repo", "src", "app.py")
+
+    def test_on_error(self, fake_tree, mocker):
+        original = os.scandir
+
+        def scandir(path):
+            if Path(path).as_posix() == "/repo/src":
+                raise PermissionError(13, "Permission denied", path)
+            return original(path)
+
+        mocker.patch("os.scandir", scandir)
+        errors = []
+        files = {rel for rel, _ in WalkService().iter_relative(fake_tree, lambda path, e: errors.append(path))}
+        assert [Path(path).as_posix() for path in errors] == ["/repo/src"]
+        assert "src" in files and "src/app.py" not in files
+
+        def reraise(path: str, e: OSError):
+            raise e
+
+        with pytest.raises(PermissionError):
+            list(WalkService().iter_entries(fake_tree, on_error=reraise))
+
+    @pytest.mark.parametrize("pattern, path, ignored", [
+        ("**/cache", "a/b/cache", True),
+        ("docs/**/*.md", "docs/a/b/readme.md", True),
+        ("docs/*.md", "docs/a/readme.md", False),
+        ("file[0-9].txt", "dir/file1.txt", True),
+        ("\\#name", "#name", True),
+    ])
+    def test_patterns(self, filesystem, pattern: str, path: str, ignored: bool):
+        filesystem.fs.create_file(f"/root/{path}")
+        filesystem.fs.create_file("/root/.gitignore").set_contents(pattern + "\n")
+
+        files = walked(WalkService(use_ignore_files=True), Path("/root"))
+        assert (path not in files) == ignored